@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import indicators as ind
+from bar_store import BarStore, DAY_SEC, cols_from_df, cols_len
+from strategy import compute_position_size, load_params, make_params, score_arrays
+
+# ================= Backtest: analyze_symbol rules over stored daily bars =================
+# Replays the live ENTER rules bar by bar from the local bar store (no network).
+# Signal at the close of bar t, entry at that close. From t+1: half the
+# position exits at TP1 and the stop moves to breakeven, the rest exits at
+# TP2 / breakeven; before TP1 the whole position exits at SL. When a bar
+# touches both stop and target the stop is assumed first. Trades that run
+# max_hold bars (or reach end_ts) exit at the close. One open position per
+# symbol at a time.
+#
+#   python backtest.py --years 10 --side both --workers 8 --json out.json
+
+BAR_STORE_DIR = os.getenv("BAR_STORE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bars")
+WARMUP_BARS = 60
+
+def load_tickers(path: str):
+    out = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                t = line.split("#", 1)[0].strip().upper()
+                if t:
+                    out.append(t)
+    except Exception:
+        pass
+    return list(dict.fromkeys(out))
+
+# ---------- signals ----------
+def prepare(hist, smoothing="simple"):
+    # hist: list of bar_store column dicts -> per-symbol matrices + indicator series.
+    # Rows are right-aligned by position (ind.stack_bars), not on a shared calendar,
+    # so a gap in one symbol never NaNs its windows: each row is what
+    # analyze_symbol computes on that symbol's own bars. "ts" is a matrix too,
+    # NaN on the left padding of shorter histories.
+    m = ind.stack_bars(hist, fields=("ts", "high", "low", "close"))
+    series = ind.compute_indicators(m["high"], m["low"], m["close"], smoothing=smoothing)
+    close = m["close"]
+    with np.errstate(invalid="ignore"):
+        trend = ind.trend_labels(close, series["ma20"], series["ma50"])
+        brk_up = close > series["brk_high"]
+        brk_down = close < series["brk_low"]
+        valid = np.isfinite(close) & np.isfinite(series["ma50"]) & np.isfinite(series["rsi"]) & np.isfinite(series["atr"])
+    return {
+        "ts": m["ts"], "high": m["high"], "low": m["low"], "close": close,
+        "rsi": series["rsi"], "atr": series["atr"],
+        "trend": trend, "brk_up": brk_up, "brk_down": brk_down, "valid": valid,
+    }
+
+def _first(mask):
+    i = int(np.argmax(mask)) if len(mask) else 0
+    return i if len(mask) and mask[i] else None
+
+def _walk(high, low, close, t, long_side, entry, sl, tp1, tp2, max_hold):
+    # -> (exit_idx, leg1_px, leg2_px, outcome)
+    n = len(close)
+    end = min(t + 1 + max_hold, n)
+    h, l = high[t + 1:end], low[t + 1:end]
+    with np.errstate(invalid="ignore"):
+        hit_sl = (l <= sl) if long_side else (h >= sl)
+        hit_tp1 = (h >= tp1) if long_side else (l <= tp1)
+    i_sl, i_tp1 = _first(hit_sl), _first(hit_tp1)
+
+    if i_tp1 is None or (i_sl is not None and i_sl <= i_tp1):
+        if i_sl is None:
+            j = _last_valid(close, end - 1, t)
+            return j, close[j], close[j], "EXPIRED"
+        return t + 1 + i_sl, sl, sl, "SL"
+
+    j = t + 1 + i_tp1
+    h2, l2 = high[j + 1:end], low[j + 1:end]
+    with np.errstate(invalid="ignore"):
+        hit_be = (l2 <= entry) if long_side else (h2 >= entry)
+        hit_tp2 = (h2 >= tp2) if long_side else (l2 <= tp2)
+    i_be, i_tp2 = _first(hit_be), _first(hit_tp2)
+    if i_tp2 is not None and (i_be is None or i_tp2 < i_be):
+        return j + 1 + i_tp2, tp1, tp2, "TP2"
+    if i_be is not None:
+        return j + 1 + i_be, tp1, entry, "TP1_BE"
+    k = _last_valid(close, end - 1, j)
+    return k, tp1, close[k], "TP1_EXPIRED"
+
+def _last_valid(close, i, floor):
+    while i > floor and not np.isfinite(close[i]):
+        i -= 1
+    return i
+
+def simulate_row(p, r, symbol, side="both", capital=10000.0, risk_pct=1.0, max_hold=20,
+                 start_ts=None, end_ts=None, params=None):
+    params = make_params(params)
+    sl_mult, tp1_mult, tp2_mult = params["sl_mult"], params["tp1_mult"], params["tp2_mult"]
+    enter_score = params["enter_score"]
+
+    # this symbol's own bars only (drop the left padding of the stacked row)
+    ts = p["ts"][r]
+    own = slice(int(np.isnan(ts).sum()), None)
+    ts = ts[own]
+    high, low, close, atr = p["high"][r][own], p["low"][r][own], p["close"][r][own], p["atr"][r][own]
+    long_s, short_s = score_arrays(p["trend"][r][own], p["brk_up"][r][own], p["brk_down"][r][own], p["rsi"][r][own], params)
+    ok = p["valid"][r][own].copy()
+    if start_ts is not None:
+        ok &= ts >= start_ts
+    if end_ts is not None:
+        ok &= ts < end_ts
+    want_long = ok & (long_s >= enter_score) if side in ("both", "long") else np.zeros_like(ok)
+    want_short = ok & (short_s >= enter_score) if side in ("both", "short") else np.zeros_like(ok)
+    if end_ts is not None:
+        # exits too: a trade still open at end_ts closes at the last close before it,
+        # so a walk-forward train fold never sees its test window
+        n_end = int(np.searchsorted(ts, end_ts, "left"))
+        high, low, close = high[:n_end], low[:n_end], close[:n_end]
+
+    trades = []
+    busy_until = -1
+    for t in np.flatnonzero(want_long | want_short):
+        if t <= busy_until or t + 1 >= len(close):
+            continue
+        long_side = bool(want_long[t])
+        entry, atr_t = float(close[t]), float(atr[t])
+        sgn = 1.0 if long_side else -1.0
+        sl = entry - sgn * sl_mult * atr_t
+        tp1 = entry + sgn * tp1_mult * atr_t
+        tp2 = entry + sgn * tp2_mult * atr_t
+        qty = compute_position_size(capital, risk_pct, entry, sl)
+        exit_idx, px1, px2, outcome = _walk(high, low, close, t, long_side, entry, sl, tp1, tp2, max_hold)
+        risk_ps = abs(entry - sl)
+        q1 = qty // 2 if qty > 1 else qty
+        q2 = qty - q1
+        pnl = sgn * ((px1 - entry) * q1 + (px2 - entry) * q2)
+        r_mult = sgn * ((px1 - entry) + (px2 - entry)) / 2.0 / risk_ps if risk_ps > 0 else 0.0
+        trades.append({
+            "symbol": symbol,
+            "side": "LONG" if long_side else "SHORT",
+            "score": int(long_s[t] if long_side else short_s[t]),
+            "entry_ts": float(ts[t]),
+            "exit_ts": float(ts[exit_idx]),
+            "bars": int(exit_idx - t),
+            "entry": entry,
+            "sl": sl,
+            "tp1": tp1,
+            "tp2": tp2,
+            "qty": int(qty),
+            "outcome": outcome,
+            "r": float(r_mult),
+            "pnl": float(pnl),
+        })
+        busy_until = exit_idx
+    return trades
+
+# ---------- stats ----------
+def summarize(trades, capital=10000.0):
+    if not trades:
+        return {"trades": 0, "win_rate": 0.0, "expectancy_r": 0.0, "expectancy_usd": 0.0,
+                "total_pnl": 0.0, "max_drawdown_pct": 0.0, "avg_bars": 0.0, "outcomes": {}}
+    r = np.array([t["r"] for t in trades])
+    pnl = np.array([t["pnl"] for t in trades])
+    order = np.argsort([t["exit_ts"] for t in trades], kind="stable")
+    equity = float(capital) + np.cumsum(pnl[order])
+    peak = np.maximum.accumulate(np.concatenate([[float(capital)], equity]))[1:]
+    dd = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    outcomes = {}
+    for t in trades:
+        outcomes[t["outcome"]] = outcomes.get(t["outcome"], 0) + 1
+    return {
+        "trades": int(len(trades)),
+        "win_rate": round(float((r > 0).mean()), 4),
+        "expectancy_r": round(float(r.mean()), 4),
+        "expectancy_usd": round(float(pnl.mean()), 2),
+        "total_pnl": round(float(pnl.sum()), 2),
+        "max_drawdown_pct": round(float(dd.max()) * 100.0, 2),
+        "avg_bars": round(float(np.mean([t["bars"] for t in trades])), 2),
+        "outcomes": outcomes,
+    }
+
+# ---------- driver ----------
+def _run_chunk(args):
+    root, symbols, opts = args
+    store = BarStore(root)
+    syms, hist = [], []
+    for s in symbols:
+        cols = store.read(s, "1d")
+        if cols is not None and cols_len(cols) > WARMUP_BARS:
+            syms.append(s)
+            hist.append(cols)
+    if not syms:
+        return []
+    p = prepare(hist, opts.get("smoothing", "simple"))
+    trades = []
+    for r, s in enumerate(syms):
+        trades.extend(simulate_row(
+            p, r, s, side=opts["side"], capital=opts["capital"], risk_pct=opts["risk_pct"],
+            max_hold=opts["max_hold"], start_ts=opts.get("start_ts"), params=opts.get("params"),
+        ))
+    return trades
+
+def run_backtest(symbols, root=BAR_STORE_DIR, years=10, side="both", capital=10000.0, risk_pct=1.0,
+                 max_hold=20, smoothing="simple", workers=None, chunk=25, params=None):
+    opts = {
+        "side": side, "capital": float(capital), "risk_pct": float(risk_pct), "max_hold": int(max_hold),
+        "smoothing": smoothing, "start_ts": time.time() - float(years) * 365.25 * DAY_SEC, "params": params,
+    }
+    jobs = [(root, symbols[i:i + chunk], opts) for i in range(0, len(symbols), chunk)]
+    workers = workers or os.cpu_count() or 1
+    t0 = time.time()
+    trades = []
+    if workers <= 1 or len(jobs) <= 1:
+        for j in jobs:
+            trades.extend(_run_chunk(j))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for part in ex.map(_run_chunk, jobs):
+                trades.extend(part)
+
+    per_symbol = {}
+    for t in trades:
+        per_symbol.setdefault(t["symbol"], []).append(t)
+    return {
+        "summary": summarize(trades, capital),
+        "per_symbol": {s: summarize(ts, capital) for s, ts in sorted(per_symbol.items())},
+        "by_side": {sd: summarize([t for t in trades if t["side"] == sd], capital) for sd in ("LONG", "SHORT")},
+        "trades": trades,
+        "elapsed_sec": round(time.time() - t0, 3),
+        "symbols": len(symbols),
+    }
+
+def fetch_into_store(symbols, root=BAR_STORE_DIR, years=10, chunk=60):
+    # one-off history download (network); the backtest itself never fetches
+    import yfinance as yf
+    store = BarStore(root)
+    start = time.time() - float(years) * 365.25 * DAY_SEC
+    for i in range(0, len(symbols), chunk):
+        group = symbols[i:i + chunk]
+        df = yf.download(" ".join(group), period=f"{int(years)}y", interval="1d", group_by="ticker",
+                         auto_adjust=True, threads=True, progress=False)
+        for s in group:
+            cols = cols_from_df(df, s, "1d")
+            if cols is not None and cols_len(cols):
+                store.merge(s, "1d", cols, covered_from=start)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Backtest the analyze_symbol swing rules on stored daily bars")
+    ap.add_argument("--tickers", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tickers.txt"))
+    ap.add_argument("--symbols", default="", help="comma separated, overrides --tickers")
+    ap.add_argument("--store", default=BAR_STORE_DIR)
+    ap.add_argument("--years", type=float, default=10)
+    ap.add_argument("--side", default="both", choices=("both", "long", "short"))
+    ap.add_argument("--capital", type=float, default=10000.0)
+    ap.add_argument("--risk", type=float, default=1.0)
+    ap.add_argument("--max-hold", type=int, default=20)
+    ap.add_argument("--smoothing", default=os.getenv("INDICATOR_SMOOTHING", "simple"))
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--params", default="", help="strategy params JSON (e.g. written by optimize.py)")
+    ap.add_argument("--fetch", action="store_true", help="download history into the store first")
+    ap.add_argument("--json", default="", help="write the full report here")
+    a = ap.parse_args(argv)
+
+    symbols = [s.strip().upper() for s in a.symbols.split(",") if s.strip()] or load_tickers(a.tickers)
+    if a.fetch:
+        fetch_into_store(symbols, a.store, a.years)
+    rep = run_backtest(symbols, a.store, a.years, a.side, a.capital, a.risk, a.max_hold,
+                       a.smoothing, a.workers or None, params=load_params(a.params) if a.params else None)
+
+    s = rep["summary"]
+    print(f"Backtest {rep['symbols']} symbols | {a.years}y | side {a.side} | {rep['elapsed_sec']}s")
+    print(f"Trades {s['trades']} | Win {s['win_rate']:.1%} | Exp {s['expectancy_r']:+.3f}R "
+          f"({s['expectancy_usd']:+.2f}$) | PnL {s['total_pnl']:+.2f}$ | MaxDD {s['max_drawdown_pct']:.2f}%")
+    print(f"Outcomes: {s['outcomes']}")
+    for sym, st in sorted(rep["per_symbol"].items(), key=lambda kv: kv[1]["total_pnl"], reverse=True):
+        print(f"- {sym:8s} n={st['trades']:4d} win={st['win_rate']:.0%} exp={st['expectancy_r']:+.2f}R pnl={st['total_pnl']:+.0f}$")
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
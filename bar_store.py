@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import threading
+from urllib.parse import quote
+
+import numpy as np
+
+# ================= Local OHLCV bar store =================
+# One file per symbol/interval: <root>/<interval>/<SYMBOL>.npy holding a
+# (6, N) float64 matrix, one contiguous row per column (ts, o, h, l, c, v).
+# Rows are read back with mmap so a lookup is a page-cache read, not a parse.
+# A tiny sidecar <SYMBOL>.json keeps the earliest date a full fetch covered.
+
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+DAY_SEC = 86400
+
+_PERIOD_DAYS = {
+    "5d": 7, "1mo": 31, "3mo": 93, "6mo": 186, "1y": 366,
+    "2y": 731, "5y": 1827, "10y": 3653, "max": 36500,
+}
+
+def period_days(period: str) -> int:
+    p = str(period).strip().lower()
+    if p in _PERIOD_DAYS:
+        return _PERIOD_DAYS[p]
+    try:
+        if p.endswith("d"):
+            return int(p[:-1])
+        if p.endswith("mo"):
+            return int(p[:-2]) * 31
+        if p.endswith("y"):
+            return int(p[:-1]) * 366
+    except Exception:
+        pass
+    return 186
+
+def is_daily(interval: str) -> bool:
+    return str(interval).lower() in ("1d", "1wk", "1mo", "5d", "3mo")
+
+def normalize_ts(ts, interval: str):
+    # Daily bars from yfinance (midnight) and the chart API (session open)
+    # must land on the same key, so daily timestamps are floored to the day.
+    ts = np.asarray(ts, dtype=np.int64)
+    if is_daily(interval):
+        ts = ts - (ts % DAY_SEC)
+    return ts
+
+
+class Bars:
+    # One symbol's OHLCV as contiguous float64 columns plus a validity mask
+    # (high, low and close all present). Rows are never dropped field by
+    # field, so the columns stay aligned; valid_only() drops whole rows.
+    # Indexes like the column dicts it replaces (bars["close"]), so the
+    # helpers below, indicators.py and the backtests accept it directly.
+    __slots__ = COLUMNS + ("_valid",)
+
+    def __init__(self, ts, open, high, low, close, volume, valid=None):
+        self.ts = np.ascontiguousarray(ts, dtype=np.float64)
+        self.open = np.ascontiguousarray(open, dtype=np.float64)
+        self.high = np.ascontiguousarray(high, dtype=np.float64)
+        self.low = np.ascontiguousarray(low, dtype=np.float64)
+        self.close = np.ascontiguousarray(close, dtype=np.float64)
+        self.volume = np.ascontiguousarray(volume, dtype=np.float64)
+        self._valid = None if valid is None else np.asarray(valid, dtype=bool)  # None = all rows valid
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, name):
+        if name not in COLUMNS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __contains__(self, name):
+        return name in COLUMNS
+
+    def keys(self):
+        return COLUMNS
+
+    def items(self):
+        return [(c, getattr(self, c)) for c in COLUMNS]
+
+    @property
+    def valid(self):
+        return np.ones(len(self.ts), dtype=bool) if self._valid is None else self._valid
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, c).nbytes for c in COLUMNS) + (0 if self._valid is None else self._valid.nbytes)
+
+    def valid_only(self):
+        if self._valid is None or self._valid.all():
+            return self if self._valid is None else Bars(*(getattr(self, c) for c in COLUMNS))
+        m = self._valid
+        return Bars(*(getattr(self, c)[m] for c in COLUMNS))
+
+    def slice(self, start: int = 0, end: int | None = None):
+        v = None if self._valid is None else self._valid[start:end]
+        return Bars(*(getattr(self, c)[start:end] for c in COLUMNS), valid=v)
+
+    @classmethod
+    def empty(cls):
+        return cls(*(np.empty(0) for _ in COLUMNS))
+
+    @classmethod
+    def from_cols(cls, cols):
+        if isinstance(cols, Bars):
+            return cols
+        return cls(*(cols[c] for c in COLUMNS))
+
+    @classmethod
+    def from_chart(cls, result: dict, interval: str):
+        # Yahoo chart "result" object; None entries become NaN inside numpy
+        stamps = result.get("timestamp") or []
+        n = len(stamps)
+        quote = (result.get("indicators", {}).get("quote") or [{}])[0]
+
+        def col(name):
+            a = np.array(quote.get(name) or [], dtype=np.float64)
+            if len(a) != n:  # ragged payload: pad/truncate to the timestamps
+                a = np.concatenate([a[:n], np.full(max(n - len(a), 0), np.nan)])
+            return a
+
+        high, low, close = col("high"), col("low"), col("close")
+        open_ = col("open")
+        valid = np.isfinite(high) & np.isfinite(low) & np.isfinite(close)
+        return cls(
+            normalize_ts(np.asarray(stamps, dtype=np.int64), interval),
+            np.where(np.isnan(open_), close, open_), high, low, close,
+            np.nan_to_num(col("volume")), valid,
+        )
+
+    @classmethod
+    def from_df(cls, df, sym, interval):
+        # yfinance DataFrame (single or multi-ticker layout) or None when the
+        # symbol has no high/low/close columns
+        fields = {name: _df_field(df, sym, name.capitalize()) for name in ("open", "high", "low", "close", "volume")}
+        if fields["close"] is None or fields["high"] is None or fields["low"] is None:
+            return None
+        idx = df.index
+        if getattr(idx, "tz", None) is not None:
+            idx = idx.tz_convert(None)
+        n = len(idx)
+        arr = {name: (col.to_numpy(dtype=np.float64, na_value=np.nan) if col is not None else np.full(n, np.nan))
+               for name, col in fields.items()}
+        valid = np.isfinite(arr["high"]) & np.isfinite(arr["low"]) & np.isfinite(arr["close"])
+        return cls(
+            normalize_ts(np.asarray(idx, dtype="datetime64[s]").astype(np.int64), interval),
+            np.where(np.isnan(arr["open"]), arr["close"], arr["open"]), arr["high"], arr["low"], arr["close"],
+            np.nan_to_num(arr["volume"]), valid,
+        )
+
+
+def empty_cols():
+    return Bars.empty()
+
+def cols_len(cols) -> int:
+    if cols is None or (isinstance(cols, dict) and "ts" not in cols):
+        return 0
+    return int(len(cols["ts"]))
+
+def slice_cols(cols, start: int = 0, end: int | None = None):
+    if isinstance(cols, Bars):
+        return cols.slice(start, end)
+    return Bars(*(cols[c][start:end] for c in COLUMNS))
+
+def since_cols(cols, start_ts: float):
+    i = int(np.searchsorted(cols["ts"], start_ts, side="left"))
+    return slice_cols(cols, i)
+
+def tail_cols(cols, n: int):
+    return slice_cols(cols, max(cols_len(cols) - int(n), 0))
+
+def _df_field(df, sym, field):
+    cols = getattr(df, "columns", [])
+    if getattr(cols, "nlevels", 1) > 1:
+        for key in ((sym, field), (field, sym)):
+            if key in cols:
+                return df[key]
+        return None
+    return df[field] if field in cols else None
+
+def cols_from_df(df, sym, interval):
+    # yfinance DataFrame -> Bars of the complete rows (high, low and close present)
+    b = Bars.from_df(df, sym, interval)
+    return b.valid_only() if b is not None else None
+
+def merge_cols(old, new):
+    # Newer fetch wins from its first timestamp onwards (the last stored bar
+    # is usually partial and gets replaced by the refetched one).
+    if isinstance(new, Bars):
+        new = new.valid_only()
+    if cols_len(new) == 0:
+        return old
+    order = np.argsort(new["ts"], kind="stable")
+    ts = new["ts"][order]
+    keep = np.ones(len(ts), dtype=bool)
+    keep[:-1] = ts[1:] != ts[:-1]  # last duplicate wins
+    new = {c: np.asarray(new[c], dtype=np.float64)[order][keep] for c in COLUMNS}
+    if cols_len(old) == 0:
+        return Bars(*(new[c] for c in COLUMNS))
+    cut = int(np.searchsorted(old["ts"], new["ts"][0], side="left"))
+    return Bars(*(np.concatenate([np.asarray(old[c][:cut]), new[c]]) for c in COLUMNS))
+
+
+class BarStore:
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _paths(self, symbol: str, interval: str):
+        d = os.path.join(self.root, str(interval).lower())
+        name = quote(symbol.strip().upper(), safe="-_.")
+        return d, os.path.join(d, name + ".npy"), os.path.join(d, name + ".json")
+
+    def read(self, symbol: str, interval: str, mmap: bool = True):
+        _, path, _ = self._paths(symbol, interval)
+        try:
+            m = np.load(path, mmap_mode="r" if mmap else None)
+        except Exception:
+            return None
+        if m.ndim != 2 or m.shape[0] != len(COLUMNS):
+            return None
+        if mmap:
+            # mmap rows are already contiguous float64: wrap them without a copy
+            b = Bars.__new__(Bars)
+            for i, c in enumerate(COLUMNS):
+                setattr(b, c, m[i])
+            b._valid = None
+            return b
+        return Bars(*m)
+
+    def meta(self, symbol: str, interval: str) -> dict:
+        _, path, meta_path = self._paths(symbol, interval)
+        out = {"rows": 0, "first_ts": None, "last_ts": None, "fetched_at": None, "covered_from": None}
+        try:
+            out["fetched_at"] = os.path.getmtime(path)
+        except Exception:
+            return out
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                out["covered_from"] = json.load(f).get("covered_from")
+        except Exception:
+            pass
+        cols = self.read(symbol, interval)
+        if cols_len(cols):
+            out["rows"] = cols_len(cols)
+            out["first_ts"] = float(cols["ts"][0])
+            out["last_ts"] = float(cols["ts"][-1])
+        return out
+
+    def write(self, symbol: str, interval: str, cols, covered_from: float | None = None):
+        d, path, meta_path = self._paths(symbol, interval)
+        os.makedirs(d, exist_ok=True)
+        m = np.vstack([np.asarray(cols[c], dtype=np.float64) for c in COLUMNS]) if cols_len(cols) else np.empty((len(COLUMNS), 0))
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, m)
+        os.replace(tmp, path)
+        if covered_from is not None:
+            tmp = f"{meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"covered_from": float(covered_from)}, f)
+            os.replace(tmp, meta_path)
+
+    def merge(self, symbol: str, interval: str, new_cols, covered_from: float | None = None):
+        with self._lock:
+            old = self.read(symbol, interval, mmap=False)
+            cols = merge_cols(old if old is not None else empty_cols(), new_cols)
+            if covered_from is not None:
+                prev = self.meta(symbol, interval).get("covered_from")
+                if prev is not None:
+                    covered_from = min(float(prev), float(covered_from))
+            self.write(symbol, interval, cols, covered_from=covered_from)
+            return cols
+
+    def touch(self, symbol: str, interval: str):
+        # refetch returned nothing new: still counts as fresh
+        _, path, _ = self._paths(symbol, interval)
+        try:
+            os.utime(path, None)
+        except Exception:
+            pass
+
+    def plan(self, symbol: str, interval: str, period: str, max_age_sec: float, now: float | None = None):
+        # -> ("fresh", None) | ("incremental", start_ts) | ("full", start_ts)
+        now = time.time() if now is None else now
+        need_from = now - period_days(period) * DAY_SEC
+        m = self.meta(symbol, interval)
+        covered = m["covered_from"] if m["covered_from"] is not None else m["first_ts"]
+        if not m["rows"] or covered is None or covered > need_from + DAY_SEC:
+            return "full", need_from
+        if m["fetched_at"] is not None and (now - m["fetched_at"]) < max_age_sec:
+            return "fresh", None
+        return "incremental", m["last_ts"]
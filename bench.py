@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from fake_upstreams import FakeTelegram, FakeYahoo
+
+# ================= Offline benchmark suite =================
+# Starts local fake Yahoo chart / Telegram servers, points the bot at them
+# (YAHOO_CHART_BASE, TELEGRAM_API_BASE, USE_YFINANCE=0), serves main.app on a
+# local port and drives /scan, /tv and /tg over HTTP for each universe size.
+# Reports p50/p95/p99 latency and req/s per endpoint plus micro-benchmarks,
+# and writes everything to JSON so runs can be diffed with --compare.
+#
+#   python bench.py --sizes 20,200,1000 --requests 300 --concurrency 8
+#   python bench.py --latency-ms 20 --fail-rate 0.02 --rate-limit-rate 0.02
+#   python bench.py --compare data/bench/bench-20260101-120000.json
+
+RUN_KEY = "bench"
+CHAT_ID = "1001"
+TOKEN = "123456:bench"
+
+def percentiles(lat_ms):
+    if not lat_ms:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    a = np.asarray(lat_ms, dtype=float)
+    p50, p95, p99 = np.percentile(a, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3),
+            "mean": round(float(a.mean()), 3), "max": round(float(a.max()), 3)}
+
+def run_load(call, n, concurrency):
+    # call(i, session) -> http status; returns latency/throughput summary
+    local = threading.local()
+    lat, statuses = [], {}
+    lock = threading.Lock()
+
+    def one(i):
+        s = getattr(local, "session", None)
+        if s is None:
+            s = local.session = requests.Session()
+        t0 = time.perf_counter()
+        try:
+            status = call(i, s)
+        except Exception as e:
+            status = type(e).__name__
+        dt = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            lat.append(dt)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(int(concurrency), 1)) as ex:
+        list(ex.map(one, range(int(n))))
+    wall = time.perf_counter() - t0
+    out = {"requests": int(n), "concurrency": int(concurrency), "wall_sec": round(wall, 3),
+           "rps": round(n / wall, 2) if wall > 0 else None, "status": statuses}
+    out.update(percentiles(lat))
+    return out
+
+def micro(fn, repeat=5):
+    # per-call microseconds; number of calls per repeat is auto-calibrated
+    t = timeit.Timer(fn)
+    number, _ = t.autorange()
+    runs = [r / number * 1e6 for r in t.repeat(repeat=repeat, number=number)]
+    return {"median_us": round(float(np.median(runs)), 3), "best_us": round(min(runs), 3), "calls": number * repeat}
+
+def wait_for(pred, timeout):
+    end = time.time() + timeout
+    while time.time() < end:
+        if pred():
+            return True
+        time.sleep(0.02)
+    return pred()
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def configure_env(a, work, yahoo, tg):
+    # must run before main is imported: main reads its config at import time
+    env = {
+        "TELEGRAM_BOT_TOKEN": TOKEN,
+        "TELEGRAM_CHAT_ID": CHAT_ID,
+        "ADMIN_USER_ID": "",
+        "TELEGRAM_WEBHOOK_SECRET": "",
+        "WEBHOOK_SECRET": "",
+        "RUN_KEY": RUN_KEY,
+        "YAHOO_CHART_BASE": yahoo.url,
+        "TELEGRAM_API_BASE": tg.url,
+        "USE_YFINANCE": "0",
+        "STATE_STORE": "memory",
+        "BAR_STORE_DIR": os.path.join(work, "bars"),
+        "TG_SPOOL_PATH": os.path.join(work, "tg_spool.jsonl"),
+        "TICKERS_PATH": os.path.join(work, "tickers.txt"),
+        "STRATEGY_PARAMS_PATH": os.path.join(work, "strategy_params.json"),
+        # everything main writes stays in the work dir, never in data/
+        "SNAPSHOT_PATH": os.path.join(work, "analysis_snapshot.json"),
+        "SIGNAL_JOURNAL": os.path.join(work, "signals.db"),
+        "TRAFFIC_RECORD": "0",
+        "TRAFFIC_RECORD_PATH": os.path.join(work, "traffic.jsonl"),
+        "ALERT_COOLDOWN_MIN": "0",
+        "ANALYZE_CACHE_TTL_SEC": str(a.analyze_cache_ttl),
+        "TV_ASYNC": "1" if a.tv_async else "0",
+        "MIN_AVG_VOL": "0",
+    }
+    if not a.real_rate_limits:
+        env.update({"TG_GLOBAL_RATE": "100000", "TG_CHAT_RATE": "100000", "TG_GROUP_RATE_PER_MIN": "6000000"})
+    os.environ.update(env)
+
+def serve_app(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    srv = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=srv.serve_forever, name="bench-app", daemon=True).start()
+    return srv, f"http://127.0.0.1:{srv.server_port}"
+
+def tg_update(i, text):
+    cmd = text.split()[0]
+    return {
+        "update_id": 100000 + i,
+        "message": {
+            "message_id": i + 1, "date": int(time.time()), "text": text,
+            "chat": {"id": int(CHAT_ID), "type": "private"},
+            "from": {"id": int(CHAT_ID), "is_bot": False, "first_name": "bench"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(cmd)}],
+        },
+    }
+
+def bench_size(main, base, universe, a, yahoo, tg):
+    out = {"symbols": len(universe)}
+    with open(main.TICKERS_PATH, "w", encoding="utf-8") as f:
+        f.write("\n".join(universe) + "\n")
+    shutil.rmtree(main.BAR_STORE_DIR, ignore_errors=True)
+    main._analyze_cache.invalidate()
+
+    # /scan: first call downloads the universe (cold), later calls read the store
+    for mode in ("legacy", "swing"):
+        url = f"{base}/scan?key={RUN_KEY}&force=1&mode={mode}"
+        yahoo.reset()
+        t0 = time.perf_counter()
+        r = requests.get(url, timeout=3600)
+        cold = time.perf_counter() - t0
+        warm = run_load(lambda i, s: s.get(url, timeout=3600).status_code, a.scan_repeats, 1)
+        out[f"scan_{mode}"] = {
+            "cold_sec": round(cold, 3), "cold_status": r.status_code,
+            "cold_symbols_per_sec": round(len(universe) / cold, 2) if cold > 0 else None,
+            "chart_requests": yahoo.stats()["requests"], "warm": warm,
+        }
+
+    # /tv: BUY/SELL alerts over the universe (cooldown 0, analyze + filter + send)
+    rnd = random.Random(a.seed)
+    tfs = [x.strip() for x in a.tf.split(",") if x.strip()] or ["1D"]
+    payloads = [{"ticker": rnd.choice(universe), "direction": rnd.choice(("BUY", "SELL")), "tf": rnd.choice(tfs),
+                 "price": "0", "reason": "bench"} for _ in range(a.requests)]
+    out["tv"] = run_load(lambda i, s: s.post(f"{base}/tv", json=payloads[i], timeout=120).status_code,
+                         a.requests, a.concurrency)
+    if a.tv_async:
+        t0 = time.time()
+        wait_for(lambda: main._tv_queue.depth == 0, a.drain_timeout)
+        out["tv"]["drain_sec"] = round(time.time() - t0, 3)
+
+    # /tg: webhook handoff latency; replies are counted at the fake Telegram
+    requests.post(f"{base}/tg", json=tg_update(0, "/help"), timeout=60)  # initializes tg_app
+    wait_for(lambda: tg.stats()["methods"].get("sendMessage", 0) >= 1, 30)
+    tg.reset()
+    texts = [("/status" if i % 2 else f"/analyze {universe[i % len(universe)]}") for i in range(a.requests)]
+    t0 = time.time()
+    out["tg"] = run_load(lambda i, s: s.post(f"{base}/tg", json=tg_update(i + 1, texts[i]), timeout=60).status_code,
+                         a.requests, a.concurrency)
+    # every command sends one reply; injected failures still count as an attempt
+    done = wait_for(lambda: tg.stats()["requests"] >= a.requests, a.drain_timeout)
+    out["tg"]["replies"] = tg.stats()["methods"].get("sendMessage", 0)
+    out["tg"]["drain_sec"] = round(time.time() - t0, 3) if done else None
+
+    # vectorized indicators over the whole universe (same shape the swing scan uses)
+    hist = [c for c in (main.read_history(s, period="6mo", interval="1d") for s in universe) if c is not None]
+    if hist:
+        m = main.ind.stack_bars(hist)
+        out["compute_indicators"] = micro(lambda: main.ind.compute_indicators(
+            m["high"], m["low"], m["close"], m["volume"], smoothing=main.INDICATOR_SMOOTHING), repeat=3)
+    return out
+
+def bench_micro(main, symbol):
+    h = main.get_history(symbol, period="6mo", interval="1d")
+    if not h.get("ok"):
+        return {"error": h.get("error")}
+    b = h["bars"]
+    closes, highs, lows = [float(x) for x in b["close"]], [float(x) for x in b["high"]], [float(x) for x in b["low"]]
+    main.analyze_symbol(symbol)
+    return {
+        "bars": len(closes),
+        "sma_20": micro(lambda: main.sma(closes, 20)),
+        "rsi_14": micro(lambda: main.rsi_14(closes)),
+        "atr_14": micro(lambda: main.atr_14(highs, lows, closes)),
+        "analyze_symbol_uncached": micro(lambda: main._analyze_symbol_uncached(symbol)),
+        "analyze_symbol": micro(lambda: main.analyze_symbol(symbol)),
+    }
+
+def _flatten(d, prefix=""):
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(_flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = float(v)
+    return out
+
+_COMPARE_SUFFIXES = (".p50", ".p95", ".p99", ".rps", ".cold_sec", ".median_us", ".drain_sec")
+
+def compare(old, new):
+    a, b = _flatten(old.get("results", {})), _flatten(new.get("results", {}))
+    rows = []
+    for k in sorted(set(a) & set(b)):
+        if not k.endswith(_COMPARE_SUFFIXES) or not a[k]:
+            continue
+        rows.append((k, a[k], b[k], (b[k] - a[k]) / a[k] * 100.0))
+    return rows
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark /scan, /tv, /tg and the indicator code against local fakes")
+    ap.add_argument("--sizes", default="20,200,1000", help="universe sizes, e.g. 20,200,1000,5000")
+    ap.add_argument("--requests", type=int, default=200, help="requests per endpoint for /tv and /tg")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--scan-repeats", type=int, default=5, help="warm /scan calls after the cold one")
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="fake upstream latency")
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of upstream calls answered with 500")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of upstream calls answered with 429")
+    ap.add_argument("--retry-after", type=int, default=1, help="retry_after (sec) on injected Telegram 429s")
+    ap.add_argument("--analyze-cache-ttl", type=float, default=60)
+    ap.add_argument("--tv-async", action="store_true", help="benchmark the queued /tv path (TV_ASYNC=1)")
+    ap.add_argument("--tf", default="1D", help="alert timeframes for /tv, e.g. 1D or 5,15,60,240 (intraday = resampled 5m bars)")
+    ap.add_argument("--real-rate-limits", action="store_true", help="keep the Telegram send rate limits from the env")
+    ap.add_argument("--drain-timeout", type=float, default=120)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="", help="result JSON (default data/bench/bench-<time>.json)")
+    ap.add_argument("--compare", default="", help="previous result JSON to diff against")
+    ap.add_argument("--keep", action="store_true", help="keep the temp work dir")
+    a = ap.parse_args(argv)
+
+    sizes = [int(x) for x in a.sizes.split(",") if x.strip()]
+    faults = dict(latency_ms=a.latency_ms, jitter_ms=a.jitter_ms, fail_rate=a.fail_rate,
+                  rate_limit_rate=a.rate_limit_rate, seed=a.seed)
+    yahoo = FakeYahoo(**faults).start()
+    tg = FakeTelegram(retry_after=a.retry_after, **faults).start()
+    work = tempfile.mkdtemp(prefix="bench-")
+    configure_env(a, work, yahoo, tg)
+
+    t_import = time.perf_counter()
+    import main as bot
+    import_sec = time.perf_counter() - t_import
+    srv, base = serve_app(bot.app)
+
+    results = {"import_main_sec": round(import_sec, 3), "sizes": {}}
+    try:
+        # cold start: the first alert lands while the warm-up is still loading
+        t0 = time.perf_counter()
+        requests.post(f"{base}/tv", json={"ticker": "S00000", "direction": "BUY", "tf": "1D", "price": "0"}, timeout=120)
+        results["first_tv_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        print(f"import main {import_sec:.3f}s | first /tv {results['first_tv_ms']}ms")
+        for n in sizes:
+            universe = [f"S{i:05d}" for i in range(n)]
+            print(f"== {n} symbols")
+            results["sizes"][str(n)] = r = bench_size(bot, base, universe, a, yahoo, tg)
+            for name in ("scan_legacy", "scan_swing"):
+                print(f"  /scan {name[5:]:6s} cold {r[name]['cold_sec']:.2f}s "
+                      f"({r[name]['cold_symbols_per_sec']} sym/s) | warm p50 {r[name]['warm']['p50']}ms")
+            for name in ("tv", "tg"):
+                x = r[name]
+                print(f"  /{name:3s} p50 {x['p50']}ms p95 {x['p95']}ms p99 {x['p99']}ms | {x['rps']} req/s | {x['status']}")
+        results["micro"] = bench_micro(bot, "S00000")
+        results["startup"] = bot.STARTUP.report()
+        for k, v in results["micro"].items():
+            if isinstance(v, dict):
+                print(f"  {k:24s} {v['median_us']:.1f}us")
+    finally:
+        srv.shutdown()
+        yahoo.stop()
+        tg.stop()
+        if not a.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "created_at": time.time(), "git_rev": _git_rev(), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "numpy": np.__version__,
+        },
+        "config": vars(a),
+        "results": results,
+        "upstream": {"yahoo": yahoo.stats(), "telegram": tg.stats(), "delivery": bot._tg_sender.stats()},
+    }
+    out = a.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bench",
+                                time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {out}")
+
+    if a.compare:
+        with open(a.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        for k, x, y, pct in compare(old, report):
+            print(f"  {k:50s} {x:12.3f} -> {y:12.3f}  {pct:+7.1f}%")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
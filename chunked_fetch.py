@@ -0,0 +1,102 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# ================= Concurrent, adaptive chunked fetching =================
+# Splits a symbol list into chunks, runs up to `workers` chunk downloads at a
+# time and sizes the next chunk from how the previous ones went (AIMD: grow
+# while chunks are fast and clean, halve on errors, shrink when slow).
+# Only the symbols that failed are retried, in later (smaller) chunks.
+# on_done(ok, failed) runs on the calling thread as each chunk finishes, so
+# callers can rank a chunk and drop its data before the next one lands.
+#
+#   stats = run_chunked(symbols, fetch, on_done=rank_chunk, workers=8)
+#   fetch(group, attempt) -> set of symbols that succeeded (raise = all failed),
+#                            or (set, busy_sec) when part of the call was spent
+#                            waiting on a shared lock: sizing uses busy_sec only
+
+
+class AdaptiveChunker:
+    def __init__(self, initial=60, min_size=10, max_size=200, target_sec=8.0, step=10, max_error_rate=0.2):
+        self.min_size = max(int(min_size), 1)
+        self.max_size = max(int(max_size), self.min_size)
+        self.size = min(max(int(initial), self.min_size), self.max_size)
+        self.target_sec = float(target_sec)
+        self.step = max(int(step), 1)
+        self.max_error_rate = float(max_error_rate)
+        self.history = deque(maxlen=50)  # (size, failed, elapsed)
+        self._lock = threading.Lock()
+
+    def record(self, size, failed, elapsed, error=False):
+        with self._lock:
+            self.history.append((size, failed, elapsed))
+            if error or (size and failed / size > self.max_error_rate):
+                self.size = max(self.min_size, self.size // 2)
+            elif elapsed > self.target_sec:
+                self.size = max(self.min_size, int(self.size * 0.75))
+            elif size >= self.size:
+                # only a full-size chunk says anything about a bigger one
+                self.size = min(self.max_size, self.size + self.step)
+            return self.size
+
+
+def run_chunked(items, fetch, on_done=None, workers=4, chunker=None, retries=2, retry_delay=0.5):
+    chunker = chunker or AdaptiveChunker()
+    pending = deque((it, 0) for it in items)
+    stats = {"items": len(pending), "ok": 0, "failed": 0, "retried": 0, "chunks": 0, "chunk_errors": 0,
+             "callback_errors": 0, "chunk_sizes": [], "elapsed_sec": 0.0}
+    t0 = time.perf_counter()
+
+    def run_one(group):
+        attempt = max(a for _, a in group)
+        if attempt and retry_delay > 0:
+            time.sleep(retry_delay * attempt)
+        start = time.perf_counter()
+        busy = None
+        try:
+            ok = fetch([it for it, _ in group], attempt) or set()
+            if isinstance(ok, tuple):
+                ok, busy = ok
+            err = False
+        except Exception:
+            ok, err = set(), True
+        return group, ok, time.perf_counter() - start if busy is None else busy, err
+
+    with ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix="chunk-fetch") as ex:
+        running = set()
+        while pending or running:
+            while pending and len(running) < max(int(workers), 1):
+                n = min(chunker.size, len(pending))
+                group = [pending.popleft() for _ in range(n)]
+                stats["chunks"] += 1
+                stats["chunk_sizes"].append(n)
+                running.add(ex.submit(run_one, group))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                group, ok, elapsed, err = fut.result()
+                failed = [(it, a) for it, a in group if it not in ok]
+                chunker.record(len(group), len(failed), elapsed, err)
+                stats["chunk_errors"] += int(err)
+                final = []
+                for it, a in failed:
+                    if a < retries:
+                        pending.append((it, a + 1))
+                        stats["retried"] += 1
+                    else:
+                        final.append(it)
+                good = [it for it, _ in group if it in ok]
+                stats["ok"] += len(good)
+                stats["failed"] += len(final)
+                if on_done and (good or final):
+                    try:
+                        on_done(good, final)
+                    except Exception:
+                        stats["callback_errors"] += 1
+
+    stats["elapsed_sec"] = round(time.perf_counter() - t0, 3)
+    stats["final_chunk_size"] = chunker.size
+    sizes = stats.pop("chunk_sizes")
+    stats["chunk_size_min"] = min(sizes) if sizes else 0
+    stats["chunk_size_max"] = max(sizes) if sizes else 0
+    return stats
@@ -0,0 +1,103 @@
+import time
+import threading
+
+# ================= Alert coalescing =================
+# Buffers accepted alerts per chat and emits one digest per window. A chat's
+# buffer is flushed when its window (counted from the first buffered alert)
+# expires or as soon as it reaches max_items. on_sent(chat_id, items) runs
+# only after a digest went out; flush_all() sends whatever is still buffered
+# (call it on shutdown, or those alerts are lost with the process).
+
+class AlertCoalescer:
+    def __init__(self, sender, formatter, window_sec: float = 15.0, max_items: int = 20, on_sent=None):
+        self.sender = sender          # sender(text, chat_id) -> (ok, info)
+        self.formatter = formatter    # formatter(items) -> text
+        self.on_sent = on_sent        # on_sent(chat_id, items) after a successful send
+        self.window_sec = float(window_sec)
+        self.max_items = max(int(max_items), 1)
+        self._buffers = {}            # chat_id -> {"opened": ts, "items": [...]}
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+        self.added = 0
+        self.digests = 0
+        self.flushed_full = 0
+        self.send_failures = 0
+
+    def _start_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="alert-coalescer", daemon=True)
+            self._thread.start()
+
+    def add(self, chat_id, item):
+        full = None
+        with self._lock:
+            self._start_locked()
+            buf = self._buffers.get(chat_id)
+            if buf is None:
+                buf = self._buffers[chat_id] = {"opened": time.monotonic(), "items": []}
+            buf["items"].append(item)
+            self.added += 1
+            if len(buf["items"]) >= self.max_items:
+                full = self._buffers.pop(chat_id)["items"]
+                self.flushed_full += 1
+            else:
+                self._wake.notify()
+            pending = len(buf["items"]) if full is None else 0
+        if full is not None:
+            self._emit(chat_id, full)
+        return pending
+
+    def _emit(self, chat_id, items):
+        ok, _ = self.sender(self.formatter(items), chat_id)
+        with self._lock:
+            self.digests += 1
+            if not ok:
+                self.send_failures += 1
+        if ok and self.on_sent is not None:
+            self.on_sent(chat_id, items)
+
+    def _due_locked(self, now):
+        return [c for c, b in self._buffers.items() if now - b["opened"] >= self.window_sec]
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                while not self._buffers:
+                    self._wake.wait()
+                now = time.monotonic()
+                due = self._due_locked(now)
+                if not due:
+                    nxt = min(b["opened"] for b in self._buffers.values()) + self.window_sec
+                    self._wake.wait(timeout=max(nxt - now, 0.05))
+                    continue
+                batches = [(c, self._buffers.pop(c)["items"]) for c in due]
+            for chat_id, items in batches:
+                try:
+                    self._emit(chat_id, items)
+                except Exception as e:
+                    print("=== COALESCER ERROR ===", e)
+
+    def flush_all(self):
+        with self._lock:
+            batches = list(self._buffers.items())
+            self._buffers.clear()
+        for chat_id, buf in batches:
+            try:
+                self._emit(chat_id, buf["items"])
+            except Exception as e:
+                print("=== COALESCER ERROR ===", e)
+        return len(batches)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "window_sec": self.window_sec,
+                "max_items": self.max_items,
+                "pending": sum(len(b["items"]) for b in self._buffers.values()),
+                "chats": len(self._buffers),
+                "added": self.added,
+                "digests": self.digests,
+                "flushed_full": self.flushed_full,
+                "send_failures": self.send_failures,
+            }
@@ -0,0 +1,268 @@
+import json
+import time
+import random
+import zlib
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+from bar_store import DAY_SEC, period_days
+
+# ================= Local fakes for Yahoo chart + Telegram Bot API =================
+# Used by bench.py (and handy for manual runs): point YAHOO_CHART_BASE and
+# TELEGRAM_API_BASE at these and the bot never leaves the machine.
+# Both inject latency, 5xx failures and 429s at configurable rates.
+#
+#   yahoo = FakeYahoo(latency_ms=5, fail_rate=0.01).start()
+#   tg = FakeTelegram(rate_limit_rate=0.02, retry_after=1).start()
+#   os.environ["YAHOO_CHART_BASE"] = yahoo.url
+
+SESSION_OPEN_SEC = 14 * 3600 + 30 * 60  # 09:30 ET as UTC, like the chart API stamps
+SESSION_SEC = 390 * 60
+INTERVAL_SEC = {"1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800, "60m": 3600, "90m": 5400, "1h": 3600}
+
+def _weekdays(n_days, end_ts=None):
+    d = int((time.time() if end_ts is None else end_ts) // DAY_SEC)
+    days = []
+    while len(days) < n_days:
+        if datetime.fromtimestamp(d * DAY_SEC, timezone.utc).weekday() < 5:
+            days.append(d)
+        d -= 1
+    days.reverse()
+    return days
+
+def synth_bars(symbol: str, n_bars: int = 520, end_ts: float | None = None, step_sec: int = DAY_SEC):
+    # deterministic per symbol: the same ticker always gets the same history.
+    # step_sec < 1 day -> intraday bars over the regular session, n_bars of them
+    rng = np.random.default_rng(zlib.crc32(f"{symbol.upper()}:{step_sec}".encode()) if step_sec < DAY_SEC
+                                else zlib.crc32(symbol.upper().encode()))
+    if step_sec < DAY_SEC:
+        per_day = SESSION_SEC // step_sec
+        offsets = SESSION_OPEN_SEC + np.arange(per_day) * step_sec
+        days = _weekdays(-(-n_bars // per_day), end_ts)
+        stamps = (np.array(days, dtype=np.float64)[:, None] * DAY_SEC + offsets).ravel()[-n_bars:]
+    else:
+        stamps = np.array(_weekdays(n_bars, end_ts), dtype=np.float64) * DAY_SEC + SESSION_OPEN_SEC
+    scale = np.sqrt(min(step_sec, SESSION_SEC) / SESSION_SEC)
+
+    start = rng.uniform(5, 250)
+    rets = rng.normal(rng.uniform(-0.001, 0.002) * scale ** 2, rng.uniform(0.01, 0.03) * scale, n_bars)
+    close = start * np.exp(np.cumsum(rets))
+    open_ = np.concatenate([[start], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.012 * scale, n_bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.lognormal(np.log(rng.uniform(0.5e6, 8e6)), 0.4, n_bars).round()
+    return {
+        "ts": stamps,
+        "open": open_, "high": high, "low": low, "close": close, "volume": volume,
+    }
+
+
+class _Faults:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, fail_rate=0.0, rate_limit_rate=0.0, seed=0):
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.fail_rate = float(fail_rate)
+        self.rate_limit_rate = float(rate_limit_rate)
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        # -> (sleep_sec, None | "fail" | "429")
+        with self._lock:
+            jitter = self._rnd.uniform(0, self.jitter_ms) if self.jitter_ms > 0 else 0.0
+            x = self._rnd.random()
+        fault = None
+        if x < self.fail_rate:
+            fault = "fail"
+        elif x < self.fail_rate + self.rate_limit_rate:
+            fault = "429"
+        return (self.latency_ms + jitter) / 1000.0, fault
+
+
+class _FakeServer:
+    def __init__(self, host="127.0.0.1", port=0, **faults):
+        self.faults = _Faults(**faults)
+        self.counters = {"requests": 0, "ok": 0, "failed": 0, "rate_limited": 0}
+        self._lock = threading.Lock()
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, headers=None):
+                data = json.dumps(body).encode() if not isinstance(body, bytes) else body
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self):
+                owner._count("requests")
+                sleep, fault = owner.faults.draw()
+                if sleep > 0:
+                    time.sleep(sleep)
+                n = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(n) if n else b""
+                if fault == "fail":
+                    owner._count("failed")
+                    return self._reply(500, {"ok": False, "error": "injected failure"})
+                if fault == "429":
+                    owner._count("rate_limited")
+                    return self._reply(*owner.rate_limited())
+                status, body = owner.route(self.command, self.path, self.headers, raw)
+                owner._count("ok" if status == 200 else "failed")
+                return self._reply(status, body)
+
+            do_GET = _handle
+            do_POST = _handle
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def reset(self):
+        with self._lock:
+            for k in self.counters:
+                self.counters[k] = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def rate_limited(self):
+        return 429, {"ok": False, "error": "Too Many Requests"}, {"Retry-After": "1"}
+
+    def route(self, method, path, headers, raw):
+        return 404, {"ok": False, "error": "not found"}
+
+
+class FakeYahoo(_FakeServer):
+    # GET /v8/finance/chart/<SYMBOL>?range=6mo|period1=..&interval=1d|5m|1h...
+    # (intraday: the last 60 sessions, like Yahoo's 5m limit); unknown_symbols get Yahoo's 404
+    def __init__(self, n_bars=520, intraday_days=60, unknown_symbols=(), **kw):
+        super().__init__(**kw)
+        self.n_bars = int(n_bars)
+        self.intraday_days = int(intraday_days)
+        self.unknown_symbols = {str(x).upper() for x in unknown_symbols}
+        self._bars = {}
+
+    def bars_for(self, symbol, interval="1d"):
+        step = INTERVAL_SEC.get(interval, DAY_SEC)
+        b = self._bars.get((symbol, step))
+        if b is None:
+            n = self.n_bars if step == DAY_SEC else self.intraday_days * (SESSION_SEC // step)
+            b = self._bars[(symbol, step)] = synth_bars(symbol, n, step_sec=step)
+        return b
+
+    def route(self, method, path, headers, raw):
+        u = urlparse(path)
+        if not u.path.startswith("/v8/finance/chart/"):
+            return 404, {"chart": {"result": None, "error": {"code": "Not Found"}}}
+        symbol = u.path.rsplit("/", 1)[-1].upper()
+        if symbol in self.unknown_symbols:
+            return 404, {"chart": {"result": None, "error": {"code": "Not Found", "description": "No data found, symbol may be delisted"}}}
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        b = self.bars_for(symbol, q.get("interval", "1d"))
+        if "period1" in q:
+            start = float(q["period1"])
+        else:
+            start = time.time() - period_days(q.get("range", "6mo")) * DAY_SEC
+        i = int(np.searchsorted(b["ts"], start, side="left"))
+        result = {
+            "meta": {"symbol": symbol, "dataGranularity": q.get("interval", "1d")},
+            "timestamp": [int(t) for t in b["ts"][i:]],
+            "indicators": {"quote": [{
+                k: [round(float(x), 4) for x in b[k][i:]] for k in ("open", "high", "low", "close", "volume")
+            }]},
+        }
+        return 200, {"chart": {"result": [result], "error": None}}
+
+
+class FakeTelegram(_FakeServer):
+    # POST /bot<token>/<method>; answers getMe, sendMessage and the rest with ok
+    def __init__(self, retry_after=1, **kw):
+        super().__init__(**kw)
+        self.retry_after = int(retry_after)
+        self.methods = {}
+        self._msg_id = 0
+
+    def rate_limited(self):
+        return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after "
+                     f"{self.retry_after}", "parameters": {"retry_after": self.retry_after}}, {}
+
+    def _params(self, headers, raw):
+        ctype = (headers.get("Content-Type") or "").lower()
+        try:
+            if "json" in ctype:
+                return json.loads(raw or b"{}")
+            if "x-www-form-urlencoded" in ctype:
+                return {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+        except Exception:
+            pass
+        return {}
+
+    def route(self, method, path, headers, raw):
+        parts = urlparse(path).path.strip("/").split("/")
+        if len(parts) != 2 or not parts[0].startswith("bot"):
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        name = parts[1]
+        with self._lock:
+            self.methods[name] = self.methods.get(name, 0) + 1
+            self._msg_id += 1
+            msg_id = self._msg_id
+        if name == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot",
+                                                "can_join_groups": True, "can_read_all_group_messages": False,
+                                                "supports_inline_queries": False}}
+        if name in ("sendMessage", "editMessageText"):
+            p = self._params(headers, raw)
+            chat_id = p.get("chat_id", 0)
+            try:
+                chat_id = int(chat_id)
+            except Exception:
+                pass
+            return 200, {"ok": True, "result": {
+                "message_id": msg_id, "date": int(time.time()), "text": str(p.get("text", ""))[:64],
+                "chat": {"id": chat_id, "type": "private"},
+            }}
+        return 200, {"ok": True, "result": True}
+
+    def stats(self):
+        out = super().stats()
+        with self._lock:
+            out["methods"] = dict(self.methods)
+        return out
+
+    def reset(self):
+        super().reset()
+        with self._lock:
+            self.methods.clear()
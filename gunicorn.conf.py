@@ -0,0 +1,19 @@
+import sys
+
+# ================= gunicorn hooks =================
+# Picked up automatically from the working directory (`gunicorn main:app`).
+# Warm-up and the scheduler start per serving worker, never in the master,
+# also under --preload. main.py starts them on the first request otherwise.
+# worker_exit sends alerts still waiting for a digest before the worker goes.
+
+
+def post_worker_init(worker):
+    main = sys.modules.get("main")
+    if main is not None:
+        main.start_background()
+
+
+def worker_exit(server, worker):
+    main = sys.modules.get("main")
+    if main is not None:
+        main.flush_alerts()
@@ -0,0 +1,176 @@
+import numpy as np
+
+from bar_store import Bars
+
+# ================= Vectorized indicators (symbols x bars) =================
+# Every function takes 2-D float arrays shaped (symbols, bars), right-aligned
+# (latest bar in the last column) and NaN-padded where a symbol has no bar.
+# Outputs have the same shape; a value is NaN until its window is complete.
+#
+# smoothing="simple" reproduces the original per-symbol helpers (plain mean of
+# the last n gains/losses/true ranges); smoothing="wilder" is Wilder's RMA.
+#
+# A bar_store.Bars is accepted wherever arrays are: single-series functions
+# use its close, the high/low/close ones unpack it (complete rows only).
+
+def as_matrix(x):
+    if isinstance(x, Bars):
+        x = x.valid_only().close
+    a = np.asarray(x, dtype=np.float64)
+    return a.reshape(1, -1) if a.ndim == 1 else a
+
+def _hlc(high, low, close):
+    if isinstance(high, Bars):
+        b = high.valid_only()
+        return b.high, b.low, b.close
+    return high, low, close
+
+def align_bars(cols_list, length: int | None = None, fields=("high", "low", "close", "volume")):
+    # Aligns per-symbol column dicts (bar_store layout) on the union of their
+    # timestamps; missing bars become NaN. Returns (ts, {field: matrix}).
+    cols_list = [c.valid_only() if isinstance(c, Bars) else c for c in cols_list]
+    stamps = [np.asarray(c["ts"]) for c in cols_list if c is not None and len(c["ts"])]
+    if not stamps:
+        return np.empty(0), {f: np.empty((len(cols_list), 0)) for f in fields}
+    ts = np.unique(np.concatenate(stamps))
+    if length is not None:
+        ts = ts[-int(length):]
+    out = {f: np.full((len(cols_list), len(ts)), np.nan) for f in fields}
+    for i, c in enumerate(cols_list):
+        if c is None or not len(c["ts"]):
+            continue
+        src = np.asarray(c["ts"])
+        pos = np.searchsorted(ts, src)
+        ok = (pos < len(ts)) & (ts[np.minimum(pos, len(ts) - 1)] == src)
+        for f in fields:
+            out[f][i, pos[ok]] = np.asarray(c[f])[ok]
+    return ts, out
+
+def stack_bars(cols_list, length: int | None = None, fields=("high", "low", "close", "volume")):
+    # Right-aligns per-symbol series by position instead of timestamp, so
+    # symbols with different calendars (crypto, foreign listings) each keep
+    # their own last bars; row i equals computing on cols_list[i] alone.
+    cols_list = [c.valid_only() if isinstance(c, Bars) else c for c in cols_list]
+    n = max((len(c["ts"]) for c in cols_list if c is not None), default=0)
+    if length is not None:
+        n = min(n, int(length))
+    out = {f: np.full((len(cols_list), n), np.nan) for f in fields}
+    for i, c in enumerate(cols_list):
+        k = 0 if c is None else min(len(c["ts"]), n)
+        if k:
+            for f in fields:
+                out[f][i, n - k:] = np.asarray(c[f], dtype=np.float64)[-k:]
+    return out
+
+def rolling_mean(x, n: int):
+    x = as_matrix(x)
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < n:
+        return out
+    valid = ~np.isnan(x)
+    csum = np.cumsum(np.where(valid, x, 0.0), axis=1)
+    ccnt = np.cumsum(valid, axis=1)
+    csum = np.concatenate([np.zeros((x.shape[0], 1)), csum], axis=1)
+    ccnt = np.concatenate([np.zeros((x.shape[0], 1), dtype=ccnt.dtype), ccnt], axis=1)
+    wsum = csum[:, n:] - csum[:, :-n]
+    wcnt = ccnt[:, n:] - ccnt[:, :-n]
+    out[:, n - 1:] = np.where(wcnt == n, wsum / n, np.nan)
+    return out
+
+def _rolling_reduce(x, n: int, fn):
+    x = as_matrix(x)
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < n:
+        return out
+    win = np.lib.stride_tricks.sliding_window_view(x, n, axis=1)
+    out[:, n - 1:] = fn(win, axis=-1)  # NaN anywhere in the window -> NaN
+    return out
+
+def rolling_max(x, n: int):
+    return _rolling_reduce(x, n, np.max)
+
+def rolling_min(x, n: int):
+    return _rolling_reduce(x, n, np.min)
+
+def shift(x, k: int = 1):
+    x = as_matrix(x)
+    out = np.full(x.shape, np.nan)
+    if k < x.shape[1]:
+        out[:, k:] = x[:, :-k] if k else x
+    return out
+
+def wilder_mean(x, n: int):
+    # RMA seeded with the simple mean of the first complete window.
+    x = as_matrix(x)
+    seed = rolling_mean(x, n)
+    out = np.full(x.shape, np.nan)
+    state = np.full(x.shape[0], np.nan)
+    for t in range(x.shape[1]):
+        state = np.where(np.isnan(state), seed[:, t], (state * (n - 1) + x[:, t]) / n)
+        out[:, t] = state
+    return out
+
+def _smooth(x, n: int, smoothing: str):
+    return wilder_mean(x, n) if smoothing == "wilder" else rolling_mean(x, n)
+
+def rsi(close, n: int = 14, smoothing: str = "simple"):
+    close = as_matrix(close)
+    diff = close - shift(close, 1)
+    gain = np.where(np.isnan(diff), np.nan, np.maximum(diff, 0.0))
+    loss = np.where(np.isnan(diff), np.nan, np.maximum(-diff, 0.0))
+    avg_gain = _smooth(gain, n, smoothing)
+    avg_loss = _smooth(loss, n, smoothing)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return np.where(avg_loss == 0, 100.0, out)
+
+def true_range(high, low=None, close=None):
+    high, low, close = _hlc(high, low, close)
+    high, low, close = as_matrix(high), as_matrix(low), as_matrix(close)
+    prev = shift(close, 1)
+    return np.maximum(high - low, np.maximum(np.abs(high - prev), np.abs(low - prev)))
+
+def atr(high, low=None, close=None, n: int = 14, smoothing: str = "simple"):
+    return _smooth(true_range(high, low, close), n, smoothing)
+
+def donchian(high, low=None, n: int = 20, include_current: bool = False):
+    # Highest high / lowest low of the previous n bars (current bar excluded
+    # by default, which is what a breakout test compares against).
+    high, low, _ = _hlc(high, low, None)
+    hi, lo = rolling_max(high, n), rolling_min(low, n)
+    if include_current:
+        return hi, lo
+    return shift(hi, 1), shift(lo, 1)
+
+def compute_indicators(high, low=None, close=None, volume=None, smoothing: str = "simple",
+                       ma_fast: int = 20, ma_slow: int = 50, rsi_n: int = 14,
+                       atr_n: int = 14, channel_n: int = 20, vol_n: int = 20):
+    if isinstance(high, Bars):
+        b = high.valid_only()
+        high, low, close = b.high, b.low, b.close
+        volume = b.volume if volume is None else volume
+    high, low, close = as_matrix(high), as_matrix(low), as_matrix(close)
+    dc_high, dc_low = donchian(high, low, channel_n)
+    brk_high, brk_low = donchian(close, close, channel_n)
+    series = {
+        "close": close,
+        "ma20": rolling_mean(close, ma_fast),
+        "ma50": rolling_mean(close, ma_slow),
+        "rsi": rsi(close, rsi_n, smoothing),
+        "atr": atr(high, low, close, atr_n, smoothing),
+        "dc_high": dc_high,    # prior 20 highs / lows
+        "dc_low": dc_low,
+        "brk_high": brk_high,  # prior 20 closes (breakout rule in analyze_symbol)
+        "brk_low": brk_low,
+    }
+    if volume is not None:
+        series["avg_vol"] = rolling_mean(as_matrix(volume), vol_n)
+    return series
+
+def latest(series: dict):
+    return {k: (v[:, -1] if v.shape[1] else np.full(v.shape[0], np.nan)) for k, v in series.items()}
+
+def trend_labels(close, ma20, ma50):
+    up = (close > ma50) & (ma20 > ma50)
+    down = (close < ma50) & (ma20 < ma50)
+    return np.where(up, "up", np.where(down, "down", "neutral"))
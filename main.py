@@ -1,14 +1,46 @@
+from __future__ import annotations
+
+import time
+_BOOT_T0 = time.perf_counter()
+
 import os
 import json
+import atexit
 import math
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify
+import calendar
+from datetime import datetime
+from flask import Flask, request, jsonify, g
 import requests
 
+import numpy as np
+
+from bar_store import Bars, BarStore, DAY_SEC, cols_from_df, cols_len, since_cols, period_days
+from ttl_cache import TTLCache
+import indicators as ind
+from work_queue import KeyedWorkQueue
+from telegram_delivery import TelegramSender
+from coalescer import AlertCoalescer
+from state_store import open_state_store
+from metrics import CONTENT_TYPE, REGISTRY, SamplingProfiler, StartupTimer, timed
+from chunked_fetch import AdaptiveChunker, run_chunked
+from snapshot import build_snapshot, load_snapshot, save_snapshot
+from timeframes import HIGHER_TF, TF_SECONDS, parse_tf, resample
+from market_calendar import MarketCalendar
+from scheduler import SessionScheduler
+from providers import CircuitBreaker, Provider, ProviderSet
+from symbols import SymbolIndex
+from recorder import TrafficRecorder
+from signal_journal import GROUPS as SIGNAL_GROUPS, SignalJournal
+from strategy import DEFAULT_PARAMS, build_ideas, load_params, passes_filter, trend_of
+
 # ===== Telegram control imports =====
 import asyncio
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# telegram (PTB) and yfinance/pandas are imported lazily: see _get_tg_app() and get_yf()
+
+STARTUP = StartupTimer(_BOOT_T0)
+STARTUP.record("imports", time.perf_counter() - _BOOT_T0)
 
 app = Flask(__name__)
 
@@ -57,6 +89,17 @@ RUN_KEY = getenv_any(["RUN_KEY", "SCAN_KEY", "CRON_KEY", "JOB_KEY"], "")
 # Telegram webhook secret (for /tg endpoint)
 TELEGRAM_WEBHOOK_SECRET = getenv_any(["TELEGRAM_WEBHOOK_SECRET", "TG_WEBHOOK_SECRET"], "").strip()
 
+# Telegram delivery: rate limits (msgs/sec), max local wait, retry spool file
+TG_GLOBAL_RATE = getenv_float_any(["TG_GLOBAL_RATE"], 25)
+TG_CHAT_RATE = getenv_float_any(["TG_CHAT_RATE"], 1)
+TG_GROUP_RATE_PER_MIN = getenv_float_any(["TG_GROUP_RATE_PER_MIN"], 20)
+TG_MAX_WAIT_SEC = getenv_float_any(["TG_MAX_WAIT_SEC"], 10)
+TG_SPOOL_PATH = getenv_any(["TG_SPOOL_PATH"], os.path.join(os.path.dirname(__file__), "data", "tg_spool.jsonl"))
+
+# Telegram command bot: each update is its own task on the bot loop (see /tg),
+# blocking work runs in a thread pool of this size
+TG_BLOCKING_WORKERS = getenv_int_any(["TG_BLOCKING_WORKERS"], 4)
+
 # Scanner settings (legacy - still used in /scan)
 STOP_LOSS_PCT = getenv_float_any(["STOP_LOSS_PCT", "SL_PCT"], 3)
 TAKE_PROFIT_PCT = getenv_float_any(["TAKE_PROFIT_PCT", "TP_PCT"], 5)
@@ -65,10 +108,133 @@ MIN_PRICE = getenv_float_any(["MIN_PRICE"], 2)
 MAX_PRICE = getenv_float_any(["MAX_PRICE"], 300)
 MIN_AVG_VOL = getenv_int_any(["MIN_AVG_VOL", "MIN_VOLUME"], 1_500_000)
 
+# /scan mode: legacy (change% + volume) | swing (analyze_symbol scoring)
+SCAN_MODE = getenv_any(["SCAN_MODE"], "legacy").lower()
+
 # Cooldown minutes for duplicate alerts (TradingView)
 ALERT_COOLDOWN_MIN = getenv_int_any(["ALERT_COOLDOWN_MIN"], 60)
 
-_state = {"day_key": None, "sent_symbols": set()}
+# /tv acceptance mode: validate + enqueue + 202, analysis/delivery on a worker pool
+TV_ASYNC = getenv_any(["TV_ASYNC", "WEBHOOK_ASYNC"], "0").lower() in ("1", "true", "yes", "on")
+TV_QUEUE_WORKERS = getenv_int_any(["TV_QUEUE_WORKERS"], 4)
+TV_QUEUE_MAX = getenv_int_any(["TV_QUEUE_MAX"], 200)
+
+# Coalesce accepted TV alerts into one digest per window (0 = send each alert)
+ALERT_COALESCE_SEC = getenv_float_any(["ALERT_COALESCE_SEC", "COALESCE_WINDOW_SEC"], 0)
+ALERT_COALESCE_MAX = getenv_int_any(["ALERT_COALESCE_MAX"], 20)
+
+# Scan downloads: concurrent chunks, sized adaptively between MIN and MAX
+SCAN_FETCH_WORKERS = getenv_int_any(["SCAN_FETCH_WORKERS"], 8)
+SCAN_CHUNK_INIT = getenv_int_any(["SCAN_CHUNK_INIT", "SCAN_CHUNK"], 60)
+SCAN_CHUNK_MIN = getenv_int_any(["SCAN_CHUNK_MIN"], 10)
+SCAN_CHUNK_MAX = getenv_int_any(["SCAN_CHUNK_MAX"], 200)
+SCAN_CHUNK_TARGET_SEC = getenv_float_any(["SCAN_CHUNK_TARGET_SEC"], 8)
+SCAN_FETCH_RETRIES = getenv_int_any(["SCAN_FETCH_RETRIES"], 2)
+
+# Local bar store (history cache on disk, refreshed incrementally)
+BAR_STORE_DIR = getenv_any(["BAR_STORE_DIR", "DATA_DIR"], os.path.join(os.path.dirname(__file__), "data", "bars"))
+BAR_REFRESH_SEC = getenv_int_any(["BAR_REFRESH_SEC"], 60)
+
+# RSI/ATR smoothing: "simple" (mean of last 14, original behavior) or "wilder"
+INDICATOR_SMOOTHING = getenv_any(["INDICATOR_SMOOTHING"], "simple").lower()
+
+# Strategy parameter set (written by optimize.py --out); defaults when missing
+STRATEGY_PARAMS_PATH = getenv_any(["STRATEGY_PARAMS_PATH"], os.path.join(os.path.dirname(__file__), "data", "strategy_params.json"))
+
+# Upstream endpoints (overridable so bench.py can point the bot at local fakes)
+YAHOO_CHART_BASE = getenv_any(["YAHOO_CHART_BASE"], "https://query1.finance.yahoo.com").rstrip("/")
+TELEGRAM_API_BASE = getenv_any(["TELEGRAM_API_BASE"], "https://api.telegram.org").rstrip("/")
+USE_YFINANCE = getenv_any(["USE_YFINANCE"], "1").lower() in ("1", "true", "yes", "on")
+TICKERS_PATH = getenv_any(["TICKERS_PATH", "UNIVERSE_PATH"], os.path.join(os.path.dirname(__file__), "tickers.txt"))
+
+# Precomputed daily analysis snapshot (built via /snapshot); older than this = ignored
+SNAPSHOT_PATH = getenv_any(["SNAPSHOT_PATH"], os.path.join(os.path.dirname(__file__), "data", "analysis_snapshot.json"))
+SNAPSHOT_MAX_AGE_H = getenv_float_any(["SNAPSHOT_MAX_AGE_H"], 96)
+
+# Multi-timeframe: intraday alerts (tf 5m..4h) are analyzed on bars resampled
+# from one stored base interval; MTF_CONFIRM also filters alerts against the
+# next higher timeframe's trend (e.g. a 15m BUY while 1h is down)
+INTRADAY_BASE_INTERVAL = getenv_any(["INTRADAY_BASE_INTERVAL", "INTRADAY_INTERVAL"], "5m").lower()
+INTRADAY_PERIOD = getenv_any(["INTRADAY_PERIOD"], "59d")  # Yahoo serves 5m bars for the last 60 days
+MTF_CONFIRM = getenv_any(["MTF_CONFIRM", "HTF_CONFIRM"], "0").lower() in ("1", "true", "yes", "on")
+
+# In-process scheduler (replaces the external /scan cron when on): during the
+# session one strided slice of the universe is refreshed every SCHED_TICK_SEC,
+# so the whole list is covered each SCHED_INTERVAL_SEC; new ENTER setups are
+# pushed once per day. After the close it rebuilds the analysis snapshot.
+SCHEDULER_ENABLED = getenv_any(["SCHEDULER", "SCHEDULER_ENABLED"], "0").lower() in ("1", "true", "yes", "on")
+SCHED_INTERVAL_SEC = getenv_float_any(["SCHED_INTERVAL_SEC"], 900)
+SCHED_TICK_SEC = getenv_float_any(["SCHED_TICK_SEC"], 30)
+SCHED_START_DELAY_MIN = getenv_float_any(["SCHED_START_DELAY_MIN"], 5)
+SCHED_SNAPSHOT_AFTER_CLOSE = getenv_any(["SCHED_SNAPSHOT_AFTER_CLOSE"], "1").lower() in ("1", "true", "yes", "on")
+SCHED_CLOSE_DELAY_MIN = getenv_float_any(["SCHED_CLOSE_DELAY_MIN"], 20)
+
+# Holidays / early closes on top of the built-in NYSE rules (see market_calendar.py)
+MARKET_CALENDAR_PATH = getenv_any(["MARKET_CALENDAR_PATH"], os.path.join(os.path.dirname(__file__), "data", "market_calendar.json"))
+
+# Market data for single-symbol lookups: yfinance, then the chart API. The
+# second is fired as a hedge when the first is slower than its p95 (clamped
+# to MIN..MAX), a source failing BREAKER_FAILURES times in a row is skipped
+# for BREAKER_RESET_SEC
+PROVIDER_WORKERS = getenv_int_any(["PROVIDER_WORKERS"], 16)
+PROVIDER_HEDGE_MIN_MS = getenv_float_any(["PROVIDER_HEDGE_MIN_MS"], 150)
+PROVIDER_HEDGE_MAX_MS = getenv_float_any(["PROVIDER_HEDGE_MAX_MS"], 3000)
+PROVIDER_HEDGE_DEFAULT_MS = getenv_float_any(["PROVIDER_HEDGE_DEFAULT_MS"], 1000)
+PROVIDER_BREAKER_FAILURES = getenv_int_any(["PROVIDER_BREAKER_FAILURES"], 5)
+PROVIDER_BREAKER_RESET_SEC = getenv_float_any(["PROVIDER_BREAKER_RESET_SEC"], 30)
+YF_TIMEOUT_SEC = getenv_float_any(["YF_TIMEOUT_SEC"], 10)
+CHART_TIMEOUT_SEC = getenv_float_any(["CHART_TIMEOUT_SEC"], 25)
+
+# Symbol index: tickers.txt plus SYMBOLS_PATH (aliases / extra symbols, see
+# symbols.py). A symbol no provider had data for is rejected without a
+# download for UNFETCHABLE_TTL_SEC (0 = always retry)
+SYMBOLS_PATH = getenv_any(["SYMBOLS_PATH"], os.path.join(os.path.dirname(__file__), "data", "symbols.json"))
+UNFETCHABLE_TTL_SEC = getenv_float_any(["UNFETCHABLE_TTL_SEC", "NEG_CACHE_TTL_SEC"], 6 * 3600)
+UNFETCHABLE_MAX = getenv_int_any(["UNFETCHABLE_MAX"], 4096)
+
+# Time budget for the analysis behind one TradingView alert; past it the alert
+# goes out without the analysis. TradingView drops webhooks that take longer
+# than a few seconds, queued (TV_ASYNC) alerts have more room.
+TV_DEADLINE_SEC = getenv_float_any(["TV_DEADLINE_SEC", "TV_BUDGET_SEC"], 2.5)
+TV_ASYNC_DEADLINE_SEC = getenv_float_any(["TV_ASYNC_DEADLINE_SEC"], 20)
+
+# Cold start: import yfinance and build/initialize the Telegram app in a
+# background thread once the worker is up (0 = only on first use)
+WARMUP_ON_START = getenv_any(["WARMUP_ON_START", "WARMUP"], "1").lower() in ("1", "true", "yes", "on")
+WARMUP_DELAY_SEC = getenv_float_any(["WARMUP_DELAY_SEC"], 0.5)
+
+# analyze_symbol result cache (0 = disabled)
+ANALYZE_CACHE_TTL_SEC = getenv_float_any(["ANALYZE_CACHE_TTL_SEC", "ANALYZE_CACHE_TTL"], 60)
+ANALYZE_CACHE_MAX = getenv_int_any(["ANALYZE_CACHE_MAX"], 512)
+
+# Symbols per batch analyze (/analyze endpoint, /analyze A B C in Telegram)
+ANALYZE_BATCH_MAX = getenv_int_any(["ANALYZE_BATCH_MAX"], 50)
+
+# Signal journal: every idea handed out (TV alerts, scans, /analyze) and its
+# outcome (TP1/TP2/SL/expiry), evaluated after the close or via /stats?evaluate=1.
+# "off" disables; a signal expires SIGNAL_EXPIRY_BARS bars of its timeframe later
+SIGNAL_JOURNAL = getenv_any(["SIGNAL_JOURNAL", "SIGNAL_DB"], "sqlite:///" + os.path.join(os.path.dirname(__file__), "data", "signals.db"))
+SIGNAL_EXPIRY_BARS = getenv_int_any(["SIGNAL_EXPIRY_BARS"], 20)
+SIGNAL_STATS_DAYS = getenv_float_any(["SIGNAL_STATS_DAYS"], 90)
+
+# Opt-in traffic journal of /tv, /webhook and /tg requests for replay.py
+TRAFFIC_RECORD = getenv_any(["TRAFFIC_RECORD", "RECORD_TRAFFIC"], "0").lower() in ("1", "true", "yes", "on")
+TRAFFIC_RECORD_PATH = getenv_any(["TRAFFIC_RECORD_PATH"], os.path.join(os.path.dirname(__file__), "data", "traffic.jsonl"))
+TRAFFIC_RECORD_MAX_MB = getenv_float_any(["TRAFFIC_RECORD_MAX_MB"], 256)
+
+# /metrics access (defaults to RUN_KEY; no key configured = 401, like every keyed endpoint)
+METRICS_KEY = getenv_any(["METRICS_KEY"], RUN_KEY)
+# ?profile=1 reports go back in the JSON response; PROFILE_LOG=1 also prints them
+PROFILE_LOG = getenv_any(["PROFILE_LOG"], "0").lower() in ("1", "true", "yes", "on")
+
+_state = {"day_key": None, "last_fetch": None}
+
+# ================= Metrics (see metrics.py, served at /metrics) =================
+STAGE_SECONDS = REGISTRY.histogram("bot_stage_seconds", "Hot-path time per operation and stage", ("op", "stage"))
+EVENTS = REGISTRY.counter("bot_events_total", "Outcomes per operation", ("op", "event"))
+ERRORS = REGISTRY.counter("bot_errors_total", "Errors per operation", ("op", "kind"))
+HISTORY_SOURCE = REGISTRY.counter("bot_history_source_total", "Where get_history got its bars", ("source",))
+SYMBOL_REJECTS = REGISTRY.counter("bot_symbol_rejected_total", "Symbols rejected without data (invalid, unsupported, negative_cache...)", ("reason",))
 
 # Settings persistence (capital, risk, side...)
 DEFAULT_SETTINGS = {
@@ -78,30 +244,42 @@ DEFAULT_SETTINGS = {
     "filter_mode": "enter_only",  # enter_only | enter_wait
     "cooldown_min": ALERT_COOLDOWN_MIN
 }
-SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "settings.json")
+SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "settings.json")  # legacy, seeds the store once
+
+# Shared state (cooldowns, sent symbols, settings) for all workers
+STATE_STORE = getenv_any(["STATE_STORE", "STATE_DB"], "sqlite:///" + os.path.join(os.path.dirname(__file__), "data", "state.db"))
+with STARTUP.step("state_store"):
+    _state_store = open_state_store(STATE_STORE)
 _settings_cache = None
+_settings_version = -1
 
 def load_settings():
-    global _settings_cache
-    if _settings_cache is not None:
+    global _settings_cache, _settings_version
+    version = _state_store.settings_version()
+    if _settings_cache is not None and version == _settings_version:
         return _settings_cache
     s = DEFAULT_SETTINGS.copy()
-    try:
-        with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            if isinstance(data, dict):
-                s.update(data)
-    except Exception:
-        pass
+    version, data = _state_store.get_settings()
+    if data is None:
+        try:
+            with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            data = None
+    if isinstance(data, dict):
+        s.update(data)
     _settings_cache = s
+    _settings_version = version
     return s
 
 def save_settings(s: dict):
-    global _settings_cache
+    global _settings_cache, _settings_version
     _settings_cache = s
+    # drop cached ideas sized with the old capital/risk/side
+    sizing = _sizing_key(s)
+    _analyze_cache.invalidate(lambda k: k[1] != sizing)
     try:
-        with open(SETTINGS_PATH, "w", encoding="utf-8") as f:
-            json.dump(s, f, ensure_ascii=False, indent=2)
+        _settings_version = _state_store.set_settings(s)
     except Exception:
         pass
 
@@ -112,13 +290,49 @@ try:
 except Exception:
     ET = None
 
-# yfinance
-try:
-    import yfinance as yf
-except Exception:
-    yf = None
+# yfinance (USE_YFINANCE=0 -> chart API only). It pulls in pandas (~0.5-1s),
+# so it is imported on first use or by the warm-up thread, never at boot.
+yf = None
+_yf_loaded = False
+_yf_import_started = False
+_yf_lock = threading.Lock()
+
+def get_yf(block=True):
+    # block=False: don't pay the import on a hot path; start it in the
+    # background (once) and let the caller use the chart API until it is loaded
+    global yf, _yf_loaded, _yf_import_started
+    if not USE_YFINANCE:
+        return None
+    if _yf_loaded:
+        return yf
+    if not block:
+        if not _yf_import_started:
+            _yf_import_started = True
+            threading.Thread(target=get_yf, name="yf-import", daemon=True).start()
+        return None
+    with _yf_lock:
+        if not _yf_loaded:
+            with STARTUP.step("yfinance", lazy=True):
+                try:
+                    import yfinance
+                    yf = yfinance
+                except Exception:
+                    yf = None
+            _yf_loaded = True
+    return yf
 
 # ================= Telegram sendMessage =================
+with STARTUP.step("telegram_sender"):
+    _tg_sender = TelegramSender(
+        TELEGRAM_BOT_TOKEN,
+        spool_path=TG_SPOOL_PATH,
+        global_rate=TG_GLOBAL_RATE,
+        chat_rate=TG_CHAT_RATE,
+        group_rate=TG_GROUP_RATE_PER_MIN / 60.0,
+        max_wait=TG_MAX_WAIT_SEC,
+        api_base=TELEGRAM_API_BASE,
+    )
+
 def send_telegram(text: str, chat_id: str | None = None):
     if not TELEGRAM_BOT_TOKEN:
         return False, "Missing TELEGRAM_BOT_TOKEN"
@@ -127,38 +341,25 @@ def send_telegram(text: str, chat_id: str | None = None):
     if not target:
         return False, "Missing TELEGRAM_CHAT_ID"
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    try:
-        r = requests.post(url, json={"chat_id": target, "text": text}, timeout=20)
-    except Exception as e:
-        return False, f"Telegram request failed: {e}"
-
-    try:
-        data = r.json()
-    except Exception:
-        data = {"raw": r.text}
-
-    if r.status_code != 200:
-        return False, f"Telegram error {r.status_code}: {data}"
-
-    return True, "ok"
+    with timed(STAGE_SECONDS, op="telegram", stage="send"):
+        ok, info = _tg_sender.send(target, text)
+    EVENTS.inc(op="telegram", event="sent" if ok else "failed")
+    return ok, info
 
 # ================= Market / state =================
+_market_calendar = MarketCalendar(MARKET_CALENDAR_PATH)
+
 def market_open_now_et() -> bool:
+    # regular session, minus NYSE holidays and early closes
     if ET is None:
         return True
-    now = datetime.now(ET)
-    if now.weekday() >= 5:
-        return False
-    start = now.replace(hour=9, minute=30, second=0, microsecond=0)
-    end = now.replace(hour=16, minute=0, second=0, microsecond=0)
-    return start <= now <= end
+    return _market_calendar.is_open(datetime.now(ET))
 
 def reset_day():
+    # sent symbols live in the state store, scoped by day_key
     dk = (datetime.now(ET).strftime("%Y-%m-%d") if ET else datetime.utcnow().strftime("%Y-%m-%d"))
-    if _state["day_key"] != dk:
-        _state["day_key"] = dk
-        _state["sent_symbols"] = set()
+    _state["day_key"] = dk
+    return dk
 
 def calc_levels(entry: float):
     sl = entry * (1 - STOP_LOSS_PCT / 100.0)
@@ -166,7 +367,7 @@ def calc_levels(entry: float):
     return round(sl, 4), round(tp, 4)
 
 def load_universe():
-    path = os.path.join(os.path.dirname(__file__), "tickers.txt")
+    path = TICKERS_PATH
     tickers = []
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -178,7 +379,7 @@ def load_universe():
         pass
     return list(dict.fromkeys(tickers))
 
-# ================= Indicators (for /analyze) =================
+# ================= Indicators (scalar reference versions; see indicators.py) =================
 def sma(values, n):
     if len(values) < n:
         return None
@@ -216,28 +417,50 @@ def atr_14(highs, lows, closes):
         trs.append(tr)
     return sum(trs) / 14.0
 
-def compute_position_size(capital, risk_pct, entry, sl):
-    risk_dollars = float(capital) * (float(risk_pct) / 100.0)
-    per_share = abs(float(entry) - float(sl))
-    if per_share <= 0:
-        return 0
-    return max(int(risk_dollars / per_share), 0)
+# ====== Symbol index (TradingView ticker -> provider symbol) + Yahoo Chart fallback ======
+_symbols = {"key": None, "index": SymbolIndex()}
+_symbols_lock = threading.Lock()
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+def symbol_index() -> SymbolIndex:
+    # rebuilt when tickers.txt or the reference file changes (two stats per call)
+    key = (_mtime(TICKERS_PATH), _mtime(SYMBOLS_PATH))
+    if key != _symbols["key"]:
+        with _symbols_lock:
+            if key != _symbols["key"]:
+                _symbols["index"].load(load_universe(), SYMBOLS_PATH)
+                _symbols["key"] = key
+    return _symbols["index"]
+
+def resolve_symbol(raw: str):
+    # -> (symbol, None) | (None, reason); rejections are counted per reason and ticker
+    sym, reason = symbol_index().resolve(raw)
+    if sym is None:
+        reject_symbol(raw, reason)
+    return sym, reason
+
+def reject_symbol(raw: str, reason: str):
+    SYMBOL_REJECTS.inc(reason=reason)
+    symbol_index().reject(raw, reason)
 
-# ====== NEW: Symbol normalize + Yahoo Chart fallback ======
 def normalize_symbol(sym: str) -> str:
-    s = sym.strip().upper()
-    if s in ("SPX", "SP500", "S&P500"):
-        return "^GSPC"
-    if s in ("NDX", "NASDAQ100"):
-        return "^NDX"
-    if s in ("DJI", "DOW"):
-        return "^DJI"
-    return s
+    s = str(sym or "").strip().upper()
+    return symbol_index().resolve(s)[0] or s
 
-def fetch_history_yahoo_chart(symbol: str, range_="6mo", interval="1d"):
+def fetch_history_yahoo_chart(symbol: str, range_="6mo", interval="1d", start_ts=None, min_bars=60, timeout=25):
     symbol = normalize_symbol(symbol)
-    url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
-    params = {"range": range_, "interval": interval, "includePrePost": "false"}
+    url = f"{YAHOO_CHART_BASE}/v8/finance/chart/{symbol}"
+    params = {"interval": interval, "includePrePost": "false"}
+    if start_ts is not None:
+        params["period1"] = str(int(start_ts))
+        params["period2"] = str(int(datetime.utcnow().timestamp()) + DAY_SEC)
+    else:
+        params["range"] = range_
     headers = {
         "User-Agent": "Mozilla/5.0",
         "Accept": "application/json,text/plain,*/*",
@@ -245,10 +468,12 @@ def fetch_history_yahoo_chart(symbol: str, range_="6mo", interval="1d"):
     }
 
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=25)
+        r = requests.get(url, params=params, headers=headers, timeout=timeout)
     except Exception as e:
         return {"ok": False, "error": f"chart request failed: {e}"}
 
+    if r.status_code == 404:
+        return {"ok": False, "error": "chart: symbol not found", "unknown": True}
     if r.status_code != 200:
         return {"ok": False, "error": f"chart http {r.status_code}: {r.text[:200]}"}
 
@@ -258,147 +483,351 @@ def fetch_history_yahoo_chart(symbol: str, range_="6mo", interval="1d"):
         return {"ok": False, "error": "chart bad json"}
 
     try:
-        result = data["chart"]["result"][0]
-        quote = result["indicators"]["quote"][0]
-        closes = [float(x) for x in quote.get("close", []) if x is not None]
-        highs  = [float(x) for x in quote.get("high", []) if x is not None]
-        lows   = [float(x) for x in quote.get("low", []) if x is not None]
+        # whole rows are dropped when high/low/close is missing, so the columns stay aligned
+        bars = Bars.from_chart(data["chart"]["result"][0], interval).valid_only()
     except Exception:
         return {"ok": False, "error": "chart parse failed"}
 
-    if len(closes) < 60 or len(highs) < 60 or len(lows) < 60:
-        return {"ok": False, "error": f"chart not enough data (closes={len(closes)})"}
-
-    return {"ok": True, "closes": closes, "highs": highs, "lows": lows, "symbol": symbol}
+    # incremental refresh may legitimately return a handful of bars
+    if start_ts is None and cols_len(bars) < min_bars:
+        return {"ok": False, "error": f"chart not enough data (closes={cols_len(bars)})", "unknown": not cols_len(bars)}
+
+    return {"ok": True, "bars": bars, "symbol": symbol}
+
+# ====== Bar store: local history, only missing bars are downloaded ======
+_bar_store = BarStore(BAR_STORE_DIR)
+
+# yfinance 0.2.x download() resets and fills module globals (shared._DFS /
+# _ERRORS), so two downloads at once overwrite each other's frames: one at a
+# time per process. Scan chunks still overlap their chart-API and merge work.
+_yf_download_lock = threading.Lock()
+_YF_UNKNOWN_HINTS = ("delisted", "not found", "no data found", "no timezone found", "404")
+
+def _yf_download(tickers, interval, period=None, start_ts=None, lock_timeout=-1, errors=None, waits=None, **kw):
+    # lock_timeout: seconds to wait for a download in progress (-1 = as long as it takes);
+    # errors: dict to receive yfinance's per-ticker error messages (shared._ERRORS);
+    # waits: list to receive the seconds spent waiting for the lock
+    args = dict(interval=interval, auto_adjust=True, progress=False, **kw)
+    if start_ts is not None:
+        args["start"] = datetime.utcfromtimestamp(float(start_ts)).strftime("%Y-%m-%d")
+    else:
+        args["period"] = period
+    t0 = time.monotonic()
+    if not _yf_download_lock.acquire(timeout=lock_timeout):
+        raise TimeoutError("yfinance busy with another download")
+    waited = time.monotonic() - t0
+    if waits is not None:
+        waits.append(waited)
+    if lock_timeout >= 0 and "timeout" in args:
+        args["timeout"] = max(args["timeout"] - waited, 0.1)
+    try:
+        df = get_yf().download(tickers, **args)
+        if errors is not None:
+            errors.update(getattr(getattr(yf, "shared", None), "_ERRORS", None) or {})
+        return df
+    finally:
+        _yf_download_lock.release()
+
+def _yf_history(symbol, timeout, period="6mo", interval="1d", start_ts=None, min_bars=60):
+    with timed(STAGE_SECONDS, op="history", stage="yfinance"):
+        # waiting behind a scan chunk (or a cut call still running) spends the same budget
+        errors = {}
+        df = _yf_download(symbol, interval, period=period, start_ts=start_ts, lock_timeout=timeout, errors=errors,
+                          timeout=timeout)
+    cols = cols_from_df(df, symbol, interval) if df is not None and not df.empty else None
+    if cols is None or not cols_len(cols):
+        # an empty frame is also what a network error looks like: only a
+        # not-found answer marks the symbol (and spares the breaker)
+        err = str(errors.get(symbol) or errors.get(symbol.upper()) or "")
+        unknown = start_ts is None and any(k in err.lower() for k in _YF_UNKNOWN_HINTS)
+        return {"ok": False, "error": f"yfinance returned no data{f' ({err})' if err else ''}", "unknown": unknown}
+    if start_ts is None and cols_len(cols) < min_bars:
+        return {"ok": False, "error": f"yfinance not enough data (bars={cols_len(cols)})"}
+    return {"ok": True, "bars": cols}
+
+def _chart_history(symbol, timeout, period="6mo", interval="1d", start_ts=None, min_bars=60):
+    with timed(STAGE_SECONDS, op="history", stage="yahoo_chart"):
+        return fetch_history_yahoo_chart(symbol, range_=period, interval=interval, start_ts=start_ts,
+                                         min_bars=min_bars, timeout=timeout)
+
+def _breaker():
+    return CircuitBreaker(PROVIDER_BREAKER_FAILURES, PROVIDER_BREAKER_RESET_SEC)
+
+def _yf_available():
+    # yfinance only once loaded (a single symbol is not worth the import) and
+    # only while no download holds the lock: during a scan a per-alert fetch
+    # would queue behind a chunk of up to SCAN_CHUNK_MAX tickers, burn the
+    # hedge delay and fail on its budget, so it goes to the chart API at once
+    if get_yf(block=False) is None:
+        return False
+    if _yf_download_lock.locked():
+        EVENTS.inc(op="history", event="yfinance_busy")
+        return False
+    return True
 
-# ====== UPDATED: analyze_symbol uses yfinance then fallback ======
-def analyze_symbol(symbol: str):
-    symbol = normalize_symbol(symbol)
+_providers = ProviderSet(
+    [Provider("yfinance", _yf_history, YF_TIMEOUT_SEC, available=_yf_available, breaker=_breaker()),
+     Provider("yahoo_chart", _chart_history, CHART_TIMEOUT_SEC, breaker=_breaker())],
+    workers=PROVIDER_WORKERS, hedge_min_sec=PROVIDER_HEDGE_MIN_MS / 1000, hedge_max_sec=PROVIDER_HEDGE_MAX_MS / 1000,
+    hedge_default_sec=PROVIDER_HEDGE_DEFAULT_MS / 1000,
+)
 
-    closes = highs = lows = None
-    used_source = ""
+# (symbol, interval) every provider reported unknown / empty; timeouts and open circuits never land here
+_unfetchable = TTLCache(UNFETCHABLE_TTL_SEC, UNFETCHABLE_MAX)
+
+def get_history(symbol: str, period="6mo", interval="1d", min_bars=60, deadline=None):
+    # deadline: time.monotonic() by which to give up on the network and
+    # answer from the store (or fail, when there is nothing stored).
+    # "unknown": True = rejected without data (see resolve_symbol / _unfetchable)
+    raw = symbol
+    symbol, reason = resolve_symbol(raw)
+    if symbol is None:
+        return {"ok": False, "error": f"unsupported symbol {str(raw).strip().upper()!r} ({reason})", "unknown": True}
+    if _unfetchable.get((symbol, interval)) is not None:
+        reject_symbol(raw, "negative_cache")
+        return {"ok": False, "error": f"no data for {symbol} (cached)", "unknown": True}
+    mode, start_ts = _bar_store.plan(symbol, interval, period, BAR_REFRESH_SEC)
+    source = "store"
+    new_cols = None
+
+    if mode != "fresh":
+        r = _providers.fetch(symbol, deadline=deadline, period=period, interval=interval,
+                             start_ts=start_ts if mode == "incremental" else None, min_bars=min_bars)
+        if r.get("ok"):
+            new_cols = r["bars"]
+            source = r["source"]
+        elif mode == "full":
+            ERRORS.inc(op="history", kind="deadline" if r.get("timeout") else "no_data")
+            if r.get("unknown"):
+                _unfetchable.put((symbol, interval), r.get("error"))
+                reject_symbol(raw, "no_data")
+            return {"ok": False, "error": r.get("error", "not enough data"), "timeout": bool(r.get("timeout")),
+                    "unknown": bool(r.get("unknown"))}
+        else:
+            ERRORS.inc(op="history", kind="deadline" if r.get("timeout") else "refresh_failed")
 
-    # 1) try yfinance
-    if yf is not None:
+        if new_cols is not None and cols_len(new_cols):
+            _bar_store.merge(symbol, interval, new_cols, covered_from=start_ts if mode == "full" else None)
+        else:
+            # sources failed on a refresh: serve what we have rather than nothing
+            _bar_store.touch(symbol, interval)
+            source = "store_stale" if mode == "incremental" else source
+
+    cols = _bar_store.read(symbol, interval)
+    if cols is None:
+        return {"ok": False, "error": "not enough data"}
+    cols = since_cols(cols, datetime.utcnow().timestamp() - period_days(period) * DAY_SEC)
+    if cols_len(cols) < min_bars:
+        return {"ok": False, "error": f"not enough data (bars={cols_len(cols)})"}
+    HISTORY_SOURCE.inc(source=source)
+    return {"ok": True, "symbol": symbol, "bars": cols, "source": source}
+
+def _refresh_group(group, plans, period, interval, full_from):
+    # one chunk of the scan refresh; returns (symbols that got bars, busy seconds).
+    # Time queued on the yfinance lock behind other chunks is left out, so the
+    # adaptive chunk size follows download speed, not the queue
+    t0 = time.perf_counter()
+    waits = []
+    done = set()
+    by_mode = {}
+    for sym in group:
+        by_mode.setdefault(plans[sym][0], []).append(sym)
+    for mode, syms in by_mode.items():
+        start = min(plans[sym][1] for sym in syms) if mode == "incremental" else None
+        covered = full_from if mode == "full" else None
+        if get_yf() is None:
+            # no yfinance: one chart request per symbol
+            for sym in syms:
+                with timed(STAGE_SECONDS, op="refresh", stage="yahoo_chart"):
+                    ch = fetch_history_yahoo_chart(sym, range_=period, interval=interval,
+                                                   start_ts=plans[sym][1] if mode == "incremental" else None, min_bars=1)
+                if ch.get("ok") and cols_len(ch["bars"]):
+                    _bar_store.merge(sym, interval, ch["bars"], covered_from=covered)
+                    done.add(sym)
+                else:
+                    ERRORS.inc(op="refresh", kind="yahoo_chart")
+            continue
         try:
-            df = yf.download(symbol, period="6mo", interval="1d", auto_adjust=True, progress=False)
-            if df is not None and (not df.empty) and len(df) >= 60:
-                closes = [float(x) for x in df["Close"].dropna().tolist()]
-                highs  = [float(x) for x in df["High"].dropna().tolist()]
-                lows   = [float(x) for x in df["Low"].dropna().tolist()]
-                if len(closes) >= 60 and len(highs) >= 60 and len(lows) >= 60:
-                    used_source = "yfinance"
+            with timed(STAGE_SECONDS, op="refresh", stage="yfinance"):
+                df = _yf_download(" ".join(syms), interval, period=period, start_ts=start, waits=waits,
+                                  group_by="ticker", threads=True)
         except Exception:
-            pass
-
-    # 2) fallback to yahoo chart API
-    if closes is None:
-        ch = fetch_history_yahoo_chart(symbol, range_="6mo", interval="1d")
-        if not ch.get("ok"):
-            return {"ok": False, "error": ch.get("error", "not enough data")}
-        closes, highs, lows = ch["closes"], ch["highs"], ch["lows"]
-        symbol = ch.get("symbol", symbol)
-        used_source = "yahoo_chart"
-
-    entry = closes[-1]
-    ma20 = sma(closes, 20)
-    ma50 = sma(closes, 50)
-    rsi = rsi_14(closes)
-    atr = atr_14(highs, lows, closes)
-
-    if ma20 is None or ma50 is None or rsi is None or atr is None:
-        return {"ok": False, "error": "indicator calc failed"}
+            ERRORS.inc(op="refresh", kind="yfinance_chunk")
+            continue
+        for sym in syms:
+            try:
+                cols = cols_from_df(df, sym, interval)
+                if cols is None or not cols_len(cols):
+                    continue
+                _bar_store.merge(sym, interval, cols, covered_from=covered)
+                done.add(sym)
+            except Exception:
+                continue
+        del df  # only one chunk's frame alive per worker
+    return done, time.perf_counter() - t0 - sum(waits)
+
+def stream_history(tickers, period="1mo", interval="1d", on_chunk=None):
+    # Refreshes the store for the scanner: stale symbols are downloaded in
+    # concurrent adaptive chunks (chunked_fetch.py); on_chunk(symbols) is called
+    # for fresh symbols first and then for each chunk as it lands, so callers
+    # can rank incrementally. Symbols that still fail after the retries are
+    # handed over too (their stored bars, if any, are used as they are).
+    plans, fresh = {}, []
+    for sym in tickers:
+        mode, start_ts = _bar_store.plan(sym, interval, period, BAR_REFRESH_SEC)
+        if mode == "fresh":
+            fresh.append(sym)
+        else:
+            plans[sym] = (mode, start_ts)
+
+    if on_chunk:
+        for i in range(0, len(fresh), SCAN_CHUNK_MAX):
+            on_chunk(fresh[i:i + SCAN_CHUNK_MAX])
+
+    def done(ok, failed):
+        for sym in failed:
+            if plans[sym][0] == "incremental":
+                _bar_store.touch(sym, interval)  # don't retry it on every scan
+        if on_chunk:
+            on_chunk(ok + failed)
+
+    full_from = datetime.utcnow().timestamp() - period_days(period) * DAY_SEC
+    stale = sorted(plans, key=lambda sym: plans[sym][0])  # full chunks first, then incremental
+    chunker = AdaptiveChunker(SCAN_CHUNK_INIT, SCAN_CHUNK_MIN, SCAN_CHUNK_MAX, SCAN_CHUNK_TARGET_SEC)
+    stats = run_chunked(
+        stale, lambda group, attempt: _refresh_group(group, plans, period, interval, full_from),
+        on_done=done, workers=SCAN_FETCH_WORKERS, chunker=chunker, retries=SCAN_FETCH_RETRIES,
+    )
+    stats["fresh"] = len(fresh)
+    _state["last_fetch"] = stats
+    return stats
 
-    trend = "up" if entry > ma50 and ma20 > ma50 else ("down" if entry < ma50 and ma20 < ma50 else "neutral")
+def refresh_history_many(tickers, period="1mo", interval="1d"):
+    return stream_history(tickers, period, interval)
 
-    last20 = closes[-21:-1]
-    breakout_up = entry > max(last20) if len(last20) >= 20 else False
-    breakout_down = entry < min(last20) if len(last20) >= 20 else False
+def read_history(symbol: str, period="1mo", interval="1d"):
+    cols = _bar_store.read(symbol, interval)
+    if cols is None:
+        return None
+    return since_cols(cols, datetime.utcnow().timestamp() - period_days(period) * DAY_SEC)
 
-    s = load_settings()
-    capital = float(s.get("capital", 10000.0))
-    risk_pct = float(s.get("risk_pct", 1.0))
-    side = str(s.get("side", "both")).lower()
+# ====== analyze_symbol cache (TTL + LRU, single-flight per symbol) ======
+_analyze_cache = TTLCache(ANALYZE_CACHE_TTL_SEC, ANALYZE_CACHE_MAX)
 
-    # Swing ATR multipliers
-    sl_mult = 1.5
-    tp1_mult = 1.5
-    tp2_mult = 3.0
-
-    ideas = []
-
-    # LONG
-    if side in ("both", "long"):
-        sl = entry - sl_mult * atr
-        tp1 = entry + tp1_mult * atr
-        tp2 = entry + tp2_mult * atr
-        qty = compute_position_size(capital, risk_pct, entry, sl)
-
-        score = 0
-        reasons = []
-        if trend == "up":
-            score += 3; reasons.append("Trend up")
-        if breakout_up:
-            score += 3; reasons.append("Breakout 20D")
-        if 50 <= rsi <= 72:
-            score += 2; reasons.append("RSI 50-72")
-        if rsi > 72:
-            reasons.append("RSI high (pullback risk)")
-        if trend == "down":
-            reasons.append("Trend down (weak long)")
-
-        decision = "ENTER" if score >= 6 else ("WAIT" if score >= 4 else "SKIP")
-
-        ideas.append({
-            "side": "LONG",
-            "decision": decision,
-            "score": score,
-            "entry": entry,
-            "sl": sl,
-            "tp1": tp1,
-            "tp2": tp2,
-            "qty": qty,
-            "reasons": reasons
-        })
+def _sizing_key(s: dict):
+    # the ideas (qty, sides) depend on these settings, so they are part of the key
+    return (
+        float(s.get("capital", DEFAULT_SETTINGS["capital"])),
+        float(s.get("risk_pct", DEFAULT_SETTINGS["risk_pct"])),
+        str(s.get("side", DEFAULT_SETTINGS["side"])).lower(),
+    )
 
-    # SHORT
-    if side in ("both", "short"):
-        sl = entry + sl_mult * atr
-        tp1 = entry - tp1_mult * atr
-        tp2 = entry - tp2_mult * atr
-        qty = compute_position_size(capital, risk_pct, entry, sl)
-
-        score = 0
-        reasons = []
-        if trend == "down":
-            score += 3; reasons.append("Trend down")
-        if breakout_down:
-            score += 3; reasons.append("Breakdown 20D")
-        if 28 <= rsi <= 50:
-            score += 2; reasons.append("RSI 28-50")
-        if rsi < 28:
-            reasons.append("RSI very low (bounce risk)")
-        if trend == "up":
-            reasons.append("Trend up (weak short)")
-
-        decision = "ENTER" if score >= 6 else ("WAIT" if score >= 4 else "SKIP")
-
-        ideas.append({
-            "side": "SHORT",
-            "decision": decision,
-            "score": score,
-            "entry": entry,
-            "sl": sl,
-            "tp1": tp1,
-            "tp2": tp2,
-            "qty": qty,
-            "reasons": reasons
-        })
+_strategy_params = {"mtime": None, "params": DEFAULT_PARAMS.copy()}
+
+def get_strategy_params():
+    # reloaded when the file changes (one stat per call)
+    try:
+        mtime = os.path.getmtime(STRATEGY_PARAMS_PATH)
+    except OSError:
+        mtime = None
+    if mtime != _strategy_params["mtime"]:
+        _strategy_params["params"] = load_params(STRATEGY_PARAMS_PATH) if mtime is not None else DEFAULT_PARAMS.copy()
+        _strategy_params["mtime"] = mtime
+        _analyze_cache.invalidate()
+    return _strategy_params["params"]
+
+def analyze_symbol(symbol: str, price: float | None = None, tf: str | None = None, confirm: bool = False,
+                   deadline: float | None = None):
+    # tf: alert timeframe ("15", "1h", "D"...; default daily); confirm adds
+    # res["htf"] = the next higher timeframe's trend; deadline (monotonic)
+    # bounds any download, see get_history
+    get_strategy_params()  # drops cached results if the parameter file changed
+    tf = parse_tf(tf) or "1d"
+    res = None
+    if price is not None and tf == "1d":
+        # snapshot + live price: no network; unknown symbols fall through to the live path
+        res = _analyze_from_snapshot(symbol, price)
+        if res is not None:
+            EVENTS.inc(op="analyze", event="snapshot")
+    if res is None:
+        if tf == "1d":
+            compute = lambda: _analyze_symbol_uncached(symbol, deadline)
+        else:
+            compute = lambda: _analyze_tf_uncached(symbol, tf, deadline)
+        with timed(STAGE_SECONDS, op="analyze", stage="total"):
+            if ANALYZE_CACHE_TTL_SEC <= 0:
+                res = compute()
+            else:
+                key = (normalize_symbol(symbol), _sizing_key(load_settings()), tf)
+                res = _analyze_cache.get_or_compute(key, compute, cacheable=lambda r: bool(r.get("ok")))
+        EVENTS.inc(op="analyze", event="ok" if res.get("ok") else "error")
+    if confirm and res.get("ok") and HIGHER_TF.get(tf):
+        res = dict(res, htf=_higher_tf_trend(symbol, tf, price, deadline))
+    return res
+
+def _higher_tf_trend(symbol: str, tf: str, price: float | None = None, deadline: float | None = None):
+    htf = HIGHER_TF[tf]
+    r = analyze_symbol(symbol, price=price, tf=htf, deadline=deadline)
+    if not r.get("ok"):
+        return {"tf": htf, "trend": None, "error": r.get("error")}
+    return {"tf": htf, "trend": r["trend"]}
+
+# ====== UPDATED: analyze_symbol reads from the bar store (yfinance/chart refresh) ======
+def _analyze_symbol_uncached(symbol: str, deadline: float | None = None):
+    with timed(STAGE_SECONDS, op="analyze", stage="history"):
+        h = get_history(symbol, period="6mo", interval="1d", deadline=deadline)
+    if not h.get("ok"):
+        return {"ok": False, "error": h.get("error", "not enough data"), "timeout": bool(h.get("timeout")),
+                "unknown": bool(h.get("unknown"))}
+    return _analyze_bars(h["symbol"], h["source"], h["bars"], "1d")
+
+def _analyze_tf_uncached(symbol: str, tf: str, deadline: float | None = None):
+    # intraday: one stored base series (INTRADAY_BASE_INTERVAL), resampled here
+    if TF_SECONDS[tf] < TF_SECONDS.get(parse_tf(INTRADAY_BASE_INTERVAL), 0):
+        return {"ok": False, "error": f"tf {tf} is finer than the base interval {INTRADAY_BASE_INTERVAL}"}
+    with timed(STAGE_SECONDS, op="analyze", stage="history"):
+        h = get_history(symbol, period=INTRADAY_PERIOD, interval=INTRADAY_BASE_INTERVAL, min_bars=1, deadline=deadline)
+    if not h.get("ok"):
+        return {"ok": False, "error": h.get("error", "not enough data"), "timeout": bool(h.get("timeout")),
+                "unknown": bool(h.get("unknown"))}
+    with timed(STAGE_SECONDS, op="analyze", stage="resample"):
+        bars = resample(h["bars"], tf)
+    if cols_len(bars) < 60:
+        return {"ok": False, "error": f"not enough {tf} data (bars={cols_len(bars)})"}
+    return _analyze_bars(h["symbol"], h["source"], bars, tf)
+
+def _analyze_bars(symbol, source, bars, tf):
+    with timed(STAGE_SECONDS, op="analyze", stage="indicators"):
+        lat = ind.latest(ind.compute_indicators(bars, smoothing=INDICATOR_SMOOTHING))
+    entry = float(bars["close"][-1])
+    ma20, ma50, rsi, atr = (float(lat[k][0]) for k in ("ma20", "ma50", "rsi", "atr"))
+
+    if any(math.isnan(v) for v in (ma20, ma50, rsi, atr)):
+        ERRORS.inc(op="analyze", kind="indicators")
+        return {"ok": False, "error": "indicator calc failed"}
+
+    return _analysis_result(symbol, source, entry, ma20, ma50, rsi, atr,
+                            float(lat["brk_high"][0]), float(lat["brk_low"][0]), tf)
+
+def _analysis_result(symbol, source, entry, ma20, ma50, rsi, atr, brk_high, brk_low, tf="1d"):
+    trend = trend_of(entry, ma20, ma50)
+
+    # previous 20 closes (NaN comparisons are False when history is short)
+    breakout_up = bool(entry > brk_high)
+    breakout_down = bool(entry < brk_low)
+
+    s = load_settings()
+    ideas = build_ideas(
+        entry, trend, rsi, atr, breakout_up, breakout_down,
+        float(s.get("capital", 10000.0)), float(s.get("risk_pct", 1.0)), s.get("side", "both"),
+        params=get_strategy_params()
+    )
 
     return {
         "ok": True,
         "symbol": symbol,
-        "source": used_source,
+        "source": source,
+        "tf": tf,
         "entry": entry,
         "trend": trend,
         "ma20": ma20,
@@ -408,84 +837,474 @@ def analyze_symbol(symbol: str):
         "ideas": ideas
     }
 
+# ====== Batch analyze: many symbols, one batched download, indicators in one pass ======
+def _best_idea(res):
+    return max(res.get("ideas") or [], key=lambda x: x["score"], default=None)
+
+def analyze_many(symbols, tf: str | None = None):
+    # same result per symbol as analyze_symbol (and shares its cache); the
+    # stale ones are refreshed together through stream_history. Failures stay
+    # in the list as {"ok": False, "ticker", "error"}; ok results come first,
+    # best idea score first.
+    t0 = time.perf_counter()
+    tf = parse_tf(tf) or "1d"
+    if tf != "1d" and TF_SECONDS[tf] < TF_SECONDS.get(parse_tf(INTRADAY_BASE_INTERVAL), 0):
+        return {"ok": False, "error": f"tf {tf} is finer than the base interval {INTRADAY_BASE_INTERVAL}"}
+    period, interval = ("6mo", "1d") if tf == "1d" else (INTRADAY_PERIOD, INTRADAY_BASE_INTERVAL)
+    get_strategy_params()
+    sizing = _sizing_key(load_settings())
+
+    results, todo = {}, {}
+    for raw in symbols:
+        raw = str(raw).strip()
+        if not raw:
+            continue
+        sym, reason = resolve_symbol(raw)
+        if sym is None:
+            results[raw.upper()] = {"ok": False, "ticker": raw.upper(), "error": f"unsupported symbol ({reason})"}
+        elif _unfetchable.get((sym, interval)) is not None:
+            reject_symbol(raw, "negative_cache")
+            results[sym] = {"ok": False, "ticker": raw.upper(), "error": f"no data for {sym} (cached)"}
+        elif sym not in results:
+            item = _analyze_cache.get((sym, sizing, tf)) if ANALYZE_CACHE_TTL_SEC > 0 else None
+            if item is not None:
+                results[sym] = dict(item[1], ticker=raw.upper())
+            else:
+                results[sym] = None
+                todo[sym] = raw.upper()
+
+    fetch = None
+    if todo:
+        with timed(STAGE_SECONDS, op="analyze_batch", stage="refresh"):
+            fetch = stream_history(list(todo), period=period, interval=interval)
+        names, hist = [], []
+        for sym in todo:
+            bars = read_history(sym, period=period, interval=interval)
+            if bars is None:
+                # nothing stored after the batch: ask the providers, which also
+                # puts symbols they don't know into _unfetchable
+                h = get_history(sym, period=period, interval=interval, min_bars=1)
+                if not h.get("ok"):
+                    results[sym] = {"ok": False, "ticker": todo[sym], "error": h.get("error", "no data")}
+                    continue
+                bars = h["bars"]
+            if tf != "1d":
+                bars = resample(bars, tf)
+            if cols_len(bars) < 60:
+                results[sym] = {"ok": False, "ticker": todo[sym], "error": f"not enough {tf} data (bars={cols_len(bars)})"}
+            else:
+                names.append(sym)
+                hist.append(bars)
+        if names:
+            with timed(STAGE_SECONDS, op="analyze_batch", stage="indicators"):
+                m = ind.stack_bars(hist)
+                lat = ind.latest(ind.compute_indicators(m["high"], m["low"], m["close"], smoothing=INDICATOR_SMOOTHING))
+            for i, sym in enumerate(names):
+                vals = [float(lat[k][i]) for k in ("close", "ma20", "ma50", "rsi", "atr", "brk_high", "brk_low")]
+                if any(math.isnan(v) for v in vals[:5]):
+                    ERRORS.inc(op="analyze", kind="indicators")
+                    results[sym] = {"ok": False, "ticker": todo[sym], "error": "indicator calc failed"}
+                    continue
+                res = _analysis_result(sym, "batch", *vals, tf=tf)
+                if ANALYZE_CACHE_TTL_SEC > 0:
+                    _analyze_cache.put((sym, sizing, tf), res)
+                results[sym] = dict(res, ticker=todo[sym])
+
+    out = list(results.values())
+    for r in out:
+        EVENTS.inc(op="analyze_batch", event="ok" if r.get("ok") else "error")
+        if r.get("ok"):
+            r["best"] = _best_idea(r)
+    out.sort(key=lambda r: (not r.get("ok"), -(r["best"]["score"] if r.get("best") else -1)))
+    return {"ok": True, "tf": tf, "count": len(out), "failed": sum(not r.get("ok") for r in out),
+            "results": out, "fetch": fetch, "elapsed_sec": round(time.perf_counter() - t0, 3)}
+
+def format_analyze_table(res):
+    lines = [f"🧠 Analyze {res['count']} symbols ({'Swing' if res['tf'] == '1d' else res['tf']}) | {res['elapsed_sec']}s", "—"]
+    for i, r in enumerate(res["results"], 1):
+        if not r.get("ok"):
+            lines.append(f"{i}) {r['ticker']} ⚠️ {r.get('error')}")
+            continue
+        b = r.get("best")
+        head = f"{i}) {r['symbol']} {r['entry']:.2f} {r['trend']} RSI {r['rsi']:.0f}"
+        if b is None:
+            lines.append(head)
+            continue
+        emoji = "✅" if b["decision"] == "ENTER" else ("⚠️" if b["decision"] == "WAIT" else "⛔")
+        lines.append(f"{head} | {emoji} {b['side']} {b['decision']} {b['score']}/8\n"
+                     f"   SL {b['sl']:.2f} TP1 {b['tp1']:.2f} TP2 {b['tp2']:.2f} Qty {b['qty']}")
+    return lines
+
+# ====== Signal journal (see signal_journal.py) ======
+def _open_journal(spec):
+    spec = (spec or "").strip()
+    if spec.lower() in ("", "0", "off", "none"):
+        return None
+    return SignalJournal(spec[len("sqlite:///"):] if spec.startswith("sqlite:///") else spec)
+
+with STARTUP.step("signal_journal"):
+    try:
+        _journal = _open_journal(SIGNAL_JOURNAL)
+    except Exception as e:
+        print("=== SIGNAL JOURNAL ERROR ===", e)
+        _journal = None
+
+def _journal_interval(tf):
+    return "1d" if tf == "1d" else INTRADAY_BASE_INTERVAL
+
+def journal_ideas(source: str, items, dedupe: bool = False):
+    # items: ideas with "symbol" (and "tf", default 1d). dedupe: once per
+    # source/day/symbol/tf/side, for repeated scans and /analyze calls
+    if _journal is None or not items:
+        return 0
+    now = time.time()
+    today = datetime.now(ET).date() if ET else datetime.utcnow().date()
+    next_day = float(calendar.timegm(today.timetuple())) + DAY_SEC  # stored daily bars are keyed by UTC midnight
+    rows = []
+    for it in items:
+        tf = parse_tf(it.get("tf")) or "1d"
+        span = SIGNAL_EXPIRY_BARS * (DAY_SEC * 7 / 5 if tf == "1d" else TF_SECONDS[tf])  # daily: trading days
+        rows.append({
+            "ts": now, "day": today.isoformat(), "source": source, "symbol": it["symbol"], "tf": tf,
+            "interval": _journal_interval(tf), "side": it["side"], "decision": it.get("decision"),
+            "score": it.get("score"), "entry": float(it["entry"]), "sl": float(it["sl"]), "tp1": float(it["tp1"]),
+            "tp2": float(it["tp2"]), "qty": it.get("qty"), "expires_ts": now + span,
+            "eval_from_ts": next_day if tf == "1d" else now,
+            "dedupe_key": f"{source}:{today.isoformat()}:{it['symbol']}:{tf}:{it['side']}" if dedupe else None,
+        })
+    try:
+        with timed(STAGE_SECONDS, op="journal", stage="record"):
+            return _journal.record(rows)
+    except Exception:
+        ERRORS.inc(op="journal", kind="record")
+        return 0
+
+# webhook paths hand rows to one writer thread instead of waiting on SQLite
+# inside their deadline; a full queue drops the rows (counted in ERRORS)
+_journal_queue = KeyedWorkQueue(lambda job: journal_ideas(*job), workers=1, maxsize=1000, name="journal")
+
+def journal_later(source: str, items, dedupe: bool = False):
+    if _journal is None or not items:
+        return
+    if not _journal_queue.submit(source, (source, items, dedupe)):
+        ERRORS.inc(op="journal", kind="queue_full")
+
+def _result_ideas(res):
+    # one row per symbol: the best idea, and only an ENTER. Journaling both
+    # sides (or NO/WAIT ideas nobody acts on) would fill the stats with stop-outs
+    best = _best_idea(res) if res.get("ok") else None
+    if best is None or best["decision"] != "ENTER":
+        return []
+    return [dict(best, symbol=res["symbol"], tf=res.get("tf", "1d"))]
+
+def evaluate_signals():
+    # open signals only, newest complete bars only; the symbols are refreshed
+    # in one batched download per interval first
+    if _journal is None:
+        return {"ok": False, "error": "signal journal disabled"}
+    by_interval = {}
+    for sym, interval in _journal.open_symbols():
+        by_interval.setdefault(interval, []).append(sym)
+    with timed(STAGE_SECONDS, op="journal", stage="refresh"):
+        for interval, syms in by_interval.items():
+            stream_history(syms, period="6mo" if interval == "1d" else INTRADAY_PERIOD, interval=interval)
+    interval_sec = {"1d": DAY_SEC, INTRADAY_BASE_INTERVAL: TF_SECONDS.get(parse_tf(INTRADAY_BASE_INTERVAL), 300)}
+    with timed(STAGE_SECONDS, op="journal", stage="evaluate"):
+        return _journal.evaluate(
+            lambda sym, interval: read_history(sym, period="6mo" if interval == "1d" else INTRADAY_PERIOD, interval=interval),
+            interval_sec=interval_sec,
+        )
+
+def signal_stats(by="score", days=None, source=None, limit=50):
+    if _journal is None:
+        return {"ok": False, "error": "signal journal disabled"}
+    days = SIGNAL_STATS_DAYS if days is None else float(days)
+    return _journal.stats(by=by, since_ts=time.time() - days * DAY_SEC if days > 0 else None, source=source, limit=limit)
+
+def format_signal_stats(st, days):
+    lines = [f"📊 Signals by {st['by']} ({days:g}d) | {st['signals']} signals | open {st['open']}", "—"]
+    pct = lambda x: "-" if x is None else f"{x:.0%}"
+    for g in st["groups"]:
+        r = "-" if g["avg_r"] is None else f"{g['avg_r']:+.2f}"
+        lines.append(
+            f"{g[st['by']]}: n {g['signals']} | closed {g['closed']} | TP1 {pct(g['tp1_rate'])} TP2 {pct(g['tp2_rate'])} "
+            f"SL {pct(g['sl_rate'])} exp {pct(g['expired_rate'])} | R {r}"
+        )
+    return lines
+
+# ====== Analysis snapshot (daily indicators precomputed after the close, see snapshot.py) ======
+_snapshot = {"mtime": None, "snap": None}
+_snapshot_build_lock = threading.Lock()
+
+def get_snapshot():
+    # reloaded when the file changes; None when missing, stale or built with other smoothing
+    try:
+        mtime = os.path.getmtime(SNAPSHOT_PATH)
+    except OSError:
+        mtime = None
+    if mtime != _snapshot["mtime"]:
+        snap = load_snapshot(SNAPSHOT_PATH) if mtime is not None else None
+        if snap is not None and snap.meta.get("smoothing") != INDICATOR_SMOOTHING:
+            snap = None
+        _snapshot["snap"], _snapshot["mtime"] = snap, mtime
+    snap = _snapshot["snap"]
+    if snap is None or snap.age_sec() > SNAPSHOT_MAX_AGE_H * 3600:
+        return None
+    return snap
+
+def _analyze_from_snapshot(symbol: str, price: float):
+    snap = get_snapshot()
+    if snap is None:
+        return None
+    symbol = normalize_symbol(symbol)
+    with timed(STAGE_SECONDS, op="analyze", stage="snapshot"):
+        v = snap.analyze(symbol, price)
+        if v is None:
+            return None
+        res = _analysis_result(symbol, "snapshot", float(v["entry"]), float(v["ma20"]), float(v["ma50"]),
+                               float(v["rsi"]), float(v["atr"]), float(v["brk_high"]), float(v["brk_low"]))
+    res["snapshot_id"] = snap.meta.get("build_id")
+    return res
+
+def _session_cutoff_ts():
+    # while the session is open today's daily bar is still forming: leave it out
+    if not market_open_now_et():
+        return None
+    day = datetime.now(ET).date() if ET else datetime.utcnow().date()
+    return float(calendar.timegm(day.timetuple()))
+
+def build_analysis_snapshot(tickers=None):
+    if not _snapshot_build_lock.acquire(blocking=False):
+        return {"ok": False, "error": "snapshot build already running"}
+    try:
+        tickers = tickers or load_universe()
+        if not tickers:
+            return {"ok": False, "error": "tickers.txt missing or empty"}
+        fetch = stream_history(tickers, period="6mo", interval="1d")
+        with timed(STAGE_SECONDS, op="snapshot", stage="build"):
+            snap = build_snapshot(tickers, lambda sym: read_history(sym, period="6mo", interval="1d"),
+                                  smoothing=INDICATOR_SMOOTHING, cutoff_ts=_session_cutoff_ts())
+        save_snapshot(SNAPSHOT_PATH, snap)
+        get_snapshot()
+        return dict(snap.meta, ok=True, fetch=fetch)
+    finally:
+        _snapshot_build_lock.release()
+
+def snapshot_status():
+    snap = get_snapshot()
+    if snap is None:
+        return {"ok": True, "loaded": False, "path": SNAPSHOT_PATH}
+    return dict(snap.meta, ok=True, loaded=True, age_h=round(snap.age_sec() / 3600, 2))
+
+with STARTUP.step("snapshot_load"):
+    get_snapshot()  # load at worker startup
+
 # ================= Scanner (legacy) =================
-def scan_universe(tickers):
-    if yf is None:
-        return [], "yfinance not installed"
+def _legacy_picks(syms):
+    hist, names = [], []
+    for sym in syms:
+        bars = read_history(sym, period="1mo", interval="1d")
+        if bars is not None and cols_len(bars) >= 5:
+            names.append(sym)
+            hist.append(bars)
+    if not names:
+        return []
+
+    # right-aligned per symbol, not on a shared calendar: a gap or a missing
+    # latest bar in one series must not turn its windows / last close NaN
+    m = ind.stack_bars(hist)
+    closes, vols = m["close"], m["volume"]
+    last = closes[:, -1]
+    prev = closes[:, -2] if closes.shape[1] >= 2 else np.full(len(names), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chg_pct = (last - prev) / prev * 100.0
+        avg_vol = np.nanmean(vols[:, -20:], axis=1)
+
+    ok = np.isfinite(chg_pct) & np.isfinite(avg_vol)
+    ok &= (last >= MIN_PRICE) & (last <= MAX_PRICE) & (avg_vol >= MIN_AVG_VOL)
+    score = chg_pct + (avg_vol / 10_000_000)
 
     results = []
-    chunk = 60
+    for i in np.flatnonzero(ok):
+        sl, tp = calc_levels(float(last[i]))
+        results.append({
+            "symbol": names[i],
+            "entry": round(float(last[i]), 4),
+            "sl": sl,
+            "tp": tp,
+            "chg_pct": round(float(chg_pct[i]), 2),
+            "avg_vol": int(avg_vol[i]),
+            "score": float(score[i])
+        })
+    return results
 
-    for i in range(0, len(tickers), chunk):
-        group = tickers[i:i+chunk]
-        try:
-            df = yf.download(
-                tickers=" ".join(group),
-                period="1mo",
-                interval="1d",
-                group_by="ticker",
-                auto_adjust=True,
-                threads=True,
-                progress=False
-            )
-        except Exception:
-            continue
+def _ranked_scan(tickers, period, picks_fn, op):
+    # picks are computed chunk by chunk while the rest is still downloading
+    results = []
 
-        for sym in group:
-            try:
-                if "Close" in getattr(df, "columns", []):
-                    closes = df["Close"].dropna()
-                    vols = df["Volume"].dropna()
-                else:
-                    closes = df[(sym, "Close")].dropna()
-                    vols = df[(sym, "Volume")].dropna()
+    def on_chunk(syms):
+        with timed(STAGE_SECONDS, op=op, stage="rank"):
+            results.extend(picks_fn(syms))
 
-                if len(closes) < 2 or len(vols) < 5:
-                    continue
+    with timed(STAGE_SECONDS, op=op, stage="refresh"):
+        stream_history(tickers, period=period, interval="1d", on_chunk=on_chunk)
+    return results
 
-                last = float(closes.iloc[-1])
-                prev = float(closes.iloc[-2])
-                chg_pct = ((last - prev) / prev) * 100.0
-                avg_vol = int(vols.tail(20).mean())
+def scan_universe(tickers):
+    results = _ranked_scan(tickers, "1mo", _legacy_picks, "scan_legacy")
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results, "ok"
 
-                if last < MIN_PRICE or last > MAX_PRICE:
-                    continue
-                if avg_vol < MIN_AVG_VOL:
-                    continue
+# ================= Scanner (swing: analyze_symbol rules for the whole universe) =================
+def _swing_picks(syms, capital, risk_pct, side, filter_mode, params):
+    hist, names = [], []
+    for sym in syms:
+        bars = read_history(sym, period="6mo", interval="1d")
+        if bars is not None and cols_len(bars) >= 60:
+            names.append(sym)
+            hist.append(bars)
+    if not names:
+        return []
+
+    m = ind.stack_bars(hist)  # each row == analyze_symbol on that symbol's own bars
+    lat = ind.latest(ind.compute_indicators(m["high"], m["low"], m["close"], m["volume"], smoothing=INDICATOR_SMOOTHING))
+    entry = lat["close"]
+    with np.errstate(invalid="ignore"):
+        ok = np.isfinite(entry) & np.isfinite(lat["ma50"]) & np.isfinite(lat["rsi"]) & np.isfinite(lat["atr"])
+        ok &= (entry >= MIN_PRICE) & (entry <= MAX_PRICE) & (lat["avg_vol"] >= MIN_AVG_VOL)
+        trend = ind.trend_labels(entry, lat["ma20"], lat["ma50"])
+        brk_up = entry > lat["brk_high"]
+        brk_down = entry < lat["brk_low"]
 
-                score = chg_pct + (avg_vol / 10_000_000)
-                sl, tp = calc_levels(last)
-
-                results.append({
-                    "symbol": sym,
-                    "entry": round(last, 4),
-                    "sl": sl,
-                    "tp": tp,
-                    "chg_pct": round(chg_pct, 2),
-                    "avg_vol": avg_vol,
-                    "score": score
-                })
-            except Exception:
-                continue
+    results = []
+    for i in np.flatnonzero(ok):
+        ideas = build_ideas(
+            float(entry[i]), str(trend[i]), float(lat["rsi"][i]), float(lat["atr"][i]),
+            bool(brk_up[i]), bool(brk_down[i]), capital, risk_pct, side, params
+        )
+        ideas = [x for x in ideas if passes_filter(x["decision"], filter_mode)]
+        if not ideas:
+            continue
+        best = max(ideas, key=lambda x: x["score"])
+        results.append(dict(
+            best, symbol=names[i], trend=str(trend[i]), rsi=float(lat["rsi"][i]),
+            atr=float(lat["atr"][i]), avg_vol=int(lat["avg_vol"][i])
+        ))
+    return results
+
+def scan_universe_swing(tickers, settings=None):
+    s = settings or load_settings()
+    capital = float(s.get("capital", 10000.0))
+    risk_pct = float(s.get("risk_pct", 1.0))
+    side = str(s.get("side", "both")).lower()
+    filter_mode = s.get("filter_mode", "enter_only")
+    params = get_strategy_params()
 
-    results.sort(key=lambda x: x["score"], reverse=True)
+    results = _ranked_scan(
+        tickers, "6mo", lambda syms: _swing_picks(syms, capital, risk_pct, side, filter_mode, params), "scan_swing"
+    )
+    results.sort(key=lambda x: (x["score"], x["avg_vol"]), reverse=True)
     return results, "ok"
 
+def run_scan(tickers, mode=None):
+    mode = (mode or SCAN_MODE).lower()
+    if mode == "swing":
+        return scan_universe_swing(tickers)
+    return scan_universe(tickers)
+
+def format_scan_lines(picks, mode, title):
+    if mode == "swing":
+        s = load_settings()
+        lines = [f"{title} (Swing Scan) | Side: {s.get('side','both')} | Filter: {s.get('filter_mode','enter_only')}",
+                 f"Count: {len(picks)}", "—"]
+        for i, p in enumerate(picks, 1):
+            lines.append(
+                f"{i}) {p['symbol']} | {p['side']} {p['decision']} | Score {p['score']}/8\n"
+                f"Entry: {p['entry']:.2f} | SL: {p['sl']:.2f}\n"
+                f"TP1: {p['tp1']:.2f} | TP2: {p['tp2']:.2f} | Qty: {p['qty']}\n"
+                f"• {' | '.join(p['reasons'])}\n"
+                "—"
+            )
+        return lines
+
+    lines = [f"{title} (Legacy Scan) (SL {STOP_LOSS_PCT}% | TP {TAKE_PROFIT_PCT}%)", f"Count: {len(picks)}", "—"]
+    for i, p in enumerate(picks, 1):
+        lines.append(
+            f"{i}) {p['symbol']} | Daily: {p['chg_pct']}% | AvgVol: {p['avg_vol']}\n"
+            f"Entry: {p['entry']}\n"
+            f"SL: {p['sl']}\n"
+            f"TP: {p['tp']}\n"
+            "—"
+        )
+    return lines
+
 # ================= Telegram Command Bot (Webhook) =================
 tg_app = None
 _tg_initialized = False
 
-# in-memory cooldown map
-_last_alert_ts = {}
+# One long-lived event loop thread owns tg_app (and its HTTP client);
+# Flask threads hand updates to it, blocking work goes to _tg_executor.
+_tg_loop = None
+_tg_loop_pid = None
+_tg_lock = threading.Lock()
+_tg_executor = ThreadPoolExecutor(max_workers=TG_BLOCKING_WORKERS, thread_name_prefix="tg-blocking")
+
+def _run_tg_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
 
 def _ensure_tg_initialized():
-    global _tg_initialized
-    if tg_app and not _tg_initialized:
-        asyncio.run(tg_app.initialize())
-        _tg_initialized = True
+    global _tg_loop, _tg_loop_pid, _tg_initialized
+    if not _get_tg_app():
+        return None
+    with _tg_lock:
+        # created lazily and per process: a loop thread does not survive fork
+        if _tg_loop is None or _tg_loop_pid != os.getpid():
+            _tg_loop = asyncio.new_event_loop()
+            _tg_loop_pid = os.getpid()
+            _tg_initialized = False
+            threading.Thread(target=_run_tg_loop, args=(_tg_loop,), name="tg-loop", daemon=True).start()
+        if not _tg_initialized:
+            with STARTUP.step("tg_initialize", lazy=True):
+                asyncio.run_coroutine_threadsafe(tg_app.initialize(), _tg_loop).result(timeout=30)
+            _tg_initialized = True
+    return _tg_loop
+
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update):
+        return await update.message.reply_text("⛔ غير مصرح.")
+    # /stats [symbol|side|score|tf|decision|source] [days] | /stats eval
+    by, days = "score", SIGNAL_STATS_DAYS
+    for arg in context.args or []:
+        if arg.lower() in SIGNAL_GROUPS:
+            by = arg.lower()
+        elif _alert_price(arg) is not None:
+            days = _alert_price(arg)
+        elif arg.lower() in ("eval", "evaluate"):
+            ev = await _blocking(evaluate_signals)
+            if not ev.get("ok"):
+                return await update.message.reply_text(f"⚠️ خطأ: {ev.get('error')}")
+            await update.message.reply_text(
+                f"✅ Evaluated {ev['open_before']} open | closed {ev['closed']} | updated {ev['updated']} | {ev['sec']}s")
+    st = await _blocking(signal_stats, by, days, None, 20)
+    if not st.get("ok"):
+        return await update.message.reply_text(f"⚠️ خطأ: {st.get('error')}")
+    await update.message.reply_text("\n".join(format_signal_stats(st, days)))
+
+async def _blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_tg_executor, lambda: fn(*args, **kwargs))
+
+def _log_tg_result(fut):
+    try:
+        fut.result()
+    except Exception as e:
+        ERRORS.inc(op="tg", kind="update")
+        print("=== TG UPDATE ERROR ===", e)
 
-if TELEGRAM_BOT_TOKEN:
-    tg_app = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+async def _process_update_timed(update):
+    with timed(STAGE_SECONDS, op="tg", stage="process"):
+        await tg_app.process_update(update)
 
 def _is_admin(update: Update) -> bool:
     try:
@@ -496,6 +1315,7 @@ def _is_admin(update: Update) -> bool:
         return False
 
 def _menu():
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
     s = load_settings()
     kb = [
         [InlineKeyboardButton("📊 Scan الآن (أرسل للقناة)", callback_data="scanrun")],
@@ -531,8 +1351,11 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "✅ الأوامر:\n"
         "/start\n"
-        "/analyze AAPL\n"
-        "/scanrun (يرسل للقناة)\n"
+        "/analyze AAPL | /analyze AAPL 187.5 (من الـ snapshot) | /analyze AAPL 15m (فريم)\n"
+        "/analyze AAPL MSFT NVDA (عدة أسهم، مرتبة حسب السكور)\n"
+        "/scanrun (يرسل للقناة) | /scanrun swing\n"
+        "/snapshot (بناء snapshot بعد الإغلاق) | /snapshot status\n"
+        "/stats score | /stats symbol 30 | /stats eval (نتائج الإشارات: TP/SL)\n"
         "/capital 25000\n"
         "/risk 1\n"
         "/status\n"
@@ -548,6 +1371,13 @@ async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Capital: {s['capital']}$ | Risk: {s['risk_pct']}% | Side: {s['side']}\n"
         f"TV Filter: {s.get('filter_mode','enter_only')} | Cooldown: {s.get('cooldown_min',60)}m\n"
         f"Universe size: {len(load_universe())}\n"
+        f"Analyze cache: {_cache_status_line()}\n"
+        f"Telegram: sent {_tg_sender.counters['parts_sent']} | 429s {_tg_sender.counters['rate_limited_429']} | spooled {_tg_sender.counters['spooled']} | dropped {_tg_sender.counters['dropped']}\n"
+        f"TV queue: {'async' if TV_ASYNC else 'sync'} | depth {_tv_queue.depth} | rejected {_tv_queue.rejected}\n"
+        f"Snapshot: {_snapshot_status_line()}\n"
+        f"Scheduler: {_scheduler_status_line()}\n"
+        f"Data: {_providers_status_line()}\n"
+        f"Symbols: {_symbols_status_line()}\n"
     )
 
 async def cmd_capital(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -584,17 +1414,25 @@ async def cmd_scanrun(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not universe:
         return await update.message.reply_text("⚠️ tickers.txt غير موجود أو فاضي.")
 
-    picks, _ = scan_universe(universe)
+    mode = (context.args[0] if context.args else SCAN_MODE).lower()
+    picks, _ = await _blocking(run_scan, universe, mode)
     if not picks:
         return await update.message.reply_text("ما فيه فرص حالياً.")
 
-    lines = [f"📈 فرص اليوم (Legacy Scan) (SL {STOP_LOSS_PCT}% | TP {TAKE_PROFIT_PCT}%):"]
-    for p in picks[:MAX_RESULTS]:
-        lines.append(f"- {p['symbol']} | Entry {p['entry']:.2f} | SL {p['sl']:.2f} | TP {p['tp']:.2f}")
+    if mode == "swing":
+        lines = format_scan_lines(picks[:MAX_RESULTS], mode, "📈 فرص اليوم")
+    else:
+        lines = [f"📈 فرص اليوم (Legacy Scan) (SL {STOP_LOSS_PCT}% | TP {TAKE_PROFIT_PCT}%):"]
+        for p in picks[:MAX_RESULTS]:
+            lines.append(f"- {p['symbol']} | Entry {p['entry']:.2f} | SL {p['sl']:.2f} | TP {p['tp']:.2f}")
 
-    ok, info = send_telegram("\n".join(lines))
+    ok, info = await _blocking(send_telegram, "\n".join(lines))
+    if ok and mode == "swing":
+        await _blocking(journal_ideas, "scan", picks[:MAX_RESULTS], True)
     await update.message.reply_text(f"✅ تم الإرسال للقناة.\n({info})")
 
+_TF_WORDS = {"D", "DAY", "DAILY", "W", "M"}  # letter-only timeframe tokens parse_tf knows
+
 async def cmd_analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not _is_admin(update):
         return await update.message.reply_text("⛔ غير مصرح.")
@@ -602,14 +1440,34 @@ async def cmd_analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("استخدم: /analyze AAPL")
 
     sym = context.args[0].upper()
-    res = analyze_symbol(sym)
+    # optional live price (-> decided from the precomputed snapshot) and/or timeframe: /analyze AAPL 15m;
+    # more symbols -> one batched table: /analyze AAPL MSFT NVDA 1h
+    price, tf, more = None, None, []
+    for arg in context.args[1:]:
+        if _alert_price(arg) is not None:
+            price = _alert_price(arg)
+        elif (any(c.isdigit() for c in arg) or arg.upper() in _TF_WORDS) and parse_tf(arg):
+            tf = parse_tf(arg)  # "D"/"W"/"M" are timeframes here, not Dominion / Wayfair / Macy's
+        else:
+            more.append(arg.upper())
+    if more:
+        syms = list(dict.fromkeys([sym] + more))[:ANALYZE_BATCH_MAX]
+        res = await _blocking(analyze_many, syms, tf)
+        if not res.get("ok"):
+            return await update.message.reply_text(f"⚠️ خطأ: {res.get('error')}")
+        await _blocking(journal_ideas, "analyze", [x for r in res["results"] for x in _result_ideas(r)], True)
+        return await update.message.reply_text("\n".join(format_analyze_table(res)))
+    res = await _blocking(analyze_symbol, sym, price, tf, True)
     if not res.get("ok"):
         return await update.message.reply_text(f"⚠️ خطأ: {res.get('error')}")
+    await _blocking(journal_ideas, "analyze", _result_ideas(res), True)
 
     s = load_settings()
     lines = []
-    lines.append(f"🧠 Analyze {res['symbol']} (Swing)")
+    lines.append(f"🧠 Analyze {res['symbol']} ({'Swing' if res.get('tf', '1d') == '1d' else res['tf']})")
     lines.append(f"Source: {res.get('source','?')}")
+    if res.get("htf"):
+        lines.append(f"HTF {res['htf']['tf']}: {res['htf']['trend'] or res['htf'].get('error')}")
     lines.append(f"Entry: {res['entry']:.2f}")
     lines.append(f"Trend: {res['trend']} | MA20 {res['ma20']:.2f} | MA50 {res['ma50']:.2f}")
     lines.append(f"RSI(14): {res['rsi']:.1f} | ATR(14): {res['atr']:.2f}")
@@ -627,19 +1485,48 @@ async def cmd_analyze(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text("\n".join(lines))
 
+def _snapshot_status_line():
+    st = snapshot_status()
+    if not st.get("loaded"):
+        return "none"
+    return f"{st['symbols']} symbols | {st['build_id']} | {st['age_h']}h old"
+
+async def cmd_snapshot(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update):
+        return await update.message.reply_text("⛔ غير مصرح.")
+    if context.args and context.args[0].lower() == "status":
+        return await update.message.reply_text(f"📦 Snapshot: {_snapshot_status_line()}")
+    await update.message.reply_text("⏳ جاري بناء الـ snapshot...")
+    res = await _blocking(build_analysis_snapshot)
+    if not res.get("ok"):
+        return await update.message.reply_text(f"⚠️ خطأ: {res.get('error')}")
+    await update.message.reply_text(
+        f"✅ Snapshot {res['build_id']}\n"
+        f"Symbols: {res['symbols']} | skipped {res['skipped']} | build {res['build_sec']}s\n"
+        f"Download: ok {res['fetch']['ok']} | failed {res['fetch']['failed']} | {res['fetch']['elapsed_sec']}s"
+    )
+
+def _cache_status_line():
+    st = _analyze_cache.stats()
+    return f"{st['size']}/{st['max_items']} | hits {st['hits']} | misses {st['misses']} | coalesced {st['coalesced']} | hit rate {st['hit_rate']:.0%}"
+
+def _providers_status_line():
+    parts = []
+    for name, st in _providers.stats()["providers"].items():
+        p95 = f"p95 {st['p95_ms']:.0f}ms" if st["p95_ms"] is not None else "p95 -"
+        parts.append(f"{name} {st['state']} {p95} ok {st['ok']}/{st['calls']}")
+    return " | ".join(parts)
+
+def _symbols_status_line():
+    st = symbol_index().stats(top=3)
+    top = ", ".join(f"{r['ticker']}×{r['count']}" for r in st["top_rejected"]) or "-"
+    return f"{st['size']} indexed | rejected {st['rejected']} | no-data cache {_unfetchable.stats()['size']} | top: {top}"
+
 def _cooldown_ok(symbol: str, direction: str) -> bool:
     s = load_settings()
     cooldown_min = int(s.get("cooldown_min", ALERT_COOLDOWN_MIN))
-    key = f"{symbol}|{direction}".upper()
-    now = datetime.utcnow()
-    last = _last_alert_ts.get(key)
-    if last is None:
-        _last_alert_ts[key] = now
-        return True
-    if (now - last) >= timedelta(minutes=cooldown_min):
-        _last_alert_ts[key] = now
-        return True
-    return False
+    key = f"cooldown|{symbol}|{direction}".upper()
+    return _state_store.claim(key, cooldown_min * 60)
 
 async def on_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not _is_admin(update):
@@ -684,30 +1571,56 @@ async def on_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text, markup = _menu()
     await q.edit_message_text(f"✅ تم التحديث\n{text}", reply_markup=markup)
 
-if tg_app:
-    tg_app.add_handler(CommandHandler("start", cmd_start))
-    tg_app.add_handler(CommandHandler("help", cmd_help))
-    tg_app.add_handler(CommandHandler("status", cmd_status))
-    tg_app.add_handler(CommandHandler("capital", cmd_capital))
-    tg_app.add_handler(CommandHandler("risk", cmd_risk))
-    tg_app.add_handler(CommandHandler("scanrun", cmd_scanrun))
-    tg_app.add_handler(CommandHandler("analyze", cmd_analyze))
-    tg_app.add_handler(CallbackQueryHandler(on_button))
+_tg_build_lock = threading.Lock()
+
+def _get_tg_app():
+    # PTB import + Application build (~0.2-0.3s) happen here, on first use or
+    # in the warm-up thread, not when gunicorn imports the module
+    global tg_app
+    if tg_app is not None or not TELEGRAM_BOT_TOKEN:
+        return tg_app
+    with _tg_build_lock:
+        if tg_app is None:
+            with STARTUP.step("telegram_import", lazy=True):
+                from telegram.ext import Application, CommandHandler, CallbackQueryHandler
+            with STARTUP.step("tg_app_build", lazy=True):
+                a = (
+                    Application.builder().token(TELEGRAM_BOT_TOKEN)
+                    .base_url(f"{TELEGRAM_API_BASE}/bot")
+                    .build()
+                )
+                a.add_handler(CommandHandler("start", cmd_start))
+                a.add_handler(CommandHandler("help", cmd_help))
+                a.add_handler(CommandHandler("status", cmd_status))
+                a.add_handler(CommandHandler("capital", cmd_capital))
+                a.add_handler(CommandHandler("risk", cmd_risk))
+                a.add_handler(CommandHandler("scanrun", cmd_scanrun))
+                a.add_handler(CommandHandler("analyze", cmd_analyze))
+                a.add_handler(CommandHandler("snapshot", cmd_snapshot))
+                a.add_handler(CommandHandler("stats", cmd_stats))
+                a.add_handler(CallbackQueryHandler(on_button))
+            tg_app = a
+    return tg_app
 
 @app.post("/tg")
 def telegram_webhook():
-    if not tg_app:
+    if not TELEGRAM_BOT_TOKEN:
         return jsonify({"ok": False, "error": "telegram not configured"}), 500
 
     secret = request.args.get("secret", "").strip()
     if TELEGRAM_WEBHOOK_SECRET and secret != TELEGRAM_WEBHOOK_SECRET:
         return jsonify({"ok": False, "error": "bad secret"}), 403
 
-    _ensure_tg_initialized()
+    with timed(STAGE_SECONDS, op="tg", stage="init"):
+        loop = _ensure_tg_initialized()
 
-    data = request.get_json(force=True, silent=True) or {}
-    update = Update.de_json(data, tg_app.bot)
-    asyncio.run(tg_app.process_update(update))
+    with timed(STAGE_SECONDS, op="tg", stage="handoff"):
+        from telegram import Update
+        data = request.get_json(force=True, silent=True) or {}
+        update = Update.de_json(data, tg_app.bot)
+        # hand off and return: Telegram only needs the 200, replies go out from the loop
+        fut = asyncio.run_coroutine_threadsafe(_process_update_timed(update), loop)
+        fut.add_done_callback(_log_tg_result)
     return jsonify({"ok": True})
 
 # ================= Endpoints =================
@@ -716,7 +1629,7 @@ def home():
     return jsonify({
         "ok": True,
         "service": "trading-bot",
-        "endpoints": ["/test", "/webhook", "/tv", "/scan", "/tg"]
+        "endpoints": ["/test", "/webhook", "/tv", "/scan", "/tg", "/cache", "/queue", "/delivery", "/metrics", "/snapshot", "/startup", "/scheduler", "/symbols", "/analyze", "/recorder", "/stats"]
     })
 
 @app.get("/test")
@@ -724,13 +1637,57 @@ def test():
     ok, info = send_telegram("✅ Test: البوت شغال ويرسل تيليجرام بنجاح.")
     return jsonify({"ok": ok, "info": info}), (200 if ok else 500)
 
+def _alert_price(v):
+    try:
+        p = float(str(v).replace(",", "").strip())
+    except Exception:
+        return None
+    return p if p > 0 and math.isfinite(p) else None
+
+def _tv_ticker(payload: dict):
+    return payload.get("ticker") or payload.get("symbol") or payload.get("s") or payload.get("tv_ticker") or "UNKNOWN"
+
 def handle_tradingview(payload: dict):
     if WEBHOOK_SECRET:
         incoming = str(payload.get("secret", "")).strip()
         if incoming != WEBHOOK_SECRET:
-            return jsonify({"ok": False, "error": "bad secret"}), 401
-
-    ticker = payload.get("ticker") or payload.get("symbol") or payload.get("s") or payload.get("tv_ticker") or "UNKNOWN"
+            EVENTS.inc(op="tv", event="bad_secret")
+            return {"ok": False, "error": "bad secret"}, 401
+
+    if TV_ASYNC:
+        ticker = str(_tv_ticker(payload)).upper()
+        with timed(STAGE_SECONDS, op="tv", stage="enqueue"):
+            accepted = _tv_queue.submit(ticker, payload)
+        if not accepted:
+            EVENTS.inc(op="tv", event="queue_full")
+            resp = jsonify({"ok": False, "error": "queue full", "depth": _tv_queue.depth})
+            return resp, 503, {"Retry-After": "5"}
+        return {"ok": True, "queued": True, "ticker": ticker, "depth": _tv_queue.depth}, 202
+
+    # synchronous: the analysis has to fit in what TradingView waits for
+    body, status = process_tradingview(payload, deadline=time.monotonic() + TV_DEADLINE_SEC)
+    return jsonify(body), status
+
+def process_tradingview(payload: dict, deadline: float | None = None):
+    t0 = time.perf_counter()
+    if deadline is None:
+        deadline = time.monotonic() + TV_ASYNC_DEADLINE_SEC
+    body, status = _process_tradingview(payload, deadline)
+    STAGE_SECONDS.observe(time.perf_counter() - t0, op="tv", stage="total")
+    if status >= 500:
+        ERRORS.inc(op="tv", kind=f"http_{status}")
+    for event in ("ignored", "filtered", "coalesced"):
+        if event in body:
+            EVENTS.inc(op="tv", event=event)
+            break
+    else:
+        EVENTS.inc(op="tv", event="sent" if body.get("ok") else "failed")
+    return body, status
+
+def _process_tradingview(payload: dict, deadline: float | None = None):
+    # secret already checked; returns (json body, http status) so it can run
+    # inside a request or on a queue worker without an app context
+    ticker = _tv_ticker(payload)
     price = payload.get("price") or payload.get("close") or payload.get("last") or payload.get("p") or ""
     tf = payload.get("tf") or payload.get("timeframe") or payload.get("interval") or payload.get("i") or ""
     direction = (payload.get("direction") or payload.get("action") or payload.get("side") or payload.get("d") or "SIGNAL")
@@ -744,33 +1701,65 @@ def handle_tradingview(payload: dict):
         dir_norm = "SELL"
 
     if dir_norm in ("BUY", "SELL"):
-        if not _cooldown_ok(ticker, dir_norm):
-            return jsonify({"ok": True, "ignored": "cooldown"}), 200
+        with timed(STAGE_SECONDS, op="tv", stage="cooldown"):
+            fresh = _cooldown_ok(ticker, dir_norm)
+        if not fresh:
+            return {"ok": True, "ignored": "cooldown"}, 200
 
     s = load_settings()
     filter_mode = s.get("filter_mode", "enter_only")
 
     decision_note = ""
+    idea = None
+    journal = None  # recorded only once the alert is actually handed out
     if dir_norm in ("BUY", "SELL"):
-        res = analyze_symbol(ticker)
+        with timed(STAGE_SECONDS, op="tv", stage="analyze"):
+            res = analyze_symbol(ticker, price=_alert_price(price), tf=tf, confirm=MTF_CONFIRM, deadline=deadline)
+        if res.get("timeout"):
+            # over budget: deliver the alert unfiltered rather than late
+            EVENTS.inc(op="tv", event="analyze_timeout")
+            decision_note = "n/a (analysis over time budget)"
+        elif res.get("unknown"):
+            # unsupported / no-data symbol: rejected without a download, alert goes out as is
+            EVENTS.inc(op="tv", event="unknown_symbol")
+            decision_note = f"n/a ({res.get('error')})"
         if res.get("ok"):
             want_side = "LONG" if dir_norm == "BUY" else "SHORT"
             idea = next((x for x in res["ideas"] if x["side"] == want_side), None)
+            htf = res.get("htf") or {}
             if idea:
+                journal = [dict(idea, symbol=res["symbol"], tf=res.get("tf", "1d"))]
                 decision_note = f"{idea['decision']} | Score {idea['score']}/8 | SL {idea['sl']:.2f} TP1 {idea['tp1']:.2f} TP2 {idea['tp2']:.2f} Qty {idea['qty']}"
+                if res.get("tf") != "1d":
+                    decision_note += f" | on {res['tf']}"
+                if htf.get("trend"):
+                    decision_note += f" | HTF {htf['tf']} {htf['trend']}"
+                if htf.get("trend") == ("down" if dir_norm == "BUY" else "up"):
+                    send_telegram(
+                        f"⛔ Filtered TV Alert ({want_side})\n{ticker} {tf}\nHTF {htf['tf']} trend: {htf['trend']}\n{decision_note}\nReason: {reason}",
+                        chat_id=ADMIN_USER_ID if ADMIN_USER_ID else None
+                    )
+                    return {"ok": True, "filtered": "HTF"}, 200
                 if filter_mode == "enter_only" and idea["decision"] != "ENTER":
                     send_telegram(
                         f"⛔ Filtered TV Alert ({want_side})\n{ticker} {tf}\nDecision: {idea['decision']}\n{decision_note}\nReason: {reason}",
                         chat_id=ADMIN_USER_ID if ADMIN_USER_ID else None
                     )
-                    return jsonify({"ok": True, "filtered": idea["decision"]}), 200
+                    return {"ok": True, "filtered": idea["decision"]}, 200
 
                 if filter_mode == "enter_wait" and idea["decision"] == "SKIP":
                     send_telegram(
                         f"⛔ Filtered TV Alert ({want_side})\n{ticker} {tf}\nDecision: SKIP\n{decision_note}\nReason: {reason}",
                         chat_id=ADMIN_USER_ID if ADMIN_USER_ID else None
                     )
-                    return jsonify({"ok": True, "filtered": "SKIP"}), 200
+                    return {"ok": True, "filtered": "SKIP"}, 200
+
+    if ALERT_COALESCE_SEC > 0:
+        pending = _alert_coalescer.add(TELEGRAM_CHAT_ID, {
+            "ticker": ticker, "tf": tf, "direction": dir_norm, "price": price, "reason": reason, "idea": idea,
+            "journal": journal,
+        })
+        return {"ok": True, "coalesced": True, "pending": pending, "received": payload}, 200
 
     msg = (
         "📣 TradingView Alert\n"
@@ -784,7 +1773,39 @@ def handle_tradingview(payload: dict):
         msg += f"—\n🧠 Analyze: {decision_note}\n"
 
     ok, info = send_telegram(msg)
-    return jsonify({"ok": ok, "info": info, "received": payload}), (200 if ok else 500)
+    if ok:
+        journal_later("tv", journal)
+    return {"ok": ok, "info": info, "received": payload}, (200 if ok else 500)
+
+def format_alert_digest(items):
+    lines = [f"📣 TradingView Digest ({len(items)} alerts)", "—"]
+    for i, it in enumerate(items, 1):
+        head = f"{i}) {it['ticker']} {it['tf']} | {it['direction']} | Price {it['price']}"
+        idea = it.get("idea")
+        if idea:
+            head += (
+                f"\n   {idea['decision']} {idea['score']}/8 | SL {idea['sl']:.2f} "
+                f"TP1 {idea['tp1']:.2f} TP2 {idea['tp2']:.2f} Qty {idea['qty']}"
+            )
+        lines.append(head)
+        lines.append(f"   Reason: {it['reason']}")
+    return "\n".join(lines)
+
+def _journal_digest(chat_id, items):
+    # runs after the digest went out, on the coalescer thread (or the caller
+    # that filled the buffer, already waiting on Telegram): written inline so
+    # a flush at shutdown doesn't leave rows in the journal queue
+    journal_ideas("tv", [row for it in items for row in it.get("journal") or ()])
+
+_alert_coalescer = AlertCoalescer(
+    lambda text, chat_id: send_telegram(text, chat_id=chat_id),
+    format_alert_digest,
+    window_sec=ALERT_COALESCE_SEC,
+    max_items=ALERT_COALESCE_MAX,
+    on_sent=_journal_digest,
+)
+
+_tv_queue = KeyedWorkQueue(process_tradingview, workers=TV_QUEUE_WORKERS, maxsize=TV_QUEUE_MAX, name="tv")
 
 @app.route("/webhook", methods=["GET", "POST"], strict_slashes=False)
 def webhook():
@@ -798,13 +1819,208 @@ def webhook():
         except Exception:
             payload = {}
 
-    print("=== WEBHOOK HIT ===", payload)
+    # no payload logging here: it carries the secret. TRAFFIC_RECORD=1 keeps
+    # a redacted copy of every request instead.
     return handle_tradingview(payload)
 
 @app.route("/tv", methods=["GET", "POST"], strict_slashes=False)
 def tv():
     return webhook()
 
+@app.get("/queue")
+def queue_stats():
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({
+        "ok": True,
+        "async": TV_ASYNC,
+        "tv_queue": _tv_queue.stats(),
+        "coalescer": _alert_coalescer.stats() if ALERT_COALESCE_SEC > 0 else None,
+    }), 200
+
+@app.get("/delivery")
+def delivery_stats():
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    if request.args.get("flush") in ("1", "true", "yes"):
+        _tg_sender.flush_spool()
+    return jsonify({"ok": True, "telegram": _tg_sender.stats()}), 200
+
+@app.get("/startup")
+def startup_report():
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({
+        "ok": True,
+        "startup": STARTUP.report(),
+        "loaded": {"yfinance": _yf_loaded and yf is not None, "telegram_app": tg_app is not None, "telegram_initialized": _tg_initialized},
+    }), 200
+
+@app.get("/cache")
+def cache_stats():
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    if request.args.get("clear") in ("1", "true", "yes"):
+        _analyze_cache.invalidate()
+    return jsonify({"ok": True, "analyze_cache": _analyze_cache.stats()}), 200
+
+@app.route("/analyze", methods=["GET", "POST"], strict_slashes=False)
+def analyze_batch():
+    # GET ?symbols=AAPL,MSFT&tf=1h or POST {"symbols": ["AAPL", "MSFT"], "tf": "1h"}
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    body = (request.get_json(silent=True) or {}) if request.method == "POST" else {}
+    if isinstance(body, list):
+        body = {"symbols": body}
+    syms = body.get("symbols") or request.args.get("symbols") or request.args.get("symbol") or ""
+    if isinstance(syms, str):
+        syms = syms.replace(",", " ").split()
+    syms = list(dict.fromkeys(str(x).strip().upper() for x in syms if str(x).strip()))
+    if not syms:
+        return jsonify({"ok": False, "error": "no symbols"}), 400
+    if len(syms) > ANALYZE_BATCH_MAX:
+        return jsonify({"ok": False, "error": f"too many symbols ({len(syms)} > {ANALYZE_BATCH_MAX})"}), 400
+    res = analyze_many(syms, body.get("tf") or request.args.get("tf"))
+    if res.get("ok"):
+        journal_ideas("analyze", [x for r in res["results"] for x in _result_ideas(r)], dedupe=True)
+    return jsonify(res), (200 if res.get("ok") else 400)
+
+@app.get("/stats")
+def stats_endpoint():
+    # ?by=symbol|side|score|tf|decision|source&days=90&source=tv&limit=50; ?evaluate=1 first runs the evaluator (cron)
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    by = request.args.get("by", "score").strip().lower()
+    if by not in SIGNAL_GROUPS:
+        return jsonify({"ok": False, "error": f"by must be one of {', '.join(SIGNAL_GROUPS)}"}), 400
+    ev = evaluate_signals() if request.args.get("evaluate") in ("1", "true", "yes") else None
+    try:
+        days = float(request.args.get("days", SIGNAL_STATS_DAYS))
+        limit = int(request.args.get("limit", 50))
+    except ValueError:
+        return jsonify({"ok": False, "error": "bad days/limit"}), 400
+    st = signal_stats(by, days, request.args.get("source") or None, limit)
+    if ev is not None:
+        st["evaluation"] = ev
+    return jsonify(st), (200 if st.get("ok") else 503)
+
+@app.get("/symbols")
+def symbols_stats():
+    # ?resolve=NASDAQ:BRK.B to test a ticker, ?clear=1 to forget the no-data symbols
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    if request.args.get("clear") in ("1", "true", "yes"):
+        _unfetchable.invalidate()
+    out = {"ok": True, "index": symbol_index().stats(top=int(request.args.get("top", 50))),
+           "unfetchable": _unfetchable.stats()}
+    raw = request.args.get("resolve")
+    if raw:
+        sym, reason = symbol_index().resolve(raw)
+        out["resolve"] = {"ticker": raw, "symbol": sym, "reason": reason,
+                          "unfetchable": sym is not None and any(_unfetchable.get((sym, i)) is not None
+                                                                 for i in ("1d", INTRADAY_BASE_INTERVAL))}
+    return jsonify(out), 200
+
+# ================= /metrics (Prometheus) + per-request profiler =================
+REGISTRY.gauge_fn("bot_tv_queue_depth", "Queued TradingView alerts", lambda: _tv_queue.depth)
+REGISTRY.counter_fn("bot_tv_queue_total", "TradingView queue counters",
+                    lambda: {k: v for k, v in _tv_queue.stats().items() if k in ("accepted", "rejected", "processed", "errors")},
+                    ("event",))
+REGISTRY.gauge_fn("bot_coalescer_pending", "Alerts waiting for the next digest", lambda: _alert_coalescer.stats()["pending"])
+REGISTRY.counter_fn("bot_analyze_cache_total", "analyze_symbol cache lookups",
+                    lambda: {k: v for k, v in _analyze_cache.stats().items() if k in ("hits", "misses", "coalesced", "evictions", "expired")},
+                    ("result",))
+REGISTRY.gauge_fn("bot_analyze_cache_size", "Cached analyze_symbol results", lambda: _analyze_cache.stats()["size"])
+REGISTRY.counter_fn("bot_telegram_delivery_total", "Telegram delivery counters",
+                    lambda: {k: v for k, v in _tg_sender.stats().items() if isinstance(v, (int, float)) and k not in ("chats_tracked", "spool_depth")},
+                    ("event",))
+REGISTRY.gauge_fn("bot_scan_last_fetch", "Last scan download (items, ok, failed, retried, chunks, elapsed_sec...)",
+                  lambda: {k: v for k, v in (_state["last_fetch"] or {}).items()}, ("field",))
+REGISTRY.gauge_fn("bot_telegram_spool_depth", "Messages waiting in the retry spool", lambda: _tg_sender.stats()["spool_depth"])
+REGISTRY.counter_fn("bot_provider_fetch_total", "Hedged provider fetches (requests, hedges, failovers, deadline_exceeded...)",
+                    lambda: {k: v for k, v in _providers.stats().items() if isinstance(v, int)}, ("event",))
+REGISTRY.counter_fn("bot_provider_calls_total", "Calls per market-data provider",
+                    lambda: {(name, k): st[k] for name, st in _providers.stats()["providers"].items()
+                             for k in ("ok", "failed", "won", "hedged", "skipped_open", "cut")}, ("provider", "result"))
+REGISTRY.gauge_fn("bot_provider_circuit_open", "1 while the provider's circuit breaker is open",
+                  lambda: {name: int(st["state"] != "closed") for name, st in _providers.stats()["providers"].items()}, ("provider",))
+REGISTRY.counter_fn("bot_signal_journal_total", "Signal journal counters (recorded, duplicates, evaluated, closed...)",
+                    lambda: _journal.stats_counters() if _journal is not None else {}, ("event",))
+REGISTRY.gauge_fn("bot_signal_journal_queue_depth", "Journal writes waiting for the writer thread", lambda: _journal_queue.depth)
+REGISTRY.gauge_fn("bot_signals_open", "Signals still waiting for TP/SL/expiry", lambda: _journal.open_count() if _journal is not None else 0)
+REGISTRY.gauge_fn("bot_symbol_index_size", "Symbols (and spellings) in the symbol index", lambda: symbol_index().size)
+REGISTRY.gauge_fn("bot_unfetchable_symbols", "Symbols currently rejected by the no-data cache", lambda: _unfetchable.stats()["size"])
+REGISTRY.gauge_fn("bot_startup_seconds", "Boot and lazy-load time per component", STARTUP.seconds, ("component",))
+REGISTRY.gauge_fn("bot_startup_ready_seconds", "Time from first import to serving", lambda: STARTUP.ready_sec)
+
+@app.get("/metrics")
+def metrics():
+    auth = request.headers.get("Authorization", "")
+    key = request.args.get("key", "").strip() or (auth[7:].strip() if auth.startswith("Bearer ") else "")
+    if not METRICS_KEY or key != METRICS_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return app.response_class(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+_recorder = TrafficRecorder(TRAFFIC_RECORD_PATH, max_bytes=TRAFFIC_RECORD_MAX_MB * 1024 * 1024) if TRAFFIC_RECORD else None
+_RECORDED_PATHS = ("/tv", "/webhook", "/tg")
+
+@app.before_request
+def _record_traffic():
+    if _recorder is not None and request.path.rstrip("/") in _RECORDED_PATHS and request.method == "POST":
+        _recorder.record(request.method, request.path, request.query_string.decode("latin-1"),
+                         request.headers, request.get_data(cache=True))
+
+@app.get("/recorder")
+def recorder_stats():
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({"ok": True, "enabled": TRAFFIC_RECORD, "recorder": _recorder.stats() if _recorder else None}), 200
+
+REGISTRY.counter_fn("bot_traffic_recorded_total", "Traffic recorder lines (recorded, dropped_full, errors)",
+                    lambda: {k: v for k, v in (_recorder.stats() if _recorder else {}).items() if k in ("recorded", "dropped_full", "errors")},
+                    ("event",))
+
+@app.before_request
+def _maybe_profile():
+    # ?profile=1&key=RUN_KEY on any endpoint: sample this request's stack
+    if RUN_KEY and request.args.get("profile") in ("1", "true", "yes") and request.args.get("key", "").strip() == RUN_KEY:
+        g.profiler = SamplingProfiler().start()
+
+@app.after_request
+def _attach_profile(resp):
+    prof = g.pop("profiler", None)
+    if prof is None:
+        return resp
+    report = prof.stop().report()
+    if PROFILE_LOG:
+        print("=== PROFILE ===", request.path, json.dumps(report["self"][:5]))
+    data = resp.get_json(silent=True) if resp.is_json else None
+    if isinstance(data, dict):
+        data["profile"] = report
+        resp.set_data(json.dumps(data))
+    else:
+        # text / non-object responses: the top self-time frames in a header
+        resp.headers["X-Profile"] = json.dumps(report["self"][:5], separators=(",", ":"))
+    return resp
+
+@app.get("/snapshot")
+def snapshot():
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    if request.args.get("status") in ("1", "true", "yes"):
+        return jsonify(snapshot_status()), 200
+    res = build_analysis_snapshot()
+    return jsonify(res), (200 if res.get("ok") else 409 if "running" in res.get("error", "") else 500)
+
 @app.get("/scan")
 def scan():
     key = request.args.get("key", "").strip()
@@ -813,7 +2029,8 @@ def scan():
 
     reset_day()
 
-    if not market_open_now_et():
+    force = request.args.get("force") in ("1", "true", "yes")
+    if not force and not market_open_now_et():
         return jsonify({"ok": True, "ignored": "market_closed"}), 200
 
     universe = load_universe()
@@ -821,13 +2038,15 @@ def scan():
         ok, info = send_telegram("⚠️ tickers.txt غير موجود أو فاضي.")
         return jsonify({"ok": ok, "info": info}), (200 if ok else 500)
 
-    picks, status = scan_universe(universe)
+    mode = request.args.get("mode", SCAN_MODE).strip().lower()
+    picks, status = run_scan(universe, mode)
     if not picks:
-        return jsonify({"ok": True, "status": status, "message": "no picks"}), 200
+        return jsonify({"ok": True, "status": status, "message": "no picks", "fetch": _state["last_fetch"]}), 200
 
+    already = _state_store.sent_symbols(_state["day_key"])
     fresh = []
     for p in picks:
-        if p["symbol"] not in _state["sent_symbols"]:
+        if p["symbol"] not in already:
             fresh.append(p)
         if len(fresh) >= MAX_RESULTS:
             break
@@ -835,23 +2054,152 @@ def scan():
     if not fresh:
         return jsonify({"ok": True, "message": "no new symbols"}), 200
 
-    lines = [f"📌 Market Picks (Legacy Scan) (SL {STOP_LOSS_PCT}% | TP {TAKE_PROFIT_PCT}%)", f"Count: {len(fresh)}", "—"]
-    for i, p in enumerate(fresh, 1):
-        lines.append(
-            f"{i}) {p['symbol']} | Daily: {p['chg_pct']}% | AvgVol: {p['avg_vol']}\n"
-            f"Entry: {p['entry']}\n"
-            f"SL: {p['sl']}\n"
-            f"TP: {p['tp']}\n"
-            "—"
-        )
+    lines = format_scan_lines(fresh, mode, "📌 Market Picks")
 
     ok, info = send_telegram("\n".join(lines))
     if ok:
-        for p in fresh:
-            _state["sent_symbols"].add(p["symbol"])
+        _state_store.sent_add(_state["day_key"], [p["symbol"] for p in fresh])
+        if mode == "swing":
+            journal_ideas("scan", fresh, dedupe=True)
+
+    return jsonify({"ok": ok, "info": info, "mode": mode, "sent": len(fresh), "fetch": _state["last_fetch"]}), (200 if ok else 500)
+
+# ================= Intraday scheduler (see scheduler.py) =================
+def scan_intraday_slice(symbols):
+    # newest bars only (incremental refresh), then the live close is previewed
+    # against the snapshot's daily indicator state (O(1) per symbol); symbols
+    # missing from the snapshot fall back to a full analyze_symbol
+    with timed(STAGE_SECONDS, op="sched", stage="refresh"):
+        stream_history(symbols, period="6mo", interval="1d")
+    picks = []
+    with timed(STAGE_SECONDS, op="sched", stage="analyze"):
+        for sym in symbols:
+            bars = read_history(sym, period="1mo", interval="1d")
+            if bars is None or not cols_len(bars):
+                continue
+            price = float(bars["close"][-1])
+            avg_vol = float(np.nanmean(bars["volume"][-20:]))
+            if not (MIN_PRICE <= price <= MAX_PRICE) or not avg_vol >= MIN_AVG_VOL:
+                continue
+            res = analyze_symbol(sym, price=price)
+            if not res.get("ok"):
+                continue
+            ideas = [x for x in res["ideas"] if x["decision"] == "ENTER"]
+            if ideas:
+                picks.append(dict(max(ideas, key=lambda x: x["score"]), symbol=res["symbol"], trend=res["trend"],
+                                  rsi=res["rsi"], atr=res["atr"], avg_vol=int(avg_vol)))
+
+    day = reset_day()
+    already = _state_store.sent_symbols(day)
+    fresh = sorted((p for p in picks if p["symbol"] not in already), key=lambda p: p["score"], reverse=True)[:MAX_RESULTS]
+    if not fresh:
+        return {"picks": len(picks), "sent": 0}
+    ok, info = send_telegram("\n".join(format_scan_lines(fresh, "swing", "⏱ Intraday Setups")))
+    if ok:
+        _state_store.sent_add(day, [p["symbol"] for p in fresh])
+        EVENTS.inc(len(fresh), op="sched", event="pushed")
+        journal_ideas("sched", fresh, dedupe=True)
+    return {"picks": len(picks), "sent": len(fresh) if ok else 0}
+
+def _after_close():
+    # snapshot first: it refreshes the universe's daily bars the evaluator reads
+    out = {}
+    if SCHED_SNAPSHOT_AFTER_CLOSE:
+        snap = build_analysis_snapshot()
+        out["snapshot"] = {k: snap.get(k) for k in ("ok", "build_id", "symbols", "error")}
+    if _journal is not None:
+        out["signals"] = evaluate_signals()
+    return out
+
+_scheduler = SessionScheduler(
+    _market_calendar, ET, load_universe, scan_intraday_slice,
+    interval_sec=SCHED_INTERVAL_SEC, tick_sec=SCHED_TICK_SEC, start_delay_sec=SCHED_START_DELAY_MIN * 60,
+    claim=_state_store.claim,
+    on_close=_after_close,
+    close_delay_sec=SCHED_CLOSE_DELAY_MIN * 60,
+)
 
-    return jsonify({"ok": ok, "info": info, "sent": len(fresh)}), (200 if ok else 500)
+def _scheduler_status_line():
+    if not SCHEDULER_ENABLED:
+        return "off"
+    st = _scheduler.stats()
+    last = st.get("last_tick") or {}
+    return (f"{'running' if st['running'] else 'stopped'} | {st['slices']} slices/{int(st['interval_sec'])}s | "
+            f"ticks {st['ticks']} | errors {st['errors']} | last slice {last.get('slice', '-')}")
+
+@app.get("/scheduler")
+def scheduler_status():
+    key = request.args.get("key", "").strip()
+    if not RUN_KEY or key != RUN_KEY:
+        return jsonify({"ok": False, "error": "unauthorized"}), 401
+    return jsonify({"ok": True, "enabled": SCHEDULER_ENABLED, "scheduler": _scheduler.stats()}), 200
+
+REGISTRY.gauge_fn("bot_scheduler", "Intraday scheduler counters (ticks, symbols, errors, closes...)",
+                  lambda: {k: v for k, v in _scheduler.stats().items() if isinstance(v, (int, float))}, ("field",))
+
+# ================= Warm-up (after the worker is serving) =================
+# gunicorn binds the port before workers import the app, so this thread runs
+# while the first requests are already being answered: /tv works from the
+# snapshot / chart API meanwhile, and later requests find everything loaded.
+def _warmup():
+    time.sleep(max(WARMUP_DELAY_SEC, 0))
+    with STARTUP.step("warmup", lazy=True):
+        try:
+            get_yf()
+        except Exception as e:
+            print("=== WARMUP yfinance ERROR ===", e)
+        try:
+            _ensure_tg_initialized()
+        except Exception as e:
+            print("=== WARMUP telegram ERROR ===", e)
+
+# Background threads (warm-up, scheduler) run only in processes that serve:
+# started by gunicorn's post_worker_init hook (gunicorn.conf.py) or, failing
+# that, by the first request. Never at import, so a --preload master or a
+# multiprocessing child of a process that imported main starts nothing.
+_background_pid = None
+_background_lock = threading.Lock()
+
+def start_background():
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+        if WARMUP_ON_START:
+            threading.Thread(target=_warmup, name="warmup", daemon=True).start()
+        if SCHEDULER_ENABLED and ET is not None:
+            _scheduler.start()
+
+@app.before_request
+def _ensure_background():
+    if _background_pid != os.getpid():
+        start_background()
+
+def _after_fork_in_child():
+    # a fork mid warm-up (gunicorn --preload) must not inherit held locks
+    global _yf_lock, _yf_download_lock, _yf_import_started, _tg_lock, _tg_build_lock, _symbols_lock, _background_lock
+    _yf_lock, _yf_download_lock = threading.Lock(), threading.Lock()
+    _yf_import_started = _yf_loaded  # the parent's import thread didn't survive the fork
+    _tg_lock, _tg_build_lock, _symbols_lock = threading.Lock(), threading.Lock(), threading.Lock()
+    _background_lock = threading.Lock()
+
+# alerts still buffered for a digest go out before the worker exits: from
+# gunicorn's worker_exit hook, and atexit for everything else
+def flush_alerts():
+    if ALERT_COALESCE_SEC > 0:
+        n = _alert_coalescer.flush_all()
+        if n:
+            EVENTS.inc(op="tv", event="coalescer_flushed_on_exit")
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(flush_alerts)
+STARTUP.ready()
+print("=== STARTUP ===", json.dumps(STARTUP.report()["steps"]), f"ready={STARTUP.ready_sec}s")
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", "5000"))
+    start_background()
     app.run(host="0.0.0.0", port=port)
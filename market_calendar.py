@@ -0,0 +1,141 @@
+import json
+from datetime import date, datetime, time as dtime, timedelta
+
+# ================= US equity session calendar (local, no network) =================
+# NYSE full-day holidays and 13:00 early closes from the exchange's fixed
+# rules (observed Sat -> Fri, Sun -> Mon; New Year's on a Saturday is not
+# moved back). A JSON file can add or cancel days the rules don't know
+# about (national days of mourning, unscheduled closures):
+#
+#   {"holidays": {"2025-01-09": "Carter mourning"}, "early_closes": {"2026-12-24": "13:00"},
+#    "open_days": ["2031-01-01"]}
+#
+#   cal = MarketCalendar("data/market_calendar.json")
+#   cal.session(date(2026, 11, 27))     -> (09:30, 13:00)
+#   cal.is_open(datetime.now(ET))
+
+REGULAR_OPEN = dtime(9, 30)
+REGULAR_CLOSE = dtime(16, 0)
+EARLY_CLOSE = dtime(13, 0)
+
+def _easter(year: int) -> date:
+    # anonymous Gregorian algorithm
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+def _nth_weekday(year, month, weekday, n):
+    # n-th (1-based) weekday of the month; n=-1 -> last
+    if n > 0:
+        d = date(year, month, 1)
+        d += timedelta(days=(weekday - d.weekday()) % 7)
+        return d + timedelta(weeks=n - 1)
+    d = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+    return d - timedelta(days=(d.weekday() - weekday) % 7)
+
+def _observed(d: date) -> date:
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+def nyse_holidays(year: int) -> dict:
+    h = {}
+    ny = date(year, 1, 1)
+    if ny.weekday() != 5:
+        h[_observed(ny)] = "New Year's Day"
+    h[_nth_weekday(year, 1, 0, 3)] = "Martin Luther King Jr. Day"
+    h[_nth_weekday(year, 2, 0, 3)] = "Washington's Birthday"
+    h[_easter(year) - timedelta(days=2)] = "Good Friday"
+    h[_nth_weekday(year, 5, 0, -1)] = "Memorial Day"
+    if year >= 2022:
+        h[_observed(date(year, 6, 19))] = "Juneteenth"
+    h[_observed(date(year, 7, 4))] = "Independence Day"
+    h[_nth_weekday(year, 9, 0, 1)] = "Labor Day"
+    h[_nth_weekday(year, 11, 3, 4)] = "Thanksgiving Day"
+    h[_observed(date(year, 12, 25))] = "Christmas Day"
+    return h
+
+def nyse_early_closes(year: int) -> dict:
+    e = {}
+    jul3 = date(year, 7, 3)
+    if jul3.weekday() < 4:  # Friday the 3rd is the observed holiday itself
+        e[jul3] = EARLY_CLOSE
+    e[_nth_weekday(year, 11, 3, 4) + timedelta(days=1)] = EARLY_CLOSE
+    dec24 = date(year, 12, 24)
+    if dec24.weekday() < 4:
+        e[dec24] = EARLY_CLOSE
+    return e
+
+
+class MarketCalendar:
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self._years = {}
+        self._extra_holidays, self._extra_early, self._open_days = {}, {}, set()
+        if path:
+            self._load(path)
+
+    def _load(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+        except Exception:
+            return
+        for k, v in (data.get("holidays") or {}).items():
+            self._extra_holidays[date.fromisoformat(k)] = str(v)
+        for k, v in (data.get("early_closes") or {}).items():
+            self._extra_early[date.fromisoformat(k)] = dtime.fromisoformat(v) if v else EARLY_CLOSE
+        self._open_days = {date.fromisoformat(k) for k in (data.get("open_days") or [])}
+
+    def _year(self, year):
+        y = self._years.get(year)
+        if y is None:
+            y = self._years[year] = (nyse_holidays(year), nyse_early_closes(year))
+        return y
+
+    def holiday(self, d: date):
+        # name of the closure, or None on a trading (or weekend) day
+        if d in self._open_days:
+            return None
+        return self._extra_holidays.get(d) or self._year(d.year)[0].get(d)
+
+    def session(self, d: date):
+        # (open, close) local exchange times, or None when closed
+        if d.weekday() >= 5 or self.holiday(d):
+            return None
+        close = self._extra_early.get(d) or self._year(d.year)[1].get(d) or REGULAR_CLOSE
+        return REGULAR_OPEN, close
+
+    def session_bounds(self, now: datetime):
+        # today's (open, close) as datetimes in now's timezone, or None
+        s = self.session(now.date())
+        if s is None:
+            return None
+        return (now.replace(hour=s[0].hour, minute=s[0].minute, second=0, microsecond=0),
+                now.replace(hour=s[1].hour, minute=s[1].minute, second=0, microsecond=0))
+
+    def is_open(self, now: datetime) -> bool:
+        b = self.session_bounds(now)
+        return b is not None and b[0] <= now <= b[1]
+
+    def next_open(self, now: datetime, max_days: int = 15):
+        d = now.date()
+        for _ in range(max_days):
+            s = self.session(d)
+            if s is not None:
+                o = datetime.combine(d, s[0])
+                o = now.tzinfo.localize(o) if hasattr(now.tzinfo, "localize") else o.replace(tzinfo=now.tzinfo)
+                if o > now:
+                    return o
+            d += timedelta(days=1)
+        return None
@@ -0,0 +1,268 @@
+import os
+import sys
+import time
+import threading
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# ================= In-process metrics (Prometheus text format) =================
+# Counters and histograms are plain dicts updated under a lock (~1us per
+# observation); gauges are callbacks evaluated only when /metrics is scraped.
+# Metrics are per process: under gunicorn each worker reports its own
+# numbers (pid label on bot_process_start_time_seconds).
+#
+#   STAGE = REGISTRY.histogram("bot_stage_seconds", "Time per stage", ("op", "stage"))
+#   with timed(STAGE, op="tv", stage="analyze"):
+#       ...
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _esc(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(names, values, extra=()):
+    pairs = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)] + [f'{n}="{_esc(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _num(v):
+    if v == float("inf"):
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, n=1, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _fmt_labels(self.labels, k), v) for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = []
+        for k, v in items:
+            acc = 0
+            for b, c in zip(self.buckets, v):
+                acc += c
+                out.append((self.name + "_bucket", _fmt_labels(self.labels, k, [("le", _num(float(b)))]), acc))
+            out.append((self.name + "_bucket", _fmt_labels(self.labels, k, [("le", "+Inf")]), v[-1]))
+            out.append((self.name + "_sum", _fmt_labels(self.labels, k), round(v[-2], 6)))
+            out.append((self.name + "_count", _fmt_labels(self.labels, k), v[-1]))
+        return out
+
+
+class CallbackMetric:
+    # fn() -> number, or {label value (or tuple): number} when labels are given
+    def __init__(self, name, doc, fn, labels=(), kind="gauge"):
+        self.name, self.doc, self.fn, self.labels, self.kind = name, doc, fn, tuple(labels), kind
+
+    def samples(self):
+        try:
+            v = self.fn()
+        except Exception:
+            return []
+        if not self.labels:
+            return [] if v is None else [(self.name, "", v)]
+        out = []
+        for k, x in (v or {}).items():
+            k = k if isinstance(k, tuple) else (k,)
+            if x is not None:
+                out.append((self.name, _fmt_labels(self.labels, k), x))
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _add(self, m):
+        with self._lock:
+            self._metrics.append(m)
+        return m
+
+    def counter(self, name, doc, labels=()):
+        return self._add(Counter(name, doc, labels))
+
+    def histogram(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, doc, labels, buckets))
+
+    def gauge_fn(self, name, doc, fn, labels=()):
+        return self._add(CallbackMetric(name, doc, fn, labels, "gauge"))
+
+    def counter_fn(self, name, doc, fn, labels=()):
+        return self._add(CallbackMetric(name, doc, fn, labels, "counter"))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for m in metrics:
+            lines.append(f"# HELP {m.name} {m.doc}")
+            lines.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, v in m.samples():
+                if isinstance(v, bool):
+                    v = int(v)
+                lines.append(f"{name}{labels} {_num(v)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_START = time.time()
+REGISTRY.gauge_fn("bot_process_start_time_seconds", "Start time of this worker process",
+                  lambda: {str(os.getpid()): _START}, ("pid",))
+
+@contextmanager
+def timed(hist, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - t0, **labels)
+
+
+# ================= Startup report =================
+# Wall time per boot component (imports, stores, lazy loads) for one worker;
+# lazy=True marks work done after the module finished importing.
+#
+#   STARTUP = StartupTimer(t0)
+#   with STARTUP.step("state_store"):
+#       ...
+
+class StartupTimer:
+    def __init__(self, t0=None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.ready_sec = None
+        self._steps = {}  # name -> (sec, at_sec, lazy)
+        self._lock = threading.Lock()
+
+    def record(self, name, sec, lazy=False):
+        with self._lock:
+            self._steps[name] = (round(sec, 4), round(time.perf_counter() - self.t0, 4), bool(lazy))
+
+    @contextmanager
+    def step(self, name, lazy=False):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0, lazy)
+
+    def ready(self):
+        # module imported: the worker can take requests from here on
+        self.ready_sec = round(time.perf_counter() - self.t0, 4)
+
+    def seconds(self):
+        with self._lock:
+            return {name: v[0] for name, v in self._steps.items()}
+
+    def report(self):
+        with self._lock:
+            steps = sorted(self._steps.items(), key=lambda kv: kv[1][1])
+        return {
+            "pid": os.getpid(),
+            "ready_sec": self.ready_sec,
+            "uptime_sec": round(time.perf_counter() - self.t0, 1),
+            "steps": [{"name": n, "sec": sec, "done_at_sec": at, "lazy": lazy} for n, (sec, at, lazy) in steps],
+        }
+
+
+# ================= Sampling profiler (one request at a time) =================
+# Samples the target thread's stack every interval_sec from a helper thread;
+# the request itself runs unmodified. Report = hottest frames and stacks.
+
+class SamplingProfiler:
+    def __init__(self, thread_id=None, interval_sec=0.002, max_depth=40):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval_sec = float(interval_sec)
+        self.max_depth = int(max_depth)
+        self.samples = 0
+        self._stacks = _Tally()
+        self._stop = threading.Event()
+        self._thread = None
+        self._t0 = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                co = frame.f_code
+                stack.append(f"{os.path.basename(co.co_filename)}:{co.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self._stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+        return self
+
+    def report(self, top=15):
+        total = max(self.samples, 1)
+        own, cumulative = _Tally(), _Tally()
+        for stack, n in self._stacks.items():
+            own[stack[-1]] += n
+            for fr in set(stack):
+                cumulative[fr] += n
+        return {
+            "elapsed_sec": round(time.perf_counter() - self._t0, 4) if self._t0 else 0.0,
+            "interval_sec": self.interval_sec,
+            "samples": self.samples,
+            "self": [{"frame": f, "pct": round(n / total * 100, 1)} for f, n in own.most_common(top)],
+            "cumulative": [{"frame": f, "pct": round(n / total * 100, 1)} for f, n in cumulative.most_common(top)],
+            "stacks": [{"stack": ";".join(s), "samples": n} for s, n in self._stacks.most_common(5)],
+        }
@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import multiprocessing as mp
+
+import numpy as np
+
+from bar_store import BarStore, DAY_SEC, cols_len
+from backtest import BAR_STORE_DIR, WARMUP_BARS, load_tickers, prepare, simulate_row, summarize
+from strategy import DEFAULT_PARAMS, make_params, save_params
+
+# ================= Parameter sweep with walk-forward validation =================
+# Indicators are computed once for the whole universe (none of the swept
+# parameters change them) and shared with the worker processes through fork,
+# so a trial only re-scores signals and re-walks trades.
+#
+#   python optimize.py --grid sl_mult=1,1.5,2 tp2_mult=2,3,4 --folds 3
+#   python optimize.py --random 200 --space sl_mult=1:3 enter_score=5:8 --out data/strategy_params.json
+
+_SHARED = {}
+
+def parse_grid(specs):
+    grid = {}
+    for spec in specs or []:
+        k, _, vals = spec.partition("=")
+        if k not in DEFAULT_PARAMS:
+            raise SystemExit(f"unknown parameter: {k}")
+        grid[k] = [type(DEFAULT_PARAMS[k])(float(v)) for v in vals.split(",") if v.strip()]
+    return grid
+
+def parse_space(specs):
+    space = {}
+    for spec in specs or []:
+        k, _, rng = spec.partition("=")
+        if k not in DEFAULT_PARAMS:
+            raise SystemExit(f"unknown parameter: {k}")
+        lo, _, hi = rng.partition(":")
+        space[k] = (float(lo), float(hi))
+    return space
+
+def grid_candidates(grid):
+    keys = list(grid)
+    return [make_params(dict(zip(keys, combo))) for combo in itertools.product(*(grid[k] for k in keys))]
+
+def random_candidates(space, n, seed=0):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(int(n)):
+        c = {}
+        for k, (lo, hi) in space.items():
+            c[k] = round(rnd.randint(int(lo), int(hi))) if isinstance(DEFAULT_PARAMS[k], int) else round(rnd.uniform(lo, hi), 3)
+        out.append(make_params(c))
+    return out
+
+def _valid_params(p):
+    return (p["sl_mult"] > 0 and p["tp1_mult"] > 0 and p["tp2_mult"] >= p["tp1_mult"]
+            and p["long_rsi_lo"] <= p["long_rsi_hi"] and p["short_rsi_lo"] <= p["short_rsi_hi"]
+            and p["wait_score"] <= p["enter_score"])
+
+def walk_forward_windows(ts_min, ts_max, folds, train_years, test_years):
+    # rolling windows that end at the latest bar; returns [(train_start, train_end, test_end)]
+    test = test_years * 365.25 * DAY_SEC
+    train = train_years * 365.25 * DAY_SEC
+    out = []
+    end = ts_max + DAY_SEC
+    for _ in range(int(folds)):
+        t_end = end - test
+        t_start = t_end - train
+        if t_start < ts_min:
+            break
+        out.append((t_start, t_end, end))
+        end = t_end
+    return list(reversed(out))
+
+def objective(summary, name, min_trades):
+    if summary["trades"] < min_trades:
+        return float("-inf")
+    if name == "pnl":
+        return summary["total_pnl"]
+    if name == "calmar":
+        return summary["total_pnl"] / max(summary["max_drawdown_pct"], 1.0)
+    return summary["expectancy_r"]
+
+def _eval(job):
+    # runs in a worker; _SHARED was filled before the pool forked
+    idx, params, start_ts, end_ts = job
+    p, syms, o = _SHARED["prep"], _SHARED["syms"], _SHARED["opts"]
+    trades = []
+    for r, s in enumerate(syms):
+        trades.extend(simulate_row(p, r, s, side=o["side"], capital=o["capital"], risk_pct=o["risk_pct"],
+                                   max_hold=o["max_hold"], start_ts=start_ts, end_ts=end_ts, params=params))
+    return idx, summarize(trades, o["capital"])
+
+def _init_worker(shared):
+    _SHARED.update(shared)
+
+def _pool(workers):
+    if "fork" in mp.get_all_start_methods():
+        return mp.get_context("fork").Pool(workers)  # children inherit _SHARED copy-on-write
+    return mp.get_context().Pool(workers, initializer=_init_worker, initargs=(dict(_SHARED),))
+
+def evaluate_all(pool, candidates, start_ts, end_ts):
+    jobs = [(i, c, start_ts, end_ts) for i, c in enumerate(candidates)]
+    out = [None] * len(candidates)
+    it = pool.imap_unordered(_eval, jobs) if pool else map(_eval, jobs)
+    for i, summ in it:
+        out[i] = summ
+    return out
+
+def run_sweep(symbols, candidates, root=BAR_STORE_DIR, folds=3, train_years=3, test_years=1,
+              side="both", capital=10000.0, risk_pct=1.0, max_hold=20, smoothing="simple",
+              objective_name="expectancy", min_trades=30, workers=None):
+    t0 = time.time()
+    store = BarStore(root)
+    syms, hist = [], []
+    for s in symbols:
+        cols = store.read(s, "1d")
+        if cols is not None and cols_len(cols) > WARMUP_BARS:
+            syms.append(s)
+            hist.append(cols)
+    if not syms:
+        return {"ok": False, "error": "no stored history"}
+
+    candidates = [c for c in candidates if _valid_params(c)] or [make_params()]
+    # per-symbol rows (own bars, own windows): a gap or a late listing in one
+    # symbol doesn't thin out the others' samples; prep["ts"] is (symbols, bars)
+    prep = prepare(hist, smoothing)
+    _SHARED.clear()
+    _SHARED.update({"prep": prep, "syms": syms, "opts": {
+        "side": side, "capital": float(capital), "risk_pct": float(risk_pct), "max_hold": int(max_hold)}})
+
+    windows = walk_forward_windows(float(np.nanmin(prep["ts"])), float(np.nanmax(prep["ts"])), folds, train_years, test_years)
+    if not windows:
+        return {"ok": False, "error": "not enough history for the requested walk-forward windows"}
+
+    workers = workers or os.cpu_count() or 1
+    pool = _pool(workers) if workers > 1 and len(candidates) > 1 else None
+    try:
+        fold_reports = []
+        oos_trades_r = []
+        for (tr_s, tr_e, te_e) in windows:
+            train = evaluate_all(pool, candidates, tr_s, tr_e)
+            scores = [objective(s, objective_name, min_trades) for s in train]
+            best = int(np.argmax(scores))
+            test = evaluate_all(None, [candidates[best]], tr_e, te_e)[0]
+            base = evaluate_all(None, [make_params()], tr_e, te_e)[0]
+            fold_reports.append({
+                "train_from": tr_s, "train_to": tr_e, "test_to": te_e,
+                "best_params": candidates[best], "train": train[best], "test": test, "test_default_params": base,
+            })
+            oos_trades_r.append((test["expectancy_r"], test["trades"]))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    winner = fold_reports[-1]["best_params"]  # chosen on the most recent training window
+    n = sum(t for _, t in oos_trades_r)
+    return {
+        "ok": True,
+        "winner": winner,
+        "folds": fold_reports,
+        "oos_expectancy_r": round(sum(e * t for e, t in oos_trades_r) / n, 4) if n else 0.0,
+        "oos_trades": n,
+        "candidates": len(candidates),
+        "symbols": len(syms),
+        "elapsed_sec": round(time.time() - t0, 2),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sweep swing-rule parameters with walk-forward validation")
+    ap.add_argument("--tickers", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tickers.txt"))
+    ap.add_argument("--symbols", default="")
+    ap.add_argument("--store", default=BAR_STORE_DIR)
+    ap.add_argument("--grid", nargs="*", help="name=v1,v2,...")
+    ap.add_argument("--random", type=int, default=0, help="number of random trials over --space")
+    ap.add_argument("--space", nargs="*", help="name=lo:hi")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--folds", type=int, default=3)
+    ap.add_argument("--train-years", type=float, default=3)
+    ap.add_argument("--test-years", type=float, default=1)
+    ap.add_argument("--side", default="both", choices=("both", "long", "short"))
+    ap.add_argument("--capital", type=float, default=10000.0)
+    ap.add_argument("--risk", type=float, default=1.0)
+    ap.add_argument("--max-hold", type=int, default=20)
+    ap.add_argument("--smoothing", default=os.getenv("INDICATOR_SMOOTHING", "simple"))
+    ap.add_argument("--objective", default="expectancy", choices=("expectancy", "pnl", "calmar"))
+    ap.add_argument("--min-trades", type=int, default=30)
+    ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--out", default="", help="write the winning params here (loadable by the live bot)")
+    ap.add_argument("--json", default="", help="write the full report here")
+    a = ap.parse_args(argv)
+
+    candidates = [make_params()]
+    if a.grid:
+        candidates += grid_candidates(parse_grid(a.grid))
+    if a.random:
+        candidates += random_candidates(parse_space(a.space), a.random, a.seed)
+
+    symbols = [s.strip().upper() for s in a.symbols.split(",") if s.strip()] or load_tickers(a.tickers)
+    rep = run_sweep(symbols, candidates, a.store, a.folds, a.train_years, a.test_years, a.side, a.capital,
+                    a.risk, a.max_hold, a.smoothing, a.objective, a.min_trades, a.workers or None)
+    if not rep.get("ok"):
+        print(rep.get("error"))
+        return 1
+
+    print(f"Sweep {rep['candidates']} candidates x {len(rep['folds'])} folds | {rep['symbols']} symbols | {rep['elapsed_sec']}s")
+    for i, f in enumerate(rep["folds"], 1):
+        print(f"fold {i}: train exp {f['train']['expectancy_r']:+.3f}R n={f['train']['trades']} | "
+              f"test exp {f['test']['expectancy_r']:+.3f}R n={f['test']['trades']} "
+              f"(defaults {f['test_default_params']['expectancy_r']:+.3f}R)")
+    print(f"OOS expectancy {rep['oos_expectancy_r']:+.3f}R over {rep['oos_trades']} trades")
+    print("winner:", json.dumps(rep["winner"]))
+    if a.out:
+        save_params(a.out, rep["winner"], {"oos_expectancy_r": rep["oos_expectancy_r"], "oos_trades": rep["oos_trades"],
+                                           "objective": a.objective, "created_at": time.time()})
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump(rep, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
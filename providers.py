@@ -0,0 +1,208 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+# ================= Market-data providers: hedged, circuit-broken =================
+# Each source is a Provider(name, fn) with its own latency window and circuit
+# breaker. ProviderSet.fetch() starts the first healthy provider; if it has
+# not answered within its p95 latency (clamped to hedge_min..hedge_max) the
+# next one is fired too and the first good answer wins. A failure fails over
+# at once. Callers pass an absolute deadline (time.monotonic()) and get
+# {"ok": False, "timeout": True} when it passes instead of waiting on a slow
+# source; calls still in flight finish in the background and feed the stats.
+#
+#   chart = Provider("yahoo_chart", lambda sym, timeout, **kw: {...}, timeout=25)
+#   data = ProviderSet([yf_provider, chart], workers=16)
+#   r = data.fetch("AAPL", deadline=time.monotonic() + 2.5, period="6mo", interval="1d")
+#   fn(...) -> {"ok": True, "bars": ...} | {"ok": False, "error": "..."} (raising = failure)
+# A failure with "unknown": True means the source has no such symbol; it
+# doesn't count against the breaker, and fetch() passes the flag on only when
+# every provider that answered said so.
+
+
+class CircuitBreaker:
+    # closed -> open after `failures` consecutive errors; after reset_sec one
+    # probe call is let through (half open) and its outcome decides
+    def __init__(self, failures=5, reset_sec=30.0):
+        self.failures = max(int(failures), 1)
+        self.reset_sec = float(reset_sec)
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = None
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_sec:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state, self.consecutive = "closed", 0
+                return
+            self.consecutive += 1
+            if self.state == "half_open" or self.consecutive >= self.failures:
+                if self.state != "open":
+                    self.trips += 1
+                self.state, self.opened_at = "open", time.monotonic()
+
+    def release(self):
+        # a probe that ended without a verdict (cut by the caller's deadline):
+        # back to open with a fresh timer so the next probe comes after reset_sec
+        with self._lock:
+            if self.state == "half_open" and self._probing:
+                self._probing = False
+                self.state, self.opened_at = "open", time.monotonic()
+
+
+class Provider:
+    def __init__(self, name, fn, timeout=25.0, available=None, breaker=None, window=200):
+        self.name = name
+        self.fn = fn
+        self.timeout = float(timeout)
+        self.available = available or (lambda: True)
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies = deque(maxlen=window)  # successful calls only
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "ok": 0, "failed": 0, "won": 0, "hedged": 0, "skipped_open": 0, "cut": 0,
+                         "unknown": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def record(self, ok, elapsed):
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["ok" if ok else "failed"] += 1
+            if ok:
+                self._latencies.append(elapsed)
+        self.breaker.record(ok)
+
+    def p95(self):
+        with self._lock:
+            lat = list(self._latencies)
+        return float(np.percentile(lat, 95)) if len(lat) >= 5 else None
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+        p95 = self.p95()
+        out.update({"state": self.breaker.state, "trips": self.breaker.trips,
+                    "p95_ms": None if p95 is None else round(p95 * 1000, 1)})
+        return out
+
+
+class ProviderSet:
+    def __init__(self, providers, workers=16, hedge_min_sec=0.15, hedge_max_sec=3.0, hedge_default_sec=1.0):
+        self.providers = list(providers)
+        self.hedge_min_sec = float(hedge_min_sec)
+        self.hedge_max_sec = float(hedge_max_sec)
+        self.hedge_default_sec = float(hedge_default_sec)
+        self._pool = ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix="provider")
+        self.counters = {"requests": 0, "hedges": 0, "failovers": 0, "deadline_exceeded": 0, "no_provider": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def hedge_delay(self, p):
+        p95 = p.p95()
+        if p95 is None:
+            return self.hedge_default_sec
+        return min(max(p95, self.hedge_min_sec), self.hedge_max_sec)
+
+    def _call(self, p, timeout, args, kwargs):
+        t0 = time.perf_counter()
+        try:
+            r = p.fn(*args, timeout=timeout, **kwargs) or {"ok": False, "error": "empty answer"}
+        except Exception as e:
+            r = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        elapsed = time.perf_counter() - t0
+        if not r.get("ok") and timeout < p.timeout and elapsed >= timeout * 0.9:
+            # timed out on the caller's budget, not its own: says nothing about its health
+            p._count("cut")
+            p.breaker.release()
+            return r
+        if not r.get("ok") and r.get("unknown"):
+            # a clean "no such symbol" answer: the source is healthy, the ticker isn't
+            p._count("unknown")
+            p.breaker.record(True)
+            return r
+        p.record(bool(r.get("ok")), elapsed)
+        return r
+
+    def fetch(self, *args, deadline=None, **kwargs):
+        self._count("requests")
+        # breakers are asked only when a provider is actually called, so an
+        # unused half-open probe is never left hanging
+        queue = deque(p for p in self.providers if p.available())
+        running, errors, unknown = {}, [], []
+        last = None
+
+        def launch(reason=None):
+            nonlocal last
+            while queue:
+                p = queue.popleft()
+                if not p.breaker.allow():
+                    p._count("skipped_open")
+                    continue
+                left = p.timeout if deadline is None else max(min(p.timeout, deadline - time.monotonic()), 0.1)
+                running[self._pool.submit(self._call, p, left, args, kwargs)] = p
+                last = p
+                if reason:
+                    self._count(reason)
+                    p._count("hedged")
+                return True
+            return False
+
+        if not launch():
+            self._count("no_provider")
+            return {"ok": False, "error": "no data provider available (circuits open)"}
+        while running:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            timeout = remaining
+            if queue:
+                h = self.hedge_delay(last)
+                timeout = h if remaining is None else min(h, remaining)
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            for f in done:
+                p = running.pop(f)
+                r = f.result()
+                if r.get("ok"):
+                    p._count("won")
+                    return dict(r, source=p.name)
+                errors.append(f"{p.name}: {r.get('error')}")
+                unknown.append(bool(r.get("unknown")))
+            if queue and not running:
+                launch("failovers")
+            elif queue and not done:
+                launch("hedges")
+
+        if running:
+            self._count("deadline_exceeded")
+            return {"ok": False, "timeout": True, "error": "deadline exceeded" + (f" ({'; '.join(errors)})" if errors else "")}
+        return {"ok": False, "error": "; ".join(errors) or "no data", "unknown": bool(unknown) and all(unknown)}
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.counters)
+        out["providers"] = {p.name: p.stats() for p in self.providers}
+        return out
@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import base64
+import threading
+from urllib.parse import parse_qsl, urlencode
+
+# ================= Webhook traffic recorder (append-only JSON lines) =================
+# One compact line per incoming request, written at arrival so a burst that
+# never got answered is still on record. replay.py re-sends a recording
+# against a local instance. Secrets (JSON "secret" fields, ?secret=, the
+# Telegram secret-token header) are never written; replay injects its own.
+# Lines are single O_APPEND writes, so several gunicorn workers can share
+# one file. Recording stops (and counts drops) once the file reaches max_bytes.
+#
+#   rec = TrafficRecorder("data/traffic.jsonl")
+#   rec.record("POST", "/tv", "", request.headers, request.get_data(cache=True))
+#
+#   {"t":1767364200.123,"pid":7,"m":"POST","p":"/tv","q":"","h":{"Content-Type":"application/json"},"b":"{...}"}
+#   (bodies that aren't UTF-8 are stored as "b64")
+
+DEFAULT_HEADERS = ("Content-Type", "User-Agent", "X-Forwarded-For", "X-Real-Ip", "Content-Length")
+REDACTED = "<redacted>"
+
+
+def _redact_body(body: bytes, keys):
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        return None, base64.b64encode(body).decode("ascii")
+    try:
+        data = json.loads(text) if text.lstrip().startswith("{") else None
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and any(k in data for k in keys):
+        text = json.dumps({k: (REDACTED if k in keys else v) for k, v in data.items()}, separators=(",", ":"))
+    return text, None
+
+
+class TrafficRecorder:
+    def __init__(self, path, headers=DEFAULT_HEADERS, redact=("secret",), max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.headers = tuple(headers)
+        self.redact = frozenset(redact)
+        self.max_bytes = int(max_bytes)
+        self._fd = None
+        self._pid = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self.counters = {"recorded": 0, "bytes": 0, "dropped_full": 0, "errors": 0}
+
+    def _open(self):
+        # per process: a descriptor inherited over fork would share the offset bookkeeping
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+            self._size = os.fstat(self._fd).st_size
+        return self._fd
+
+    def record(self, method, path, query, headers, body: bytes, t=None):
+        text, b64 = _redact_body(body or b"", self.redact)
+        q = urlencode([(k, REDACTED if k in self.redact else v) for k, v in parse_qsl(query or "", keep_blank_values=True)])
+        rec = {"t": round(time.time() if t is None else t, 4), "pid": os.getpid(), "m": method, "p": path, "q": q,
+               "h": {k: headers.get(k) for k in self.headers if headers.get(k) is not None}}
+        if b64 is not None:
+            rec["b64"] = b64
+        else:
+            rec["b"] = text
+        line = (json.dumps(rec, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            try:
+                fd = self._open()
+                if self._size + len(line) > self.max_bytes:
+                    self.counters["dropped_full"] += 1
+                    return False
+                os.write(fd, line)
+                self._size += len(line)
+                self.counters["recorded"] += 1
+                self.counters["bytes"] += len(line)
+                return True
+            except OSError:
+                self.counters["errors"] += 1
+                return False
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, path=self.path, file_bytes=self._size, max_bytes=self.max_bytes)
+
+
+def read_recording(path):
+    # -> list of records sorted by arrival; bad lines (a torn last write) are skipped
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if "b64" in rec:
+                rec["body"] = base64.b64decode(rec["b64"])
+            else:
+                rec["body"] = (rec.get("b") or "").encode("utf-8")
+            out.append(rec)
+    out.sort(key=lambda r: r["t"])
+    return out
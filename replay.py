@@ -0,0 +1,308 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+import numpy as np
+import requests
+
+from bench import RUN_KEY, configure_env, percentiles, serve_app, wait_for
+from fake_upstreams import FakeTelegram, FakeYahoo
+from recorder import REDACTED, read_recording
+
+# ================= Replay a recorded webhook session (see recorder.py) =================
+# Re-sends the /tv, /webhook and /tg requests of a TRAFFIC_RECORD journal
+# with their original spacing divided by --speed (0 = as fast as possible).
+# By default it starts the bot in-process with Yahoo/Telegram faked, like
+# bench.py. --server-threads caps the requests served at once, the way a
+# gunicorn worker's threads do, so worker counts can be tried against the
+# real burst. --target points at an instance that is already running.
+#
+# Reports latency per path, drops (errors, 5xx, 503 queue full), alerts
+# TradingView would have given up on (over --tv-timeout-ms), the cooldown /
+# filter / coalesce outcomes, and saturation sampled while it runs (TV queue
+# depth and busy workers, pending Telegram commands, requests in flight).
+#
+#   TRAFFIC_RECORD=1 gunicorn main:app ...                 # record
+#   python replay.py data/traffic.jsonl --speed 10 --server-threads 8
+#   python replay.py data/traffic.jsonl --speed 0 --tv-async --from 1767364200 --to 1767364500
+#   python replay.py data/traffic.jsonl --target http://127.0.0.1:8000 --key $RUN_KEY --secret $WEBHOOK_SECRET
+
+class ConcurrencyLimit:
+    # WSGI middleware: at most n requests inside the app, the rest wait
+    def __init__(self, app, n):
+        self.app = app
+        self._sem = threading.BoundedSemaphore(max(int(n), 1))
+
+    def __call__(self, environ, start_response):
+        with self._sem:
+            it = self.app(environ, start_response)
+            try:
+                return [b"".join(it)]
+            finally:
+                if hasattr(it, "close"):
+                    it.close()
+
+def _tickers(records):
+    # symbols alerted on in the recording, so the in-process symbol index knows them
+    out = []
+    for r in records:
+        if r["p"].rstrip("/") in ("/tv", "/webhook"):
+            try:
+                body = json.loads(r["body"] or b"{}")
+            except ValueError:
+                continue
+            t = isinstance(body, dict) and (body.get("ticker") or body.get("symbol"))
+            if t:
+                out.append(str(t).split(":")[-1].upper())
+    return list(dict.fromkeys(out))
+
+def _prepare(rec, secret, tg_secret):
+    body, query = rec["body"], rec.get("q") or ""
+    if secret is not None and REDACTED.encode() in body:
+        body = body.replace(json.dumps(REDACTED).encode(), json.dumps(secret).encode())
+    if query:
+        query = urlencode([(k, tg_secret if v == REDACTED else v) for k, v in parse_qsl(query, keep_blank_values=True)])
+    headers = {k: v for k, v in (rec.get("h") or {}).items() if k in ("Content-Type", "User-Agent")}
+    return body, query, headers
+
+def outcome_of(path, status, data):
+    if path.rstrip("/") == "/tg":
+        return "ok" if status == 200 else f"http_{status}"
+    if not isinstance(data, dict):
+        return f"http_{status}"
+    for k in ("ignored", "filtered"):
+        if k in data:
+            return f"{k}:{data[k]}"
+    for k in ("queued", "coalesced"):
+        if data.get(k):
+            return k
+    if status == 503:
+        return "queue_full"
+    return "sent" if data.get("ok") else f"failed:{data.get('error') or status}"
+
+def peak_rate(ts, speed):
+    # busiest second of the schedule, in requests/s
+    if not len(ts):
+        return 0
+    t = (np.asarray(ts) - ts[0]) / (speed or 1e9)
+    return int(np.bincount(np.floor(t).astype(int)).max())
+
+class Sampler:
+    # polls fn() every interval_sec and keeps the max / mean of every number
+    def __init__(self, fn, interval_sec=0.1):
+        self.fn = fn
+        self.interval_sec = interval_sec
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replay-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            try:
+                self.samples.append(self.fn())
+            except Exception:
+                pass
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        keys = sorted({k for s in self.samples for k, v in s.items() if isinstance(v, (int, float))})
+        return {k: {"max": max(s.get(k, 0) for s in self.samples),
+                    "mean": round(float(np.mean([s.get(k, 0) for s in self.samples])), 2)} for k in keys}
+
+def local_sampler(bot, inflight):
+    def fn():
+        q = bot._tv_queue.stats()
+        return {"tv_queue_depth": q["depth"], "tv_busy": q["busy"], "tv_rejected": q["rejected"],
+                "tg_pending": bot._tg_executor._work_queue.qsize(), "tg_spool": bot._tg_sender.stats()["spool_depth"],
+                "threads": threading.active_count(), "inflight": inflight()}
+    return fn
+
+def remote_sampler(base, key, inflight):
+    s = requests.Session()
+    def fn():
+        out = {"inflight": inflight()}
+        q = s.get(f"{base}/queue", params={"key": key}, timeout=2).json().get("tv_queue") or {}
+        out.update({"tv_queue_depth": q.get("depth", 0), "tv_busy": q.get("busy", 0), "tv_rejected": q.get("rejected", 0)})
+        return out
+    return fn
+
+def replay(records, base, a):
+    speed = a.speed if a.speed > 0 else 0
+    t_first = records[0]["t"]
+    local = threading.local()
+    lock = threading.Lock()
+    inflight = [0]
+    by_path, lag = {}, []
+
+    def one(rec):
+        s = getattr(local, "session", None)
+        if s is None:
+            s = local.session = requests.Session()
+        body, query, headers = _prepare(rec, a.secret, a.tg_secret)
+        url = f"{base}{rec['p']}" + (f"?{query}" if query else "")
+        with lock:
+            inflight[0] += 1
+        t0 = time.perf_counter()
+        try:
+            r = s.request(rec.get("m", "POST"), url, data=body, headers=headers, timeout=a.client_timeout)
+            status = r.status_code
+            try:
+                data = r.json()
+            except ValueError:
+                data = None
+            outcome = outcome_of(rec["p"], status, data)
+        except Exception as e:
+            status, outcome = type(e).__name__, f"error:{type(e).__name__}"
+        ms = (time.perf_counter() - t0) * 1000.0
+        with lock:
+            inflight[0] -= 1
+            st = by_path.setdefault(rec["p"].rstrip("/") or "/", {"lat": [], "status": Counter(), "outcome": Counter()})
+            st["lat"].append(ms)
+            st["status"][str(status)] += 1
+            st["outcome"][outcome] += 1
+
+    sampler = Sampler(a.sampler(lambda: inflight[0])).start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(a.max_inflight, 1), thread_name_prefix="replay") as ex:
+        for rec in records:
+            if speed:
+                due = (rec["t"] - t_first) / speed
+                wait = due - (time.perf_counter() - t0)
+                if wait > 0:
+                    time.sleep(wait)
+                lag.append(max(0.0, (time.perf_counter() - t0) - due) * 1000.0)
+            ex.submit(one, rec)
+    send_sec = time.perf_counter() - t0
+    drain = None
+    if a.drain is not None:
+        t1 = time.perf_counter()
+        if wait_for(a.drain, a.drain_timeout):
+            drain = round(time.perf_counter() - t1, 3)
+    saturation = sampler.stop()
+
+    paths = {}
+    for p, st in by_path.items():
+        out = {"requests": len(st["lat"]), "status": dict(st["status"]), "outcome": dict(st["outcome"])}
+        out.update(percentiles(st["lat"]))
+        out["dropped"] = sum(n for k, n in st["status"].items() if not k.isdigit() or int(k) >= 500)
+        if p in ("/tv", "/webhook"):
+            out["over_tv_timeout"] = int(sum(ms > a.tv_timeout_ms for ms in st["lat"]))
+        paths[p] = out
+    return {
+        "requests": len(records), "speed": speed or "max",
+        "recorded_sec": round(records[-1]["t"] - t_first, 3), "wall_sec": round(send_sec, 3),
+        "offered_peak_rps": peak_rate([r["t"] for r in records], speed) if speed else None,
+        "achieved_rps": round(len(records) / send_sec, 2) if send_sec > 0 else None,
+        "send_lag_ms": percentiles(lag) if lag else None,
+        "drain_sec": drain, "paths": paths, "saturation": saturation,
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Replay a recorded /tv, /webhook, /tg session against a local bot")
+    ap.add_argument("recordings", nargs="+", help="TRAFFIC_RECORD journal(s); several files are merged by time")
+    ap.add_argument("--speed", type=float, default=1.0, help="1 = real time, 10 = ten times faster, 0 = max")
+    ap.add_argument("--from", dest="t_from", type=float, default=None, help="first arrival to replay (epoch sec)")
+    ap.add_argument("--to", dest="t_to", type=float, default=None, help="last arrival to replay (epoch sec)")
+    ap.add_argument("--paths", default="/tv,/webhook,/tg", help="recorded paths to replay")
+    ap.add_argument("--target", default="", help="running instance (default: start the bot in-process with fakes)")
+    ap.add_argument("--key", default=RUN_KEY, help="RUN_KEY of --target, for sampling /queue")
+    ap.add_argument("--secret", default=None, help="WEBHOOK_SECRET to put back into alert bodies")
+    ap.add_argument("--tg-secret", default="", help="TELEGRAM_WEBHOOK_SECRET to put back into /tg?secret=")
+    ap.add_argument("--max-inflight", type=int, default=256, help="replayer connections at most")
+    ap.add_argument("--client-timeout", type=float, default=30)
+    ap.add_argument("--tv-timeout-ms", type=float, default=3000, help="TradingView gives up on webhooks slower than this")
+    ap.add_argument("--server-threads", type=int, default=0, help="in-process: requests served at once (0 = unlimited)")
+    ap.add_argument("--tv-async", action="store_true", help="in-process: queued /tv path (TV_ASYNC=1)")
+    ap.add_argument("--tv-workers", type=int, default=None, help="in-process: TV_QUEUE_WORKERS")
+    ap.add_argument("--tg-workers", type=int, default=None, help="in-process: TG_BLOCKING_WORKERS")
+    ap.add_argument("--cooldown-min", type=int, default=None, help="in-process: ALERT_COOLDOWN_MIN (default: the env's, else 60)")
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="in-process: fake upstream latency")
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--analyze-cache-ttl", type=float, default=60)
+    ap.add_argument("--real-rate-limits", action="store_true", help="keep the Telegram send rate limits from the env")
+    ap.add_argument("--drain-timeout", type=float, default=120)
+    ap.add_argument("--out", default="", help="result JSON (default data/replay/replay-<time>.json)")
+    ap.add_argument("--keep", action="store_true", help="keep the temp work dir")
+    a = ap.parse_args(argv)
+
+    only = {p.strip().rstrip("/") for p in a.paths.split(",") if p.strip()}
+    records = [r for path in a.recordings for r in read_recording(path)]
+    records = [r for r in records if r["p"].rstrip("/") in only
+               and (a.t_from is None or r["t"] >= a.t_from) and (a.t_to is None or r["t"] <= a.t_to)]
+    records.sort(key=lambda r: r["t"])
+    if not records:
+        print("nothing to replay")
+        return 1
+
+    yahoo = tg = srv = bot = work = None
+    cooldown = a.cooldown_min if a.cooldown_min is not None else os.environ.get("ALERT_COOLDOWN_MIN", "60")
+    try:
+        if a.target:
+            base = a.target.rstrip("/")
+            a.sampler = lambda inflight: remote_sampler(base, a.key, inflight)
+            a.drain = None
+        else:
+            faults = dict(latency_ms=a.latency_ms, jitter_ms=a.jitter_ms)
+            yahoo, tg = FakeYahoo(**faults).start(), FakeTelegram(**faults).start()
+            work = tempfile.mkdtemp(prefix="replay-")
+            configure_env(a, work, yahoo, tg)
+            os.environ["ALERT_COOLDOWN_MIN"] = str(cooldown)
+            if a.tv_workers:
+                os.environ["TV_QUEUE_WORKERS"] = str(a.tv_workers)
+            if a.tg_workers:
+                os.environ["TG_BLOCKING_WORKERS"] = str(a.tg_workers)
+            with open(os.path.join(work, "tickers.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(_tickers(records)) + "\n")
+            import main as bot
+            app = ConcurrencyLimit(bot.app, a.server_threads) if a.server_threads > 0 else bot.app
+            srv, base = serve_app(app)
+            a.sampler = lambda inflight: local_sampler(bot, inflight)
+            a.drain = lambda: bot._tv_queue.depth == 0 and bot._tg_executor._work_queue.qsize() == 0
+
+        print(f"replaying {len(records)} requests ({records[-1]['t'] - records[0]['t']:.1f}s recorded) "
+              f"at {'max' if a.speed <= 0 else f'{a.speed:g}x'} -> {base}")
+        results = replay(records, base, a)
+    finally:
+        if srv is not None:
+            srv.shutdown()
+        for fake in (yahoo, tg):
+            if fake is not None:
+                fake.stop()
+        if work and not a.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    for p, x in results["paths"].items():
+        print(f"  {p:9s} n {x['requests']} | p50 {x['p50']}ms p95 {x['p95']}ms p99 {x['p99']}ms max {x['max']}ms "
+              f"| dropped {x['dropped']}" + (f" | over TV timeout {x['over_tv_timeout']}" if "over_tv_timeout" in x else ""))
+        print(f"            {x['outcome']}")
+    print(f"  wall {results['wall_sec']}s | achieved {results['achieved_rps']} req/s | offered peak {results['offered_peak_rps']} req/s "
+          f"| drain {results['drain_sec']}s")
+    print("  saturation " + " | ".join(f"{k} max {v['max']}" for k, v in results["saturation"].items()))
+
+    report = {"meta": {"created_at": time.time(), "recordings": a.recordings},
+              "config": {k: v for k, v in vars(a).items() if not callable(v)}, "results": results}
+    if yahoo is not None:
+        report["upstream"] = {"yahoo": yahoo.stats(), "telegram": tg.stats(), "delivery": bot._tg_sender.stats()}
+    out = a.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "replay",
+                                time.strftime("replay-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"saved {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+# ================= In-process session scheduler =================
+# While the market is open the universe is cut into interval_sec / tick_sec
+# strided slices and one slice runs per tick, so a full pass takes
+# interval_sec and the upstream load stays flat instead of bursting the whole
+# list at once. Ticks are numbered from the session open; claim(key, ttl)
+# (the shared state store) lets exactly one gunicorn worker run each tick.
+# on_close runs once per session, close_delay_sec after the (early) close.
+#
+#   sched = SessionScheduler(cal, ET, load_universe, scan_slice, interval_sec=900, tick_sec=30,
+#                            claim=store.claim, on_close=build_snapshot)
+#   sched.start()
+
+
+class SessionScheduler:
+    def __init__(self, calendar, tz, universe_fn, on_slice, interval_sec=900, tick_sec=30,
+                 start_delay_sec=0, claim=None, on_close=None, close_delay_sec=900, name="sched"):
+        self.calendar = calendar
+        self.tz = tz
+        self.universe_fn = universe_fn
+        self.on_slice = on_slice
+        self.tick_sec = max(float(tick_sec), 1.0)
+        self.interval_sec = max(float(interval_sec), self.tick_sec)
+        self.start_delay_sec = max(float(start_delay_sec), 0.0)
+        self.claim = claim
+        self.on_close = on_close
+        self.close_delay_sec = max(float(close_delay_sec), 0.0)
+        self.name = name
+        self._last_slot = None
+        self._closed_day = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats = {"ticks": 0, "claimed_elsewhere": 0, "symbols": 0, "errors": 0, "closes": 0,
+                       "last_tick": None, "last_close": None, "last_error": None}
+
+    @property
+    def n_slices(self):
+        return max(1, int(self.interval_sec // self.tick_sec))
+
+    def _now(self):
+        return datetime.now(self.tz)
+
+    def _bump(self, **kw):
+        with self._lock:
+            for k, v in kw.items():
+                if isinstance(v, int) and not isinstance(v, bool) and k in self._stats and isinstance(self._stats[k], int):
+                    self._stats[k] += v
+                else:
+                    self._stats[k] = v
+
+    def _claimed(self, key):
+        if self.claim is None:
+            return True
+        try:
+            return bool(self.claim(f"{self.name}:{key}", 86400))
+        except Exception:
+            return True  # store down: better a duplicate tick than none
+
+    def _tick(self, day, slot):
+        if not self._claimed(f"{day}:{slot}"):
+            self._bump(claimed_elsewhere=1)
+            return
+        syms = list(self.universe_fn() or [])[slot % self.n_slices::self.n_slices]
+        if not syms:
+            return
+        t0 = time.perf_counter()
+        try:
+            out = self.on_slice(syms)
+            self._bump(ticks=1, symbols=len(syms))
+        except Exception as e:
+            out = None
+            self._bump(errors=1, last_error=f"{type(e).__name__}: {e}")
+        self._bump(last_tick={"day": day, "slot": slot, "slice": slot % self.n_slices, "symbols": len(syms),
+                              "sec": round(time.perf_counter() - t0, 3), "at": time.time(), "result": out})
+
+    def _close(self, day):
+        if not self._claimed(f"{day}:close"):
+            return
+        try:
+            out = self.on_close()
+            self._bump(closes=1, last_close={"day": day, "at": time.time(), "result": out})
+        except Exception as e:
+            self._bump(errors=1, last_error=f"{type(e).__name__}: {e}")
+
+    def step(self, now=None):
+        # runs whatever is due at `now`; returns seconds until the next check
+        now = now or self._now()
+        day = now.date().isoformat()
+        bounds = self.calendar.session_bounds(now)
+        if bounds is not None:
+            open_, close = bounds
+            start = open_ + timedelta(seconds=self.start_delay_sec)
+            if start <= now < close:
+                slot = int((now - start).total_seconds() // self.tick_sec)
+                if self._last_slot != (day, slot):
+                    self._last_slot = (day, slot)
+                    self._tick(day, slot)
+                nxt = start + timedelta(seconds=(slot + 1) * self.tick_sec)
+                return max(0.5, (nxt - self._now()).total_seconds())
+            if now < start:
+                return max(0.5, min((start - now).total_seconds(), 600))
+            if self.on_close is not None and self._closed_day != day:
+                due = close + timedelta(seconds=self.close_delay_sec)
+                if now < due:
+                    return max(0.5, min((due - now).total_seconds(), 600))
+                self._closed_day = day
+                self._close(day)
+        nxt = self.calendar.next_open(now)
+        return 600.0 if nxt is None else max(0.5, min((nxt - now).total_seconds(), 600))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                delay = self.step()
+            except Exception as e:
+                self._bump(errors=1, last_error=f"{type(e).__name__}: {e}")
+                delay = 60
+            self._stop.wait(delay)
+
+    def start(self):
+        # per process: a thread started before a fork does not exist in the child
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return self
+        self._stop = threading.Event()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+        now = self._now()
+        out.update({
+            "running": self._thread is not None and self._pid == os.getpid() and self._thread.is_alive(),
+            "market_open": self.calendar.is_open(now),
+            "next_open": (self.calendar.next_open(now).isoformat() if self.calendar.next_open(now) else None),
+            "interval_sec": self.interval_sec, "tick_sec": self.tick_sec, "slices": self.n_slices,
+        })
+        return out
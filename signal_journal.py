@@ -0,0 +1,242 @@
+import os
+import time
+import sqlite3
+import threading
+
+import numpy as np
+
+# ================= Signal journal (SQLite) + incremental outcome evaluator =================
+# Every idea the bot hands out (TradingView alerts, scans, /analyze) is one
+# row. evaluate() only touches still-open rows (partial index) and only the
+# bars that arrived since that row was last looked at (last_bar_ts), marking
+# TP1 / TP2 / SL hits or expiry; stats() aggregates hit rates straight from
+# the table, grouped by symbol, side, score, tf, decision or source.
+#
+#   j = SignalJournal("data/signals.db")
+#   j.record([{"source": "tv", "symbol": "AAPL", "tf": "1d", "interval": "1d", "side": "LONG",
+#              "decision": "ENTER", "score": 6, "entry": 190.0, "sl": 185.0, "tp1": 195.0, "tp2": 200.0,
+#              "qty": 20, "expires_ts": ..., "eval_from_ts": ...}])
+#   j.evaluate(lambda sym, interval: bars, now=time.time(), interval_sec={"1d": 86400, "5m": 300})
+#   j.stats(by="score", since_ts=time.time() - 90 * 86400)
+#
+# Outcomes follow backtest.py (_walk / simulate_row) so the journal and the
+# backtest score the same rules the same way: two legs, stop to breakeven
+# after TP1 (result "tp1_be"), a bar touching stop and target is the stop.
+# Only complete bars are evaluated (ts + interval <= now).
+
+GROUPS = ("symbol", "side", "score", "tf", "decision", "source")
+STALE_EXPIRE_SEC = 7 * 86400  # no bars at all this long after expiry: expire without a close
+
+_COLUMNS = ("ts", "day", "source", "symbol", "tf", "interval", "side", "decision", "score", "entry", "sl", "tp1",
+            "tp2", "qty", "expires_ts", "eval_from_ts", "dedupe_key")
+
+
+class SignalJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {"recorded": 0, "duplicates": 0, "evaluations": 0, "evaluated": 0, "closed": 0, "errors": 0}
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS signals (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL, day TEXT NOT NULL, source TEXT NOT NULL, symbol TEXT NOT NULL,
+                tf TEXT NOT NULL, interval TEXT NOT NULL, side TEXT NOT NULL, decision TEXT, score INTEGER,
+                entry REAL NOT NULL, sl REAL NOT NULL, tp1 REAL NOT NULL, tp2 REAL NOT NULL, qty INTEGER,
+                expires_ts REAL NOT NULL, eval_from_ts REAL NOT NULL, dedupe_key TEXT UNIQUE,
+                status TEXT NOT NULL DEFAULT 'open', result TEXT,
+                tp1_hit INTEGER NOT NULL DEFAULT 0, tp2_hit INTEGER NOT NULL DEFAULT 0, sl_hit INTEGER NOT NULL DEFAULT 0,
+                r REAL, last_bar_ts REAL, closed_ts REAL
+            );
+            CREATE INDEX IF NOT EXISTS signals_open ON signals (symbol, interval) WHERE status = 'open';
+            CREATE INDEX IF NOT EXISTS signals_ts ON signals (ts);
+            CREATE INDEX IF NOT EXISTS signals_symbol ON signals (symbol, ts);
+            """
+        )
+
+    def _conn(self):
+        # one connection per thread and per process (sqlite handles don't survive fork)
+        c = getattr(self._local, "conn", None)
+        if c is None or getattr(self._local, "pid", None) != os.getpid():
+            c = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA busy_timeout=10000")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def _count(self, **kw):
+        with self._lock:
+            for k, v in kw.items():
+                self.counters[k] += v
+
+    def record(self, signals) -> int:
+        # rows with an existing dedupe_key are skipped; returns rows written
+        rows = [tuple(s.get(k) for k in _COLUMNS) for s in signals]
+        if not rows:
+            return 0
+        c = self._conn()
+        before = c.total_changes
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.executemany(f"INSERT OR IGNORE INTO signals ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows)
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        n = c.total_changes - before
+        self._count(recorded=n, duplicates=len(rows) - n)
+        return n
+
+    def open_symbols(self):
+        # (symbol, interval) pairs with open signals, for one batched refresh before evaluate()
+        return self._conn().execute("SELECT DISTINCT symbol, interval FROM signals WHERE status = 'open'").fetchall()
+
+    def open_count(self) -> int:
+        return int(self._conn().execute("SELECT COUNT(*) FROM signals WHERE status = 'open'").fetchone()[0])
+
+    # ---------- outcome evaluation ----------
+    @staticmethod
+    def _r(sig, tp1_hit, px):
+        # two equal legs, as backtest.simulate_row: the first exits at TP1 once
+        # hit, the second at px (or both at px when TP1 never traded)
+        risk = abs(sig["entry"] - sig["sl"])
+        if not risk:
+            return None
+        sign = 1.0 if sig["side"] == "LONG" else -1.0
+        leg1 = sig["tp1"] if tp1_hit else px
+        return round(sign * ((leg1 - sig["entry"]) + (px - sig["entry"])) / 2.0 / risk, 4)
+
+    @classmethod
+    def _outcome(cls, sig, ts, high, low, close):
+        # sig: dict row; bars: the new complete bars before expiry, oldest first.
+        # Same walk as backtest._walk: stop or TP1 first (a bar touching both is
+        # the stop); after TP1 the stop moves to entry, and TP2 counts only on a
+        # later bar than TP1 and strictly before the breakeven stop.
+        long_ = sig["side"] == "LONG"
+        n = len(ts)
+
+        def first(mask):
+            return int(np.argmax(mask)) if mask.any() else len(mask)
+
+        out = {"tp1_hit": int(sig["tp1_hit"] or 0)}
+        start = 0
+        if not out["tp1_hit"]:
+            i_sl = first((low <= sig["sl"]) if long_ else (high >= sig["sl"]))
+            i_tp1 = first((high >= sig["tp1"]) if long_ else (low <= sig["tp1"]))
+            if i_sl < n and i_sl <= i_tp1:
+                out.update(status="closed", result="sl", sl_hit=1, closed_ts=float(ts[i_sl]), r=-1.0)
+            elif i_tp1 < n:
+                out["tp1_hit"], start = 1, i_tp1 + 1
+            else:
+                start = n
+        if out.get("status") is None and out["tp1_hit"] and start < n:
+            h, l = high[start:], low[start:]
+            i_be = first((l <= sig["entry"]) if long_ else (h >= sig["entry"]))
+            i_tp2 = first((h >= sig["tp2"]) if long_ else (l <= sig["tp2"]))
+            if i_tp2 < len(h) and i_tp2 < i_be:
+                out.update(status="closed", result="tp2", tp2_hit=1, closed_ts=float(ts[start + i_tp2]),
+                           r=cls._r(sig, True, sig["tp2"]))
+            elif i_be < len(h):
+                out.update(status="closed", result="tp1_be", closed_ts=float(ts[start + i_be]),
+                           r=cls._r(sig, True, sig["entry"]))
+        if n:
+            out["last_bar_ts"] = float(ts[-1])
+            out["last_close"] = float(close[-1])
+        return out
+
+    def evaluate(self, bars_fn, now=None, interval_sec=None, limit=None):
+        # bars_fn(symbol, interval) -> bars dict/Bars sorted by ts (or None);
+        # interval_sec: interval -> bar length, to leave forming bars out
+        now = time.time() if now is None else float(now)
+        interval_sec = interval_sec or {}
+        t0 = time.perf_counter()
+        c = self._conn()
+        c.row_factory = sqlite3.Row
+        try:
+            rows = c.execute("SELECT id, symbol, interval, side, entry, sl, tp1, tp2, expires_ts, eval_from_ts, "
+                             "last_bar_ts, tp1_hit FROM signals WHERE status = 'open' ORDER BY symbol, interval"
+                             + (f" LIMIT {int(limit)}" if limit else "")).fetchall()
+        finally:
+            c.row_factory = None
+        groups = {}
+        for r in rows:
+            groups.setdefault((r["symbol"], r["interval"]), []).append(dict(r))
+
+        updates, closed, errors = [], 0, 0
+        for (symbol, interval), sigs in groups.items():
+            try:
+                bars = bars_fn(symbol, interval)
+            except Exception:
+                bars, errors = None, errors + 1
+            if bars is not None and len(bars["ts"]):
+                ts = np.asarray(bars["ts"], dtype=np.float64)
+                complete = ts + float(interval_sec.get(interval, 0)) <= now
+                ts = ts[complete]
+                high, low, close = (np.asarray(bars[k], dtype=np.float64)[complete] for k in ("high", "low", "close"))
+            else:
+                ts = high = low = close = np.empty(0)
+            for sig in sigs:
+                start = max(sig["eval_from_ts"], (sig["last_bar_ts"] or -np.inf) + 1e-6)
+                i, j = np.searchsorted(ts, start, "left"), np.searchsorted(ts, sig["expires_ts"], "left")
+                out = self._outcome(sig, ts[i:j], high[i:j], low[i:j], close[i:j])
+                past_expiry = j < len(ts) or now >= sig["expires_ts"] + STALE_EXPIRE_SEC
+                if out.get("status") is None and past_expiry:
+                    last = out.get("last_close", float(close[j - 1]) if j > i else None)
+                    out.update(status="closed", result="expired", closed_ts=float(sig["expires_ts"]),
+                               r=None if last is None else self._r(sig, out["tp1_hit"], last))
+                if out.get("status") == "closed":
+                    closed += 1
+                out.pop("last_close", None)
+                if len(out) > 1 or out["tp1_hit"] != sig["tp1_hit"]:
+                    updates.append((out, sig["id"]))
+
+        if updates:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                for out, sid in updates:
+                    c.execute(f"UPDATE signals SET {', '.join(f'{k} = ?' for k in out)} WHERE id = ?", (*out.values(), sid))
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+        self._count(evaluations=1, evaluated=len(rows), closed=closed, errors=errors)
+        return {"ok": True, "open_before": len(rows), "symbols": len(groups), "updated": len(updates), "closed": closed,
+                "errors": errors, "open_after": self.open_count(), "sec": round(time.perf_counter() - t0, 3)}
+
+    # ---------- aggregation ----------
+    def stats(self, by="symbol", since_ts=None, source=None, limit=50, min_closed=0):
+        if by not in GROUPS:
+            raise ValueError(f"by must be one of {', '.join(GROUPS)}")
+        where, args = ["1 = 1"], []
+        if since_ts is not None:
+            where.append("ts >= ?")
+            args.append(float(since_ts))
+        if source:
+            where.append("source = ?")
+            args.append(source)
+        t0 = time.perf_counter()
+        q = (f"SELECT {by}, COUNT(*), SUM(status = 'open'), SUM(status = 'closed'), "
+             "SUM(tp1_hit * (status = 'closed')), SUM(tp2_hit), SUM(sl_hit), SUM(result = 'expired'), "
+             "AVG(CASE WHEN status = 'closed' THEN r END) "
+             f"FROM signals WHERE {' AND '.join(where)} GROUP BY {by} "
+             "HAVING SUM(status = 'closed') >= ? ORDER BY COUNT(*) DESC LIMIT ?")
+        rows = self._conn().execute(q, (*args, int(min_closed), int(limit))).fetchall()
+        out = []
+        for key, n, n_open, n_closed, tp1, tp2, sl, expired, avg_r in rows:
+            rate = (lambda x: round(x / n_closed, 4)) if n_closed else (lambda x: None)
+            out.append({by: key, "signals": n, "open": n_open, "closed": n_closed,
+                        "tp1_rate": rate(tp1), "tp2_rate": rate(tp2), "sl_rate": rate(sl), "expired_rate": rate(expired),
+                        "avg_r": None if avg_r is None else round(avg_r, 4)})
+        total = self._conn().execute(f"SELECT COUNT(*), SUM(status = 'open') FROM signals WHERE {' AND '.join(where)}",
+                                     args).fetchone()
+        return {"ok": True, "by": by, "signals": int(total[0] or 0), "open": int(total[1] or 0), "groups": out,
+                "query_ms": round((time.perf_counter() - t0) * 1000, 2)}
+
+    def stats_counters(self):
+        with self._lock:
+            return dict(self.counters)
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import math
+
+import numpy as np
+
+from bar_store import cols_len, slice_cols
+from streaming import SymbolState
+
+# ================= Precomputed daily analysis snapshot =================
+# Built after the close from the bar store: one streaming.SymbolState per
+# ticker (MA20/MA50, RSI, ATR, 20-day closes window), so a webhook only has
+# to preview() the live alert price against it -- no download, no history
+# scan. The file carries a format number, the smoothing it was built with
+# and a build id; workers reload it when its mtime changes.
+#
+#   snap = build_snapshot(symbols, lambda s: store.read(s, "1d"), smoothing="simple")
+#   save_snapshot("data/analysis_snapshot.json", snap)
+#   view = load_snapshot(path).analyze("AAPL", 187.25)
+
+SNAPSHOT_FORMAT = 1
+
+
+class AnalysisSnapshot:
+    def __init__(self, states: dict, meta: dict):
+        self.states = states
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, symbol):
+        return symbol in self.states
+
+    def age_sec(self, now=None):
+        now = time.time() if now is None else now
+        return now - float(self.meta.get("created_at") or 0)
+
+    def analyze(self, symbol: str, price: float | None = None):
+        # indicator values as analyze_symbol computes them, with `price` as
+        # the latest close (None = the last close in the snapshot)
+        st = self.states.get(symbol)
+        if st is None:
+            return None
+        v = st.values() if price is None else st.preview(price)
+        if any(isinstance(x, float) and math.isnan(x) for x in (v["ma20"], v["ma50"], v["rsi"], v["atr"])):
+            return None
+        return v
+
+
+def build_snapshot(symbols, read_cols, smoothing="simple", cutoff_ts=None, min_bars=60):
+    # read_cols(symbol) -> bar_store columns or None; bars at/after cutoff_ts
+    # (today's unfinished session) are left out
+    t0 = time.time()
+    states, skipped = {}, []
+    last_ts = None
+    for sym in symbols:
+        try:
+            cols = read_cols(sym)
+        except Exception:
+            cols = None
+        if cols is not None and cutoff_ts is not None:
+            n = int(np.searchsorted(cols["ts"], cutoff_ts, side="left"))
+            cols = slice_cols(cols, 0, n)
+        if cols_len(cols) < min_bars:
+            skipped.append(sym)
+            continue
+        states[sym] = SymbolState(smoothing).seed(cols)
+        t = float(cols["ts"][-1])
+        last_ts = t if last_ts is None else max(last_ts, t)
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "build_id": time.strftime("%Y%m%d-%H%M%S", time.gmtime(t0)),
+        "created_at": t0,
+        "build_sec": round(time.time() - t0, 3),
+        "smoothing": smoothing,
+        "asof_ts": last_ts,
+        "symbols": len(states),
+        "skipped": len(skipped),
+    }
+    return AnalysisSnapshot(states, meta)
+
+def save_snapshot(path: str, snap: AnalysisSnapshot):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"meta": snap.meta, "states": {s: st.to_dict() for s, st in snap.states.items()}},
+                  f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def load_snapshot(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    meta = data.get("meta") or {}
+    if meta.get("format") != SNAPSHOT_FORMAT:
+        return None
+    states = {}
+    for sym, d in (data.get("states") or {}).items():
+        try:
+            states[sym] = SymbolState.from_dict(d)
+        except Exception:
+            continue
+    return AnalysisSnapshot(states, meta)
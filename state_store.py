@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# ================= Shared state store =================
+# Cooldowns, day-scoped "already sent" sets and versioned settings, shared by
+# every gunicorn worker through SQLite (WAL). MemoryStateStore has the same
+# API for single-process use and tests.
+#
+#   claim(key, interval_sec)  atomic check-and-set: True at most once per interval
+#   sent_add / sent_contains / sent_symbols  per day_key
+#   get_settings() -> (version, dict | None); settings_version() is one tiny read
+#   purge_expired()  drops stale claims and old days (also runs periodically)
+
+SENT_KEEP_SEC = 3 * 86400
+CLAIM_KEEP_SEC = 86400  # minimum; raised to the longest interval claim() has been asked for
+
+
+class MemoryStateStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._claims = {}
+        self._sent = {}  # day -> {symbol: ts}
+        self._settings = None
+        self._version = 0
+        self.claim_keep_sec = CLAIM_KEEP_SEC
+
+    def claim(self, key: str, interval_sec: float, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            self.claim_keep_sec = max(self.claim_keep_sec, float(interval_sec))
+            last = self._claims.get(key)
+            if last is not None and now - last < interval_sec:
+                return False
+            self._claims[key] = now
+            return True
+
+    def release(self, key: str):
+        with self._lock:
+            self._claims.pop(key, None)
+
+    def sent_add(self, day_key: str, symbols):
+        now = time.time()
+        with self._lock:
+            d = self._sent.setdefault(day_key, {})
+            for s in symbols:
+                d.setdefault(s, now)
+
+    def sent_contains(self, day_key: str, symbol: str) -> bool:
+        with self._lock:
+            return symbol in self._sent.get(day_key, {})
+
+    def sent_symbols(self, day_key: str) -> set:
+        with self._lock:
+            return set(self._sent.get(day_key, {}))
+
+    def settings_version(self) -> int:
+        return self._version
+
+    def get_settings(self):
+        with self._lock:
+            return self._version, (dict(self._settings) if self._settings is not None else None)
+
+    def set_settings(self, data: dict) -> int:
+        with self._lock:
+            self._settings = dict(data)
+            self._version += 1
+            return self._version
+
+    def purge_expired(self, now: float | None = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._claims = {k: v for k, v in self._claims.items() if now - v < self.claim_keep_sec}
+            self._sent = {d: m for d, m in self._sent.items() if m and now - min(m.values()) < SENT_KEEP_SEC}
+
+
+class SQLiteStateStore:
+    def __init__(self, path: str, purge_every_sec: float = 600):
+        self.path = path
+        self.purge_every_sec = purge_every_sec
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self.claim_keep_sec = CLAIM_KEEP_SEC
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, ts REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS sent (
+                    day_key TEXT NOT NULL, symbol TEXT NOT NULL, ts REAL NOT NULL,
+                    PRIMARY KEY (day_key, symbol)
+                );
+                CREATE INDEX IF NOT EXISTS sent_ts ON sent (ts);
+                CREATE TABLE IF NOT EXISTS settings (
+                    id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL, data TEXT NOT NULL
+                );
+                """
+            )
+
+    def _conn(self):
+        # one connection per thread and per process (sqlite handles don't survive fork)
+        c = getattr(self._local, "conn", None)
+        if c is None or getattr(self._local, "pid", None) != os.getpid():
+            c = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA busy_timeout=10000")
+            self._local.conn, self._local.pid = c, os.getpid()
+        return c
+
+    def _maybe_purge(self, now):
+        if now - self._last_purge >= self.purge_every_sec:
+            self._last_purge = now
+            try:
+                self.purge_expired(now)
+            except Exception:
+                pass
+
+    def claim(self, key: str, interval_sec: float, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        # a cooldown longer than the keep window must not be purged early
+        self.claim_keep_sec = max(self.claim_keep_sec, float(interval_sec))
+        c = self._conn()
+        cur = c.execute(
+            "INSERT INTO claims (key, ts) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET ts = excluded.ts WHERE claims.ts <= ?",
+            (key, now, now - float(interval_sec)),
+        )
+        self._maybe_purge(now)
+        return cur.rowcount == 1
+
+    def release(self, key: str):
+        self._conn().execute("DELETE FROM claims WHERE key = ?", (key,))
+
+    def sent_add(self, day_key: str, symbols):
+        now = time.time()
+        c = self._conn()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            c.executemany(
+                "INSERT OR IGNORE INTO sent (day_key, symbol, ts) VALUES (?, ?, ?)",
+                [(day_key, s, now) for s in symbols],
+            )
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+
+    def sent_contains(self, day_key: str, symbol: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM sent WHERE day_key = ? AND symbol = ?", (day_key, symbol)
+        ).fetchone()
+        return row is not None
+
+    def sent_symbols(self, day_key: str) -> set:
+        rows = self._conn().execute("SELECT symbol FROM sent WHERE day_key = ?", (day_key,)).fetchall()
+        return {r[0] for r in rows}
+
+    def settings_version(self) -> int:
+        row = self._conn().execute("SELECT version FROM settings WHERE id = 1").fetchone()
+        return int(row[0]) if row else 0
+
+    def get_settings(self):
+        row = self._conn().execute("SELECT version, data FROM settings WHERE id = 1").fetchone()
+        if not row:
+            return 0, None
+        try:
+            return int(row[0]), json.loads(row[1])
+        except Exception:
+            return int(row[0]), None
+
+    def set_settings(self, data: dict) -> int:
+        c = self._conn()
+        c.execute(
+            "INSERT INTO settings (id, version, data) VALUES (1, 1, ?) "
+            "ON CONFLICT(id) DO UPDATE SET version = settings.version + 1, data = excluded.data",
+            (json.dumps(data, ensure_ascii=False),),
+        )
+        return self.settings_version()
+
+    def purge_expired(self, now: float | None = None):
+        now = time.time() if now is None else now
+        c = self._conn()
+        c.execute("DELETE FROM claims WHERE ts < ?", (now - self.claim_keep_sec,))
+        c.execute("DELETE FROM sent WHERE ts < ?", (now - SENT_KEEP_SEC,))
+
+
+def open_state_store(spec: str):
+    # "memory" | "sqlite:///path/to/state.db" | "/path/to/state.db"
+    spec = (spec or "").strip()
+    if spec.lower() in ("memory", "mem", ":memory:"):
+        return MemoryStateStore()
+    if spec.startswith("sqlite:///"):
+        spec = spec[len("sqlite:///"):]
+    return SQLiteStateStore(spec)
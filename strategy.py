@@ -0,0 +1,167 @@
+# ================= Swing strategy (shared by /analyze, /scan, backtests) =================
+# Pure functions only: no settings lookups. Callers pass capital, risk, side
+# and the parameter set explicitly so the same rules run live and offline.
+
+import os
+import json
+
+import numpy as np
+
+# Tunable rule parameters (optimize.py searches over these)
+DEFAULT_PARAMS = {
+    # Swing ATR multipliers
+    "sl_mult": 1.5,
+    "tp1_mult": 1.5,
+    "tp2_mult": 3.0,
+    # RSI bands that add +2 to the score
+    "long_rsi_lo": 50.0,
+    "long_rsi_hi": 72.0,
+    "short_rsi_lo": 28.0,
+    "short_rsi_hi": 50.0,
+    # score thresholds
+    "enter_score": 6,
+    "wait_score": 4,
+}
+
+def make_params(overrides=None):
+    p = DEFAULT_PARAMS.copy()
+    for k, v in (overrides or {}).items():
+        if k in p:
+            try:
+                p[k] = type(DEFAULT_PARAMS[k])(v)
+            except Exception:
+                pass
+    return p
+
+def load_params(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return DEFAULT_PARAMS.copy()
+    if isinstance(data, dict) and isinstance(data.get("params"), dict):
+        data = data["params"]
+    return make_params(data if isinstance(data, dict) else None)
+
+def save_params(path: str, params: dict, meta: dict | None = None):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"params": make_params(params), "meta": meta or {}}, f, indent=2)
+    os.replace(tmp, path)
+
+def compute_position_size(capital, risk_pct, entry, sl):
+    risk_dollars = float(capital) * (float(risk_pct) / 100.0)
+    per_share = abs(float(entry) - float(sl))
+    if per_share <= 0:
+        return 0
+    return max(int(risk_dollars / per_share), 0)
+
+def trend_of(entry, ma20, ma50):
+    if entry > ma50 and ma20 > ma50:
+        return "up"
+    if entry < ma50 and ma20 < ma50:
+        return "down"
+    return "neutral"
+
+def decision_of(score, params=None):
+    p = params or DEFAULT_PARAMS
+    return "ENTER" if score >= p["enter_score"] else ("WAIT" if score >= p["wait_score"] else "SKIP")
+
+def long_idea(entry, trend, rsi, atr, breakout_up, capital, risk_pct, params=None):
+    p = params or DEFAULT_PARAMS
+    sl = entry - p["sl_mult"] * atr
+    tp1 = entry + p["tp1_mult"] * atr
+    tp2 = entry + p["tp2_mult"] * atr
+    qty = compute_position_size(capital, risk_pct, entry, sl)
+
+    score = 0
+    reasons = []
+    if trend == "up":
+        score += 3; reasons.append("Trend up")
+    if breakout_up:
+        score += 3; reasons.append("Breakout 20D")
+    if p["long_rsi_lo"] <= rsi <= p["long_rsi_hi"]:
+        score += 2; reasons.append(f"RSI {p['long_rsi_lo']:g}-{p['long_rsi_hi']:g}")
+    if rsi > p["long_rsi_hi"]:
+        reasons.append("RSI high (pullback risk)")
+    if trend == "down":
+        reasons.append("Trend down (weak long)")
+
+    return {
+        "side": "LONG",
+        "decision": decision_of(score, p),
+        "score": score,
+        "entry": entry,
+        "sl": sl,
+        "tp1": tp1,
+        "tp2": tp2,
+        "qty": qty,
+        "reasons": reasons
+    }
+
+def short_idea(entry, trend, rsi, atr, breakout_down, capital, risk_pct, params=None):
+    p = params or DEFAULT_PARAMS
+    sl = entry + p["sl_mult"] * atr
+    tp1 = entry - p["tp1_mult"] * atr
+    tp2 = entry - p["tp2_mult"] * atr
+    qty = compute_position_size(capital, risk_pct, entry, sl)
+
+    score = 0
+    reasons = []
+    if trend == "down":
+        score += 3; reasons.append("Trend down")
+    if breakout_down:
+        score += 3; reasons.append("Breakdown 20D")
+    if p["short_rsi_lo"] <= rsi <= p["short_rsi_hi"]:
+        score += 2; reasons.append(f"RSI {p['short_rsi_lo']:g}-{p['short_rsi_hi']:g}")
+    if rsi < p["short_rsi_lo"]:
+        reasons.append("RSI very low (bounce risk)")
+    if trend == "up":
+        reasons.append("Trend up (weak short)")
+
+    return {
+        "side": "SHORT",
+        "decision": decision_of(score, p),
+        "score": score,
+        "entry": entry,
+        "sl": sl,
+        "tp1": tp1,
+        "tp2": tp2,
+        "qty": qty,
+        "reasons": reasons
+    }
+
+def build_ideas(entry, trend, rsi, atr, breakout_up, breakout_down, capital, risk_pct, side="both", params=None):
+    side = str(side).lower()
+    ideas = []
+    if side in ("both", "long"):
+        ideas.append(long_idea(entry, trend, rsi, atr, breakout_up, capital, risk_pct, params))
+    if side in ("both", "short"):
+        ideas.append(short_idea(entry, trend, rsi, atr, breakout_down, capital, risk_pct, params))
+    return ideas
+
+def passes_filter(decision, filter_mode):
+    if filter_mode == "enter_wait":
+        return decision in ("ENTER", "WAIT")
+    return decision == "ENTER"
+
+# ================= Array versions (backtests / sweeps) =================
+# Same rules as long_idea/short_idea, evaluated for every bar at once.
+# Inputs are same-shaped arrays; trend is the "up"/"down"/"neutral" labels.
+
+def score_arrays(trend, breakout_up, breakout_down, rsi, params=None):
+    p = params or DEFAULT_PARAMS
+    trend = np.asarray(trend)
+    with np.errstate(invalid="ignore"):
+        long_rsi = (rsi >= p["long_rsi_lo"]) & (rsi <= p["long_rsi_hi"])
+        short_rsi = (rsi >= p["short_rsi_lo"]) & (rsi <= p["short_rsi_hi"])
+        long_score = 3 * (trend == "up") + 3 * np.asarray(breakout_up, dtype=bool) + 2 * long_rsi
+        short_score = 3 * (trend == "down") + 3 * np.asarray(breakout_down, dtype=bool) + 2 * short_rsi
+    return long_score.astype(np.int8), short_score.astype(np.int8)
+
+def decision_arrays(score, params=None):
+    p = params or DEFAULT_PARAMS
+    return np.where(score >= p["enter_score"], "ENTER", np.where(score >= p["wait_score"], "WAIT", "SKIP"))
@@ -0,0 +1,337 @@
+import math
+from collections import deque
+
+# ================= Streaming (incremental) indicators =================
+# O(1) per bar. update() commits a closed bar, preview() answers "what would
+# the value be if the current bar closed here" without touching the state,
+# which is what intraday ticks need. to_dict()/from_dict() are JSON-safe.
+
+NAN = float("nan")
+
+def _num(x):
+    return None if x is None or (isinstance(x, float) and math.isnan(x)) else x
+
+def _unnum(x):
+    return NAN if x is None else float(x)
+
+
+class RollingSMA:
+    kind = "sma"
+
+    def __init__(self, n: int):
+        self.n = int(n)
+        self.buf = deque()
+        self.total = 0.0
+        self._since_resum = 0
+
+    def _push(self, x):
+        self.buf.append(x)
+        self.total += x
+        if len(self.buf) > self.n:
+            self.total -= self.buf.popleft()
+        self._since_resum += 1
+        if self._since_resum >= self.n * 8:  # bound float drift of the running sum
+            self.total = math.fsum(self.buf)
+            self._since_resum = 0
+
+    def update(self, x: float):
+        self._push(float(x))
+        return self.value
+
+    @property
+    def value(self):
+        return self.total / self.n if len(self.buf) >= self.n else NAN
+
+    def preview(self, x: float):
+        if len(self.buf) + 1 < self.n:
+            return NAN
+        drop = self.buf[0] if len(self.buf) >= self.n else 0.0
+        return (self.total - drop + float(x)) / self.n
+
+    def to_dict(self):
+        return {"kind": self.kind, "n": self.n, "buf": list(self.buf)}
+
+    @classmethod
+    def from_dict(cls, d):
+        o = cls(d["n"])
+        for x in d.get("buf", []):
+            o._push(float(x))
+        return o
+
+
+class WilderMean:
+    # RMA seeded with the plain mean of the first n inputs
+    kind = "rma"
+
+    def __init__(self, n: int):
+        self.n = int(n)
+        self.count = 0
+        self.seed_sum = 0.0
+        self.avg = NAN
+
+    def _next(self, x):
+        if self.count >= self.n:
+            return (self.avg * (self.n - 1) + x) / self.n
+        if self.count + 1 == self.n:
+            return (self.seed_sum + x) / self.n
+        return NAN
+
+    def update(self, x: float):
+        x = float(x)
+        self.avg = self._next(x)
+        if self.count < self.n:
+            self.seed_sum += x
+        self.count += 1
+        return self.avg
+
+    @property
+    def value(self):
+        return self.avg
+
+    def preview(self, x: float):
+        return self._next(float(x))
+
+    def to_dict(self):
+        return {"kind": self.kind, "n": self.n, "count": self.count, "seed_sum": self.seed_sum, "avg": _num(self.avg)}
+
+    @classmethod
+    def from_dict(cls, d):
+        o = cls(d["n"])
+        o.count = int(d.get("count", 0))
+        o.seed_sum = float(d.get("seed_sum", 0.0))
+        o.avg = _unnum(d.get("avg"))
+        return o
+
+
+def _smoother(n, smoothing):
+    return WilderMean(n) if smoothing == "wilder" else RollingSMA(n)
+
+def _smoother_from_dict(d):
+    return WilderMean.from_dict(d) if d.get("kind") == "rma" else RollingSMA.from_dict(d)
+
+
+class RollingExtreme:
+    # Monotonic deque over the last n values; value is the max (or min).
+    def __init__(self, n: int, mode: str = "max"):
+        self.n = int(n)
+        self.mode = mode
+        self.i = 0
+        self.dq = deque()  # (index, value), values monotonic from the front
+
+    def _beats(self, a, b):
+        return a >= b if self.mode == "max" else a <= b
+
+    def update(self, x: float):
+        x = float(x)
+        while self.dq and self._beats(x, self.dq[-1][1]):
+            self.dq.pop()
+        self.dq.append((self.i, x))
+        self.i += 1
+        while self.dq[0][0] <= self.i - 1 - self.n:
+            self.dq.popleft()
+        return self.value
+
+    @property
+    def value(self):
+        return self.dq[0][1] if self.i >= self.n and self.dq else NAN
+
+    def preview(self, x: float):
+        # window after pushing x: oldest committed value may fall out
+        if self.i + 1 < self.n:
+            return NAN
+        x = float(x)
+        cur = NAN
+        for j, v in self.dq:  # at most two steps: front may be expiring
+            if j > self.i - self.n:
+                cur = v
+                break
+        if math.isnan(cur):
+            return x
+        return max(cur, x) if self.mode == "max" else min(cur, x)
+
+    def to_dict(self):
+        return {"kind": "extreme", "n": self.n, "mode": self.mode, "i": self.i, "dq": [list(p) for p in self.dq]}
+
+    @classmethod
+    def from_dict(cls, d):
+        o = cls(d["n"], d.get("mode", "max"))
+        o.i = int(d.get("i", 0))
+        o.dq = deque((int(j), float(v)) for j, v in d.get("dq", []))
+        return o
+
+
+class StreamingRSI:
+    def __init__(self, n: int = 14, smoothing: str = "simple"):
+        self.n = int(n)
+        self.smoothing = smoothing
+        self.prev = NAN
+        self.gain = _smoother(n, smoothing)
+        self.loss = _smoother(n, smoothing)
+
+    @staticmethod
+    def _rsi(g, l):
+        if math.isnan(g) or math.isnan(l):
+            return NAN
+        if l == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + g / l)
+
+    def update(self, close: float):
+        close = float(close)
+        if not math.isnan(self.prev):
+            d = close - self.prev
+            self.gain.update(max(d, 0.0))
+            self.loss.update(max(-d, 0.0))
+        self.prev = close
+        return self.value
+
+    @property
+    def value(self):
+        return self._rsi(self.gain.value, self.loss.value)
+
+    def preview(self, close: float):
+        if math.isnan(self.prev):
+            return NAN
+        d = float(close) - self.prev
+        return self._rsi(self.gain.preview(max(d, 0.0)), self.loss.preview(max(-d, 0.0)))
+
+    def to_dict(self):
+        return {"n": self.n, "smoothing": self.smoothing, "prev": _num(self.prev),
+                "gain": self.gain.to_dict(), "loss": self.loss.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        o = cls(d["n"], d.get("smoothing", "simple"))
+        o.prev = _unnum(d.get("prev"))
+        o.gain = _smoother_from_dict(d["gain"])
+        o.loss = _smoother_from_dict(d["loss"])
+        return o
+
+
+class StreamingATR:
+    def __init__(self, n: int = 14, smoothing: str = "simple"):
+        self.n = int(n)
+        self.smoothing = smoothing
+        self.prev = NAN
+        self.tr = _smoother(n, smoothing)
+
+    def _true_range(self, high, low):
+        return max(high - low, abs(high - self.prev), abs(low - self.prev))
+
+    def update(self, high: float, low: float, close: float):
+        if not math.isnan(self.prev):
+            self.tr.update(self._true_range(float(high), float(low)))
+        self.prev = float(close)
+        return self.value
+
+    @property
+    def value(self):
+        return self.tr.value
+
+    def preview(self, high: float, low: float):
+        if math.isnan(self.prev):
+            return NAN
+        return self.tr.preview(self._true_range(float(high), float(low)))
+
+    def to_dict(self):
+        return {"n": self.n, "smoothing": self.smoothing, "prev": _num(self.prev), "tr": self.tr.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        o = cls(d["n"], d.get("smoothing", "simple"))
+        o.prev = _unnum(d.get("prev"))
+        o.tr = _smoother_from_dict(d["tr"])
+        return o
+
+
+# ================= Per-symbol bundle =================
+class SymbolState:
+    # Everything analyze_symbol needs, kept current bar by bar. The breakout
+    # window holds the 20 closes *before* the latest one (closes[-21:-1]).
+    def __init__(self, smoothing: str = "simple"):
+        self.smoothing = smoothing
+        self.ma20 = RollingSMA(20)
+        self.ma50 = RollingSMA(50)
+        self.rsi = StreamingRSI(14, smoothing)
+        self.atr = StreamingATR(14, smoothing)
+        self.brk_high = RollingExtreme(20, "max")
+        self.brk_low = RollingExtreme(20, "min")
+        self.last_close = NAN
+        self.last_ts = None
+        self.bars = 0
+
+    def on_bar(self, high: float, low: float, close: float, ts: float | None = None):
+        if ts is not None and self.last_ts is not None and ts <= self.last_ts:
+            return False  # already applied
+        if not math.isnan(self.last_close):
+            self.brk_high.update(self.last_close)
+            self.brk_low.update(self.last_close)
+        self.ma20.update(close)
+        self.ma50.update(close)
+        self.rsi.update(close)
+        self.atr.update(high, low, close)
+        self.last_close = float(close)
+        self.last_ts = ts
+        self.bars += 1
+        return True
+
+    def seed(self, cols):
+        # cols: bar_store layout (ts/high/low/close arrays)
+        for t, h, l, c in zip(cols["ts"], cols["high"], cols["low"], cols["close"]):
+            self.on_bar(float(h), float(l), float(c), float(t))
+        return self
+
+    def values(self):
+        return {
+            "entry": self.last_close,
+            "ma20": self.ma20.value,
+            "ma50": self.ma50.value,
+            "rsi": self.rsi.value,
+            "atr": self.atr.value,
+            "brk_high": self.brk_high.value,
+            "brk_low": self.brk_low.value,
+        }
+
+    def preview(self, price: float, high: float | None = None, low: float | None = None):
+        # the values analyze_symbol would see if a new bar closed at `price`
+        price = float(price)
+        high = price if high is None else max(float(high), price)
+        low = price if low is None else min(float(low), price)
+        has_prev = not math.isnan(self.last_close)
+        return {
+            "entry": price,
+            "ma20": self.ma20.preview(price),
+            "ma50": self.ma50.preview(price),
+            "rsi": self.rsi.preview(price),
+            "atr": self.atr.preview(high, low),
+            "brk_high": self.brk_high.preview(self.last_close) if has_prev else NAN,
+            "brk_low": self.brk_low.preview(self.last_close) if has_prev else NAN,
+        }
+
+    def to_dict(self):
+        return {
+            "smoothing": self.smoothing,
+            "ma20": self.ma20.to_dict(),
+            "ma50": self.ma50.to_dict(),
+            "rsi": self.rsi.to_dict(),
+            "atr": self.atr.to_dict(),
+            "brk_high": self.brk_high.to_dict(),
+            "brk_low": self.brk_low.to_dict(),
+            "last_close": _num(self.last_close),
+            "last_ts": self.last_ts,
+            "bars": self.bars,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        o = cls(d.get("smoothing", "simple"))
+        o.ma20 = RollingSMA.from_dict(d["ma20"])
+        o.ma50 = RollingSMA.from_dict(d["ma50"])
+        o.rsi = StreamingRSI.from_dict(d["rsi"])
+        o.atr = StreamingATR.from_dict(d["atr"])
+        o.brk_high = RollingExtreme.from_dict(d["brk_high"])
+        o.brk_low = RollingExtreme.from_dict(d["brk_low"])
+        o.last_close = _unnum(d.get("last_close"))
+        o.last_ts = d.get("last_ts")
+        o.bars = int(d.get("bars", 0))
+        return o
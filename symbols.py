@@ -0,0 +1,180 @@
+import re
+import json
+import threading
+from collections import Counter
+
+# ================= Symbol resolution (TradingView ticker -> Yahoo symbol) =================
+# TradingView sends "NASDAQ:AAPL", "BRK.B", "BINANCE:BTCUSDT", "CME_MINI:ES1!",
+# "FX:EURUSD"...; Yahoo wants "AAPL", "BRK-B", "BTC-USD", "ES=F", "EURUSD=X".
+# The index is built once from tickers.txt plus an optional reference file,
+# so known symbols (and every spelling of them) resolve with one dict lookup;
+# anything else is parsed once and memoized. resolve() -> (symbol, None) or
+# (None, reason) for tickers no provider can serve, without a download;
+# reject() tallies them so the index can be fixed.
+#
+#   idx = SymbolIndex(universe, "data/symbols.json")
+#   idx.resolve("NASDAQ:BRK.B")   -> ("BRK-B", None)
+#   idx.resolve("ECONOMICS:USGDP") -> (None, "unsupported"); idx.reject("ECONOMICS:USGDP", "unsupported")
+#
+# Reference file (all keys optional):
+#   {"aliases": {"TVC:DXY": "DX-Y.NYB", "TVC:GOLD": "GC=F"},
+#    "symbols": ["RY.TO", "2222.SR"], "unsupported": ["ECONOMICS", "QUANDL"]}
+
+DEFAULT_ALIASES = {
+    "SPX": "^GSPC", "SP500": "^GSPC", "S&P500": "^GSPC", "SP:SPX": "^GSPC", "TVC:SPX": "^GSPC",
+    "NDX": "^NDX", "NASDAQ100": "^NDX", "NASDAQ:NDX": "^NDX", "TVC:NDX": "^NDX",
+    "DJI": "^DJI", "DOW": "^DJI", "DJ:DJI": "^DJI", "TVC:DJI": "^DJI",
+    "VIX": "^VIX", "TVC:VIX": "^VIX", "CBOE:VIX": "^VIX",
+    "RUT": "^RUT", "TVC:RUT": "^RUT",
+    "TVC:DXY": "DX-Y.NYB", "DXY": "DX-Y.NYB",
+    "TVC:US10Y": "^TNX", "US10Y": "^TNX",
+}
+
+# listed in the US: the prefix is just dropped
+US_EXCHANGES = {"NASDAQ", "NYSE", "AMEX", "NYSEARCA", "ARCA", "NYSEAMERICAN", "BATS", "CBOE", "OTC", "OTCMKTS", "NYSEMKT"}
+
+# TradingView exchange prefix -> Yahoo suffix
+EXCHANGE_SUFFIX = {
+    "TSX": ".TO", "TSXV": ".V", "LSE": ".L", "XETR": ".DE", "FWB": ".F", "EURONEXT": ".PA", "SIX": ".SW",
+    "BME": ".MC", "MIL": ".MI", "OMXSTO": ".ST", "OSL": ".OL", "OMXCOP": ".CO", "ASX": ".AX", "NZX": ".NZ",
+    "HKEX": ".HK", "TSE": ".T", "KRX": ".KS", "TWSE": ".TW", "SSE": ".SS", "SZSE": ".SZ", "NSE": ".NS",
+    "BSE": ".BO", "SGX": ".SI", "TADAWUL": ".SR", "DFM": ".AE", "ADX": ".AD", "QSE": ".QA", "EGX": ".CA",
+    "BMFBOVESPA": ".SA", "BMV": ".MX", "JSE": ".JO", "TASE": ".TA",
+}
+_YAHOO_SUFFIXES = {s[1:] for s in EXCHANGE_SUFFIX.values()}
+
+CRYPTO_EXCHANGES = {"BINANCE", "COINBASE", "BITSTAMP", "KRAKEN", "BYBIT", "OKX", "BITFINEX", "GEMINI", "CRYPTO",
+                    "BINANCEUS", "KUCOIN", "MEXC", "GATEIO", "CRYPTOCAP"}
+FOREX_EXCHANGES = {"FX", "FX_IDC", "OANDA", "FOREXCOM", "SAXO", "PEPPERSTONE", "ICMARKETS", "FXCM"}
+FUTURES_EXCHANGES = {"CME", "CME_MINI", "CBOT", "CBOT_MINI", "COMEX", "NYMEX", "ICEUS", "ICEEUR", "EUREX"}
+UNSUPPORTED_PREFIXES = {"ECONOMICS", "QUANDL", "FRED", "INDEX", "USI", "TVC_CFD"}
+
+_VALID = re.compile(r"^[A-Z0-9^][A-Z0-9.\-=^&]{0,19}$")
+_CLASS_SHARE = re.compile(r"^([A-Z]{1,5})[./ ]([A-Z]{1,2})$")
+_FUTURE = re.compile(r"^([A-Z0-9]{1,4}?)[12]!$")
+_CRYPTO = re.compile(r"^([A-Z0-9]{2,10}?)(USDT|USDC|BUSD|USD)(\.P|PERP)?$")
+_PAIR = re.compile(r"^([A-Z]{3})([A-Z]{3})$")
+
+
+class SymbolIndex:
+    def __init__(self, symbols=(), reference_path: str | None = None, memo_max: int = 10000):
+        self._memo_max = int(memo_max)
+        self._lock = threading.Lock()
+        self.rejections = Counter()  # raw ticker -> count, for fixing the index
+        self.counters = {"lookups": 0, "indexed": 0, "parsed": 0, "rejected": 0, "loads": 0}
+        self.load(symbols, reference_path)
+
+    def load(self, symbols=(), reference_path: str | None = None):
+        # (re)build the index off to the side and swap it in under the lock, so
+        # concurrent resolve() calls see the old map or the new one, never half;
+        # counters and the rejection tally survive
+        ref = self._read(reference_path) if reference_path else {}
+        new = {}
+        for alias, target in {**DEFAULT_ALIASES, **(ref.get("aliases") or {})}.items():
+            new[str(alias).strip().upper()] = str(target).strip().upper()
+        for sym in list(symbols) + list(ref.get("symbols") or []):
+            self._add_to(new, sym)
+        unsupported = UNSUPPORTED_PREFIXES | {str(p).upper() for p in ref.get("unsupported") or []}
+        with self._lock:
+            self._map, self._rejected, self._unsupported = new, {}, unsupported  # _rejected: memoized parse failures
+            self.size = len(new)
+            self.counters["loads"] += 1
+        return self
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f) or {}
+        except Exception:
+            return {}
+
+    def add(self, symbol: str):
+        with self._lock:
+            before = len(self._map)
+            self._add_to(self._map, symbol)
+            self.size += len(self._map) - before
+
+    @staticmethod
+    def _add_to(index, symbol):
+        # the symbol plus its class-share spellings (BRK-B: BRK.B, BRK/B, BRK B)
+        s = str(symbol).strip().upper()
+        if not s:
+            return
+        index.setdefault(s, s)
+        m = _CLASS_SHARE.match(s.replace("-", "."))
+        if m and m.group(2) not in _YAHOO_SUFFIXES:
+            for sep in (".", "/", " ", "-"):
+                index.setdefault(f"{m.group(1)}{sep}{m.group(2)}", s)
+
+    def parse(self, raw: str):
+        # -> (symbol, None) | (None, reason); rules only, no index
+        s = str(raw or "").strip().upper()
+        if not s or "{{" in s or s in ("UNKNOWN", "NONE", "NULL"):
+            return None, "invalid"
+        prefix, _, body = s.rpartition(":")
+        body = body.strip(". ")
+        if prefix in self._unsupported or (any(c in body for c in "*+/()") and not _CLASS_SHARE.match(body)):
+            return None, "unsupported"
+        if prefix in CRYPTO_EXCHANGES:
+            m = _CRYPTO.match(body)
+            if not m or m.group(3):  # perpetuals have no Yahoo series
+                return None, "unsupported"
+            return f"{m.group(1)}-USD", None
+        if prefix in FOREX_EXCHANGES:
+            m = _PAIR.match(body)
+            return (f"{body}=X", None) if m else (None, "unsupported")
+        if prefix in FUTURES_EXCHANGES or body.endswith("!"):
+            m = _FUTURE.match(body)
+            return (f"{m.group(1)}=F", None) if m else (None, "unsupported")
+        if prefix in EXCHANGE_SUFFIX:
+            body = body.replace(".", "-").replace("/", "-") + EXCHANGE_SUFFIX[prefix]
+        elif prefix and prefix not in US_EXCHANGES:
+            return None, "unknown_exchange"
+        m = _CLASS_SHARE.match(body)
+        if m and m.group(2) not in _YAHOO_SUFFIXES:
+            body = f"{m.group(1)}-{m.group(2)}"
+        if not _VALID.match(body):
+            return None, "invalid"
+        return body, None
+
+    def resolve(self, raw: str):
+        # -> (provider symbol, None) | (None, reason); callers count rejections via reject()
+        key = str(raw or "").strip().upper()
+        with self._lock:
+            self.counters["lookups"] += 1
+            hit = self._map.get(key)
+            if hit is not None:
+                self.counters["indexed"] += 1
+                return hit, None
+            reason = self._rejected.get(key)
+            if reason is not None:
+                return None, reason
+            index = self._map
+        # "NASDAQ:AAPL" -> index entry for "AAPL" when it has one
+        sym, reason = self.parse(key)
+        if sym is not None:
+            sym = index.get(sym, sym)
+        with self._lock:
+            self.counters["parsed"] += 1
+            # a reload in between: don't memoize a result from the old index
+            if index is self._map and len(self._map) + len(self._rejected) < self.size + self._memo_max:
+                if sym is not None:
+                    self._map[key] = sym
+                else:
+                    self._rejected[key] = reason
+        return sym, reason
+
+    def reject(self, raw: str, reason: str):
+        raw = str(raw or "").strip().upper()
+        with self._lock:
+            self.counters["rejected"] += 1
+            if raw in self.rejections or len(self.rejections) < 1000:
+                self.rejections[raw] += 1
+
+    def stats(self, top: int = 20):
+        with self._lock:
+            out = dict(self.counters, size=self.size, memoized=len(self._map) + len(self._rejected) - self.size,
+                       rejected_kinds=len(self.rejections))
+            out["top_rejected"] = [{"ticker": t, "count": n} for t, n in self.rejections.most_common(top)]
+        return out
@@ -0,0 +1,342 @@
+import os
+import json
+import time
+import fcntl
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ================= Telegram delivery =================
+# Keep-alive session + token buckets (global and per chat) + 429 handling.
+# Messages that still fail after retries are appended to a JSONL spool and
+# re-sent by a background thread, so they survive restarts (and gunicorn
+# workers sharing the file don't lose or double-send each other's lines).
+
+TELEGRAM_MAX_LEN = 4096
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take_locked(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def acquire(self, max_wait: float) -> bool:
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                wait = self._take_locked()
+            if wait <= 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        # server told us to back off (429 retry_after)
+        with self._lock:
+            self.tokens = min(self.tokens, 1.0 - float(seconds) * self.rate)
+            self.ts = time.monotonic()
+
+
+def split_message(text: str, limit: int = TELEGRAM_MAX_LEN):
+    if len(text) <= limit:
+        return [text]
+    parts, cur = [], ""
+    for line in text.split("\n"):
+        while len(line) > limit:
+            if cur:
+                parts.append(cur)
+                cur = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if cur and len(cur) + 1 + len(line) > limit:
+            parts.append(cur)
+            cur = line
+        else:
+            cur = f"{cur}\n{line}" if cur else line
+    if cur:
+        parts.append(cur)
+    return parts
+
+
+class TelegramSender:
+    def __init__(self, token: str, spool_path: str = "", global_rate: float = 25.0,
+                 chat_rate: float = 1.0, group_rate: float = 20 / 60, max_wait: float = 10.0,
+                 attempts: int = 3, timeout: float = 20.0, api_base: str = "https://api.telegram.org",
+                 spool_interval: float = 30.0):
+        self.token = token
+        self.api_base = api_base.rstrip("/")
+        self.spool_path = spool_path
+        self.max_wait = float(max_wait)
+        self.attempts = max(int(attempts), 1)
+        self.timeout = float(timeout)
+        self.spool_interval = float(spool_interval)
+        self.chat_rate = float(chat_rate)
+        self.group_rate = float(group_rate)
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+        self._flusher = None
+        self._leftovers_pid = None
+        self._depth_cache = None  # (file signature, depth)
+        self.counters = {
+            "messages": 0, "parts_sent": 0, "failed": 0, "rate_limited_429": 0,
+            "retries": 0, "throttled_local": 0, "spooled": 0, "spool_delivered": 0, "dropped": 0,
+        }
+        self.last_error = ""
+
+    # ---- plumbing ----
+    def _http(self):
+        if self._session is None or self._session_pid != os.getpid():
+            s = requests.Session()
+            s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+            s.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0))
+            self._session, self._session_pid = s, os.getpid()
+        return self._session
+
+    def _chat_bucket(self, chat_id):
+        key = str(chat_id)
+        with self._lock:
+            b = self._chats.get(key)
+            if b is None:
+                rate = self.group_rate if key.startswith("-") else self.chat_rate
+                b = self._chats[key] = TokenBucket(rate, 3 if rate >= 1 else 1)
+            return b
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    # ---- sending ----
+    def _backoff(self, attempt):
+        if attempt + 1 < self.attempts:
+            time.sleep(min(2 ** attempt, self.max_wait))
+
+    def _post(self, chat_id, text):
+        # -> (ok, info, retryable)
+        url = f"{self.api_base}/bot{self.token}/sendMessage"
+        bucket = self._chat_bucket(chat_id)
+        for attempt in range(self.attempts):
+            if attempt:
+                self._count("retries")
+            if not (bucket.acquire(self.max_wait) and self._global.acquire(self.max_wait)):
+                self._count("throttled_local")
+                return False, "rate limited locally", True
+            try:
+                r = self._http().post(url, json={"chat_id": chat_id, "text": text}, timeout=self.timeout)
+            except Exception as e:
+                self.last_error = f"Telegram request failed: {e}"
+                self._backoff(attempt)
+                continue
+
+            try:
+                data = r.json()
+            except Exception:
+                data = {"raw": r.text}
+
+            if r.status_code == 200:
+                return True, "ok", False
+            self.last_error = f"Telegram error {r.status_code}: {data}"
+            if r.status_code == 429:
+                self._count("rate_limited_429")
+                retry_after = float((data.get("parameters") or {}).get("retry_after", 1)) if isinstance(data, dict) else 1.0
+                # the limit may be the bot-wide one: hold every chat back, not just this one
+                bucket.pause(retry_after)
+                self._global.pause(retry_after)
+                if retry_after > self.max_wait:
+                    return False, self.last_error, True
+                continue  # next acquire() waits out retry_after
+            if r.status_code >= 500:
+                self._backoff(attempt)
+                continue
+            return False, self.last_error, False  # 4xx: retrying will not help
+        return False, self.last_error or "Telegram send failed", True
+
+    def send(self, chat_id, text: str, spool: bool = True):
+        self._count("messages")
+        if self._leftovers_pid != os.getpid():
+            self._leftovers_pid = os.getpid()
+            if self.spool_path and (os.path.exists(self.spool_path) or self._claims()):
+                self.start_flusher()  # leftovers from a previous run
+        parts = split_message(text)
+        for i, part in enumerate(parts):
+            ok, info, retryable = self._post(chat_id, part)
+            if ok:
+                self._count("parts_sent")
+                continue
+            self._count("failed")
+            if spool and retryable and self.spool_path:
+                self._spool([{"chat_id": chat_id, "text": p, "ts": time.time()} for p in parts[i:]])
+                return False, f"{info} (spooled for retry)"
+            self._count("dropped", len(parts) - i)
+            return False, info
+        return True, "ok" if len(parts) == 1 else f"ok ({len(parts)} parts)"
+
+    # ---- spool ----
+    # Shared by every worker process. Writers append under flock() to the live
+    # spool path. A flusher renames the live file to a timestamped claim file
+    # (one rename wins) and works through claim files oldest first, holding
+    # the claim's flock while posting: other flushers skip it, writers never
+    # wait on it. A transient failure rewrites the claim with what is left.
+    def _append_locked(self, data: bytes):
+        for _ in range(5):
+            fd = os.open(self.spool_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    same = os.fstat(fd).st_ino == os.stat(self.spool_path).st_ino
+                except FileNotFoundError:
+                    same = False
+                if same:  # not renamed away by a flusher since we opened it
+                    os.write(fd, data)
+                    return
+            finally:
+                os.close(fd)
+        raise OSError("spool kept moving while appending")
+
+    def _spool(self, items):
+        data = "".join(json.dumps(it, ensure_ascii=False) + "\n" for it in items).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+            self._append_locked(data)
+            self._count("spooled", len(items))
+        except Exception as e:
+            self.last_error = f"spool write failed: {e}"
+            self._count("dropped", len(items))
+        self.start_flusher()
+
+    def _claims(self):
+        d, base = os.path.split(self.spool_path)
+        d = d or "."
+        try:
+            names = sorted(n for n in os.listdir(d) if n.startswith(base + ".") and n.endswith(".claim"))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(d, n) for n in names]
+
+    @staticmethod
+    def _read_lines(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except Exception:
+            return []
+
+    def spool_depth(self) -> int:
+        # lock-free count: claims being flushed right now are included. Called
+        # on every /metrics scrape, so files are only re-read when a name,
+        # size or mtime changed since the last call
+        sig = []
+        for p in [*self._claims(), self.spool_path]:
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            sig.append((p, st.st_size, st.st_mtime_ns))
+        sig = tuple(sig)
+        cached = self._depth_cache
+        if cached is not None and cached[0] == sig:
+            return cached[1]
+        depth = sum(len(self._read_lines(p)) for p, _, _ in sig)
+        self._depth_cache = (sig, depth)
+        return depth
+
+    def _claim_live(self):
+        if not os.path.exists(self.spool_path) or not os.path.getsize(self.spool_path):
+            return
+        claim = f"{self.spool_path}.{time.time_ns():020d}.{os.getpid()}.claim"
+        try:
+            os.rename(self.spool_path, claim)
+        except FileNotFoundError:
+            pass  # another worker claimed it first
+
+    def _flush_claim(self, path):
+        # -> (delivered or dropped, stop); stop = transient failure, keep order
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            return 0, False
+        with os.fdopen(fd, "r+", encoding="utf-8") as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return 0, False  # another flusher has it (or a writer is mid-append)
+            if os.fstat(f.fileno()).st_nlink == 0:
+                return 0, False  # finished and removed while we were opening it
+            items = []
+            for line in f:
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    if line.strip():
+                        self._count("dropped")  # torn line: would block the claim forever
+            left = []
+            for i, it in enumerate(items):
+                ok, _, retryable = self._post(it["chat_id"], it["text"])
+                if ok:
+                    self._count("spool_delivered")
+                elif retryable:
+                    left = items[i:]
+                    break
+                else:
+                    self._count("dropped")
+            if left:
+                f.seek(0)
+                f.truncate()
+                f.write("".join(json.dumps(it, ensure_ascii=False) + "\n" for it in left))
+                f.flush()
+            else:
+                os.unlink(path)
+        return len(items) - len(left), bool(left)
+
+    def flush_spool(self) -> int:
+        if not self.spool_path:
+            return 0
+        self._claim_live()
+        done = 0
+        for path in self._claims():
+            n, stop = self._flush_claim(path)
+            done += n
+            if stop:
+                break
+        return done
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.spool_interval)
+            try:
+                self.flush_spool()
+            except Exception as e:
+                self.last_error = f"spool flush failed: {e}"
+
+    def start_flusher(self):
+        if not self.spool_path:
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher[1] == os.getpid():
+                return
+            t = threading.Thread(target=self._flush_loop, name="tg-spool", daemon=True)
+            t.start()
+            self._flusher = (t, os.getpid())
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self.counters)
+            out["chats_tracked"] = len(self._chats)
+        out["spool_depth"] = self.spool_depth() if self.spool_path else 0
+        out["last_error"] = self.last_error
+        return out
@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers import CircuitBreaker, Provider, ProviderSet
+
+
+def _slow_failure(delay):
+    def fn(symbol, timeout, **kw):
+        time.sleep(min(delay, timeout))
+        return {"ok": False, "error": "timeout"}
+    return fn
+
+
+def test_probe_cut_by_deadline_is_released():
+    breaker = CircuitBreaker(failures=1, reset_sec=0.05)
+    p = Provider("slow", _slow_failure(1.0), timeout=5.0, breaker=breaker)
+    data = ProviderSet([p], workers=2)
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    r = data.fetch("AAPL", deadline=time.monotonic() + 0.15)
+    assert r.get("timeout")
+    time.sleep(0.2)  # the cut probe finishes in the background
+    assert p.counters["cut"] == 1
+    assert breaker.state == "open" and not breaker._probing
+
+    # a fresh probe is let through once reset_sec has passed again
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+
+
+def test_probe_success_closes_breaker():
+    breaker = CircuitBreaker(failures=1, reset_sec=0.01)
+    p = Provider("ok", lambda symbol, timeout, **kw: {"ok": True, "bars": []}, breaker=breaker)
+    breaker.record(False)
+    time.sleep(0.02)
+    r = ProviderSet([p], workers=1).fetch("AAPL", deadline=time.monotonic() + 1.0)
+    assert r["ok"] and breaker.state == "closed"
+
+
+def test_unknown_symbols_do_not_open_breaker():
+    breaker = CircuitBreaker(failures=2, reset_sec=60)
+    p = Provider("chart", lambda symbol, timeout, **kw: {"ok": False, "error": "404", "unknown": True}, breaker=breaker)
+    data = ProviderSet([p], workers=1)
+    for _ in range(5):
+        r = data.fetch("JUNK", deadline=time.monotonic() + 1.0)
+        assert r["unknown"]
+    assert breaker.state == "closed" and p.counters["unknown"] == 5
@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+
+from bar_store import Bars, DAY_SEC, cols_len
+
+# ================= Timeframes: one stored base series, resampled locally =================
+# Intraday alerts are judged on bars of their own timeframe, built from the
+# single base interval kept in the bar store (default 5m) instead of one
+# download per timeframe. Buckets are anchored to each session's first bar
+# (09:30 ET -> 09:30, 10:30, ... for 1h; 09:30, 13:30 for 4h, like TradingView)
+# and sessions are split on the UTC day, which holds for US listings.
+#
+#   tf = parse_tf(payload["tf"])           # "15" -> "15m", "240" -> "4h", "D" -> "1d"
+#   bars_1h = resample(store.read("AAPL", "5m"), "1h")
+
+TF_SECONDS = {"5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 4 * 3600, "1d": DAY_SEC}
+
+# trend confirmation one step up
+HIGHER_TF = {"5m": "30m", "15m": "1h", "30m": "4h", "1h": "4h", "4h": "1d", "1d": None}
+
+_UNIT_SEC = {"s": 1, "m": 60, "min": 60, "h": 3600, "d": DAY_SEC}
+
+def parse_tf(tf):
+    # TradingView {{interval}} ("5", "60", "240", "D", "1D", "W", "1M") or
+    # names like "15m", "1h", "4H" -> nearest supported key; None when unknown
+    raw = str(tf or "").strip()
+    if not raw:
+        return None
+    if raw[-1] in ("W", "M") and (raw[:-1].isdigit() or len(raw) == 1):
+        return "1d"  # weekly/monthly: daily is the coarsest we analyze
+    s = raw.lower()
+    if s in ("d", "day", "daily"):
+        return "1d"
+    if s.isdigit():
+        sec = int(s) * 60
+    else:
+        num = s.rstrip("abcdefghijklmnopqrstuvwxyz")
+        unit = s[len(num):]
+        if not num.isdigit() or unit not in _UNIT_SEC:
+            return None
+        sec = int(num) * _UNIT_SEC[unit]
+    if sec <= 0:
+        return None
+    if sec >= DAY_SEC:
+        return "1d"
+    return min(TF_SECONDS, key=lambda k: abs(math.log(TF_SECONDS[k] / sec)))
+
+def tf_seconds(tf) -> int:
+    return TF_SECONDS[parse_tf(tf) or "1d"]
+
+def bucket_starts(ts, sec: int):
+    # bucket open time for every bar; daily buckets are the UTC day, like
+    # bar_store.normalize_ts keys stored daily bars
+    ts = np.asarray(ts, dtype=np.float64)
+    day = np.floor(ts / DAY_SEC)
+    if sec >= DAY_SEC or not len(ts):
+        return day * DAY_SEC
+    first = np.r_[0, np.flatnonzero(np.diff(day)) + 1]
+    session_open = np.repeat(ts[first], np.diff(np.r_[first, len(ts)]))
+    return session_open + np.floor((ts - session_open) / sec) * sec
+
+def resample(bars, tf):
+    # bars sorted by ts (bar_store order); the last bucket may still be forming
+    sec = tf_seconds(tf)
+    if bars is None or not cols_len(bars):
+        return Bars.empty()
+    bars = Bars.from_cols(bars).valid_only()
+    keys = bucket_starts(bars.ts, sec)
+    idx = np.r_[0, np.flatnonzero(np.diff(keys)) + 1]
+    if len(idx) == len(keys):
+        return bars  # already at (or coarser than) the target timeframe
+    last = np.r_[idx[1:] - 1, len(keys) - 1]
+    return Bars(
+        keys[idx], bars.open[idx],
+        np.maximum.reduceat(bars.high, idx), np.minimum.reduceat(bars.low, idx),
+        bars.close[last], np.add.reduceat(bars.volume, idx),
+    )
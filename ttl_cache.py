@@ -0,0 +1,114 @@
+import time
+import threading
+from collections import OrderedDict
+
+# ================= TTL + LRU cache with single-flight =================
+# Concurrent get_or_compute() calls for the same key share one computation:
+# the first caller runs fn(), the rest block on its result.
+
+class _Flight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, ttl_sec: float, max_items: int = 512):
+        self.ttl_sec = float(ttl_sec)
+        self.max_items = max(int(max_items), 1)
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key):
+        with self._lock:
+            return self._get_locked(key, time.monotonic())
+
+    def _get_locked(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= now:
+            del self._data[key]
+            self.expired += 1
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def put(self, key, value):
+        if self.ttl_sec <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, fn, cacheable=None):
+        with self._lock:
+            item = self._get_locked(key, time.monotonic())
+            if item is not None:
+                self.hits += 1
+                return item[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn()
+            if cacheable is None or cacheable(flight.value):
+                self.put(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                n = len(self._data)
+                self._data.clear()
+                return n
+            dead = [k for k in self._data if predicate(k)]
+            for k in dead:
+                del self._data[k]
+            return len(dead)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "size": len(self._data),
+                "max_items": self.max_items,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "inflight": len(self._inflight),
+                "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+            }
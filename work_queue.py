@@ -0,0 +1,104 @@
+import time
+import zlib
+import queue
+import threading
+from collections import deque
+
+# ================= Keyed work queue =================
+# Bounded worker pool where items with the same key always go to the same
+# worker, so they are processed in arrival order. submit() never blocks:
+# it returns False when the queue is full and the caller sheds load.
+
+class KeyedWorkQueue:
+    def __init__(self, handler, workers: int = 4, maxsize: int = 200, name: str = "work"):
+        self.handler = handler
+        self.workers = max(int(workers), 1)
+        self.maxsize = max(int(maxsize), 1)
+        self.name = name
+        self._queues = [queue.Queue() for _ in range(self.workers)]
+        self._threads = []
+        self._lock = threading.Lock()
+        self._depth = 0
+        self._busy = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.errors = 0
+        self._waits = deque(maxlen=500)   # seconds spent queued
+        self._runs = deque(maxlen=500)    # seconds spent in handler
+
+    def _start_locked(self):
+        # started lazily so gunicorn --preload forks don't inherit dead threads
+        if self._threads:
+            return
+        for i, q in enumerate(self._queues):
+            t = threading.Thread(target=self._loop, args=(q,), name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, key: str, item) -> bool:
+        shard = zlib.crc32(str(key).upper().encode("utf-8")) % self.workers
+        with self._lock:
+            if self._depth >= self.maxsize:
+                self.rejected += 1
+                return False
+            self._start_locked()
+            self._depth += 1
+            self.accepted += 1
+        self._queues[shard].put((time.monotonic(), item))
+        return True
+
+    def _loop(self, q):
+        while True:
+            enq, item = q.get()
+            start = time.monotonic()
+            with self._lock:
+                self._depth -= 1
+                self._busy += 1
+            try:
+                self.handler(item)
+                ok = True
+            except Exception as e:
+                ok = False
+                print(f"=== {self.name} worker error ===", e)
+            end = time.monotonic()
+            with self._lock:
+                self._busy -= 1
+                self.processed += 1
+                if not ok:
+                    self.errors += 1
+                self._waits.append(start - enq)
+                self._runs.append(end - start)
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @staticmethod
+    def _summary(xs):
+        if not xs:
+            return {"avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        xs = sorted(xs)
+        return {
+            "avg_ms": round(sum(xs) / len(xs) * 1000, 1),
+            "p95_ms": round(xs[min(int(len(xs) * 0.95), len(xs) - 1)] * 1000, 1),
+            "max_ms": round(xs[-1] * 1000, 1),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits, runs = list(self._waits), list(self._runs)
+            out = {
+                "workers": self.workers,
+                "maxsize": self.maxsize,
+                "depth": self._depth,
+                "busy": self._busy,
+                "shard_depth": [q.qsize() for q in self._queues],
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "errors": self.errors,
+            }
+        out["queue_wait"] = self._summary(waits)
+        out["handler"] = self._summary(runs)
+        return out